@@ -0,0 +1,109 @@
+import csv
+import os
+import pickle
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from csv_ingest import (
+    column_positions, complete_lines_end, header_end, read_range_lines, region_checksums, row_picker
+)
+from data_processor import TRANSACTION_COLUMNS, merge_category_data, process_transactions
+from instrumentation import PipelineMetrics, stage
+
+# Bumped whenever the pickled state changes shape; older checkpoints are rebuilt
+CHECKPOINT_VERSION = 1
+
+
+def load_checkpoint(path: str) -> Optional[dict]:
+    """The saved state, or None when there is none or it cannot be read."""
+    try:
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if not isinstance(state, dict) or state.get('version') != CHECKPOINT_VERSION:
+        return None
+    return state
+
+
+def save_checkpoint(path: str, state: dict) -> None:
+    """Pickle the state to a temp file and rename it, so a crash never leaves half a checkpoint."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = path + '.partial'
+    with open(partial, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(partial, path)
+
+
+def resume_offset(state: Optional[dict], filename: str, users_fingerprint: str) -> int:
+    """
+    Offset to continue reading filename from with the aggregates in state, or
+    0 when the state has to be rebuilt: no checkpoint, another file, other
+    users, or a file that no longer starts with the bytes already aggregated.
+    """
+    if state is None:
+        return 0
+    if state['source'] != os.path.abspath(filename) or state['users'] != users_fingerprint:
+        return 0
+    offset = state['offset']
+    if os.path.getsize(filename) < offset:
+        return 0
+    if region_checksums(filename, offset) != (state['head'], state['tail']):
+        return 0
+    return offset
+
+
+def _iter_range_rows(filename: str, header: list, start: int, end: int) -> Iterator[Tuple[str, ...]]:
+    """TRANSACTION_COLUMNS tuples of the complete lines between two byte offsets."""
+    pick = row_picker(column_positions(header, TRANSACTION_COLUMNS))
+    return map(pick, filter(None, csv.reader(read_range_lines(filename, start, end))))
+
+
+def process_transactions_incremental(
+    filename: str,
+    active_users: Set[str],
+    checkpoint: str,
+    users_fingerprint: str,
+    metrics: Optional[PipelineMetrics] = None
+) -> Tuple[Dict[int, Tuple[int, Set[str]]], int]:
+    """
+    Variant of process_transactions for an append-only transactions CSV.
+    The checkpoint file keeps the per-category sums and user sets together
+    with the byte offset they cover; a rerun only reads the lines appended
+    since and saves the updated state. users_fingerprint identifies the
+    active users the state was built with (e.g. csv_cache.file_fingerprint of
+    users.csv). When the users, the file's header or the bytes before the
+    offset changed, the aggregates are rebuilt from the first row.
+    Returns the category data and the offset reading started from (0 for a
+    rebuild).
+    """
+    with stage(metrics, 'load_checkpoint'):
+        state = load_checkpoint(checkpoint)
+        offset = resume_offset(state, filename, users_fingerprint)
+
+    header, first_row = header_end(filename)
+    if offset == 0:
+        category_data: Dict[int, Tuple[int, Set[str]]] = {}
+        start = first_row
+    else:
+        category_data = state['categories']
+        start = offset
+    end = complete_lines_end(filename, start)
+
+    appended = process_transactions(
+        filename, active_users, metrics=metrics, rows=_iter_range_rows(filename, header, start, end)
+    )
+    category_data = merge_category_data([category_data, appended])
+
+    with stage(metrics, 'save_checkpoint', len(category_data)):
+        head, tail = region_checksums(filename, end)
+        save_checkpoint(checkpoint, {
+            'version': CHECKPOINT_VERSION,
+            'source': os.path.abspath(filename),
+            'users': users_fingerprint,
+            'offset': end,
+            'head': head,
+            'tail': tail,
+            'categories': category_data
+        })
+    return category_data, offset
@@ -0,0 +1,224 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import duckdb
+
+from data_generator import generate_dataset
+from instrumentation import peak_rss_mb
+from query_registry import connect_dataset, registry
+
+DEFAULT_SIZES = [10 ** 4, 10 ** 5, 10 ** 6]
+DEFAULT_DATA_DIR = 'data/benchmarks'
+DEFAULT_RESULTS_PATH = 'data/benchmark_results.json'
+DEFAULT_BASELINE_PATH = 'benchmarks/baseline.json'
+# A case regresses when it is this much slower or larger than the baseline
+DEFAULT_TOLERANCE = 0.2
+# Transactions per user and SCD2 versions per agreement in generated datasets
+TRANSACTIONS_PER_USER = 100
+AGREEMENT_VERSIONS = 5
+
+
+def _sql_case(query: str, index: int = 0) -> Callable[[str], None]:
+    def run(data_dir: str) -> None:
+        statement = registry.statements(query)[index]
+        conn = connect_dataset(data_dir)
+        try:
+            conn.execute(f"CREATE TEMP TABLE benchmark_result AS {statement.query}")
+        finally:
+            conn.close()
+    return run
+
+
+def _feature_table_native(data_dir: str) -> None:
+    from feature_engine import compute_feature_table
+    for _ in compute_feature_table(os.path.join(data_dir, 'transactions.csv')):
+        pass
+
+
+def _dedup_native(data_dir: str) -> None:
+    from dimension_compaction import compact_versions, read_versions
+    for _ in compact_versions(read_versions(os.path.join(data_dir, 'dim_dep_agreement.csv'))):
+        pass
+
+
+def _join_python(data_dir: str) -> None:
+    from join_datasets import load_agreements, load_users, stream_transactions
+    users = load_users(os.path.join(data_dir, 'users.csv'))
+    agreements = load_agreements(os.path.join(data_dir, 'dim_dep_agreement.csv'))
+    for _ in stream_transactions(os.path.join(data_dir, 'transactions.csv'), users, agreements):
+        pass
+
+
+# name -> (implementation, input file measured in rows, largest size to run)
+CASES = {
+    'feature_table/window_sql': (_sql_case('feature_table/main'), 'transactions.csv', None),
+    'feature_table/self_join_sql': (_sql_case('feature_table/alternative_solutions', 0), 'transactions.csv', 10 ** 6),
+    'feature_table/correlated_sql': (_sql_case('feature_table/alternative_solutions', 1), 'transactions.csv', 10 ** 6),
+    'feature_table/native': (_feature_table_native, 'transactions.csv', None),
+    'dedup/sql': (_sql_case('dimension_deduplication/dimension_deduplication'), 'dim_dep_agreement.csv', None),
+    'dedup/optimized_sql': (
+        _sql_case('dimension_deduplication/dimension_deduplication_optimized'), 'dim_dep_agreement.csv', None
+    ),
+    'dedup/native': (_dedup_native, 'dim_dep_agreement.csv', None),
+    'join/python': (_join_python, 'transactions.csv', None),
+    'join/sql': (_sql_case('join_datasets/main'), 'transactions.csv', None)
+}
+
+
+def prepare_dataset(data_dir: str, size: int, seed: int) -> str:
+    """Generate (once) a dataset with `size` transactions and return its directory."""
+    dataset_dir = os.path.join(data_dir, f"n={size}")
+    if not os.path.exists(os.path.join(dataset_dir, 'dim_dep_agreement.csv')):
+        num_users = max(size // TRANSACTIONS_PER_USER, 1)
+        print(f"Generating dataset with {size} transactions in {dataset_dir}...")
+        generate_dataset(
+            dataset_dir,
+            num_users=num_users,
+            num_transactions=size,
+            num_transaction_users=num_users,
+            seed=seed,
+            workers=os.cpu_count() or 1,
+            agreement_versions=AGREEMENT_VERSIONS
+        )
+    return dataset_dir
+
+
+def _count_rows(path: str) -> int:
+    with open(path, 'rb') as f:
+        return sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(1 << 20), b'')) - 1
+
+
+def _run_case_in_child(name: str, data_dir: str, conn) -> None:
+    implementation = CASES[name][0]
+    start = time.perf_counter()
+    try:
+        implementation(data_dir)
+        conn.send({'wall_seconds': time.perf_counter() - start, 'peak_rss_mb': peak_rss_mb()})
+    except Exception as e:
+        conn.send({'error': f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def run_case(name: str, data_dir: str) -> Dict[str, object]:
+    """Run one implementation in a fresh process so peak RSS belongs to it alone."""
+    context = multiprocessing.get_context('spawn')
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=_run_case_in_child, args=(name, data_dir, child_conn))
+    process.start()
+    child_conn.close()
+    try:
+        result = parent_conn.recv()
+    except EOFError:
+        result = {'error': f"worker exited with code {process.exitcode}"}
+    process.join()
+    return result
+
+
+def run_benchmarks(sizes: List[int], cases: List[str], data_dir: str, seed: int) -> Dict[str, object]:
+    results = []
+    for size in sizes:
+        dataset_dir = prepare_dataset(data_dir, size, seed)
+        for name in cases:
+            _, input_file, max_size = CASES[name]
+            if max_size is not None and size > max_size:
+                print(f"  {name:<30} n={size:<10} skipped (above {max_size} rows)")
+                continue
+
+            rows = _count_rows(os.path.join(dataset_dir, input_file))
+            result = {'case': name, 'size': size, 'rows': rows}
+            result.update(run_case(name, dataset_dir))
+            if 'error' in result:
+                print(f"  {name:<30} n={size:<10} FAILED: {result['error']}")
+            else:
+                result['rows_per_second'] = rows / result['wall_seconds'] if result['wall_seconds'] else None
+                print(f"  {name:<30} n={size:<10} {result['wall_seconds']:>9.3f}s "
+                      f"{result['rows_per_second']:>14,.0f} rows/s {result['peak_rss_mb']:>9.1f} MB")
+            results.append(result)
+
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'duckdb': duckdb.__version__,
+        'cpu_count': os.cpu_count(),
+        'seed': seed,
+        'results': results
+    }
+
+
+def find_regressions(report: Dict[str, object], baseline: Dict[str, object], tolerance: float) -> List[str]:
+    """Cases that are slower or use more memory than the baseline by more than tolerance."""
+    expected = {(r['case'], r['size']): r for r in baseline['results'] if 'error' not in r}
+    regressions = []
+    for result in report['results']:
+        base = expected.get((result['case'], result['size']))
+        if base is None:
+            continue
+        label = f"{result['case']} n={result['size']}"
+        if 'error' in result:
+            regressions.append(f"{label}: failed ({result['error']})")
+            continue
+        for metric in ('wall_seconds', 'peak_rss_mb'):
+            if result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{label}: {metric} {result[metric]:.3f} vs baseline {base[metric]:.3f}")
+    return regressions
+
+
+def write_json(path: str, data: Dict[str, object]) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark feature table, join and dedup implementations.')
+    parser.add_argument('--sizes', type=lambda v: int(float(v)), nargs='+', default=DEFAULT_SIZES,
+                        help='Dataset sizes in transactions, e.g. 1e4 1e6 1e8')
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES),
+                        help='Implementations to run')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='Directory for generated datasets')
+    parser.add_argument('--seed', type=int, default=42, help='Dataset seed')
+    parser.add_argument('--results', default=DEFAULT_RESULTS_PATH, help='JSON results file')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH, help='Stored baseline to compare with')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Allowed slowdown/growth before a case is flagged (0.2 = 20%%)')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    report = run_benchmarks(args.sizes, args.cases, args.data_dir, args.seed)
+    write_json(args.results, report)
+    print(f"\nResults written to {args.results}")
+
+    if args.save_baseline:
+        write_json(args.baseline, report)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+
+    with open(args.baseline, 'r') as f:
+        regressions = find_regressions(report, json.load(f), args.tolerance)
+    if regressions:
+        print("\nRegressions against baseline:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print("\nNo regressions against baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import queue
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, TypeVar
+
+T = TypeVar('T')
+
+# Chunks a prefetch thread may read ahead of its consumer
+DEFAULT_PREFETCH_CHUNKS = 4
+# How often a blocked prefetch thread checks whether its consumer went away
+_POLL_SECONDS = 0.1
+_DONE = object()
+
+
+class ConcurrentLoader:
+    """
+    Overlaps the loading of independent inputs.
+    submit() parses a file in a worker process (or a thread with
+    use_processes=False), so dimension files are parsed side by side, and
+    prefetch() reads chunks of a large file on a background I/O thread while
+    the dimensions are still loading. Use as a context manager: leaving it
+    stops unfinished prefetch threads and shuts the workers down.
+    """
+
+    def __init__(self, use_processes: bool = True, max_workers: Optional[int] = None):
+        self.use_processes = use_processes
+        self.max_workers = max_workers
+        self._executor: Optional[Executor] = None
+        self._stops: List[threading.Event] = []
+
+    def submit(self, fn: Callable[..., T], *args) -> 'Future[T]':
+        """Run fn(*args) in a worker; fn and its result must be picklable with processes."""
+        if self._executor is None:
+            pool = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            self._executor = pool(max_workers=self.max_workers)
+        return self._executor.submit(fn, *args)
+
+    def prefetch(self, iterable: Iterable[T], depth: int = DEFAULT_PREFETCH_CHUNKS) -> Iterator[T]:
+        """
+        Start consuming iterable on a background thread right away, holding up
+        to depth items ahead of the caller. Errors raised while producing are
+        re-raised to the caller in order.
+        """
+        buffer = queue.Queue(maxsize=depth)
+        stop = threading.Event()
+        self._stops.append(stop)
+
+        def put(entry) -> bool:
+            while not stop.is_set():
+                try:
+                    buffer.put(entry, timeout=_POLL_SECONDS)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce() -> None:
+            try:
+                for item in iterable:
+                    if not put((item, None)):
+                        return
+            except BaseException as e:
+                put((_DONE, e))
+                return
+            put((_DONE, None))
+
+        thread = threading.Thread(target=produce, name='prefetch', daemon=True)
+        thread.start()
+
+        def consume() -> Iterator[T]:
+            try:
+                while True:
+                    item, error = buffer.get()
+                    if item is _DONE:
+                        if error is not None:
+                            raise error
+                        return
+                    yield item
+            finally:
+                stop.set()
+                thread.join()
+
+        return consume()
+
+    def close(self) -> None:
+        for stop in self._stops:
+            stop.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,36 @@
+# Test data for category aggregation engines
+USER_COLUMNS = ['user_id', 'is_active']
+
+USERS = [
+    ['becf-457e', '1'],
+    ['5728-4f1c', '1'],
+    ['a1b2-4c3d', '0'],  # inactive user
+    ['9f8e-4d7c', '1']
+]
+
+TRANSACTION_COLUMNS = [
+    'transaction_id',
+    'date',
+    'user_id',
+    'is_blocked',
+    'transaction_amount',
+    'transaction_category_id'
+]
+
+SAMPLE_DATA = [
+    ['ef05-4247', '2020-01-01', 'becf-457e', 'False', '10.75', 1],
+    ['c8d1-40ca', '2020-01-05', 'becf-457e', 'False', '4.20', 1],
+    ['fc2b-4b36', '2020-01-07', 'becf-457e', 'True', '30.00', 1],   # blocked
+    ['3725-48c4', '2020-01-15', '5728-4f1c', 'False', '7.99', 1],
+    ['5f2a-47c2', '2020-01-16', '5728-4f1c', 'False', '12.50', 3],
+    ['7541-412c', '2020-01-01', 'a1b2-4c3d', 'False', '49.00', 3],  # inactive user
+    ['3deb-47d7', '2020-01-12', '9f8e-4d7c', 'False', '0.99', 5],
+    ['88aa-4e1f', '2020-01-13', 'dead-beef', 'False', '5.00', 5]    # unknown user
+]
+
+# category_id -> (sum_amount, number of unique users)
+EXPECTED_RESULTS = {
+    1: (10 + 4 + 7, 2),
+    3: (12, 1),
+    5: (0, 1)
+}
@@ -21,4 +21,16 @@ COLUMNS = [
     'client_id',
     'product_id',
     'interest_rate'
-] 
\ No newline at end of file
+] 
+
+# Expected (sk_agrmnt_id, actual_from_dt, actual_to_dt) after compaction:
+# merged versions span from the first version's start to the last version's end
+EXPECTED_COMPACTED = [
+    (1, '2015-01-01', '2015-02-20'),
+    (2, '2015-02-21', '2015-07-05'),
+    (4, '2015-07-06', '2015-08-22'),
+    (5, '2015-08-23', '9999-12-31'),
+    (6, '2016-01-01', '2016-09-15'),
+    (9, '2016-09-16', '9999-12-31'),
+    (10, '2011-05-22', '9999-12-31')
+]
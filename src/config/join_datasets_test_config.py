@@ -0,0 +1,76 @@
+# Test data for point-in-time agreement lookups
+USER_COLUMNS = ['user_id', 'is_active']
+
+USERS = [
+    ['u1', '1'],
+    ['u2', '1'],
+    ['u3', '0'],  # inactive user
+    ['u4', '1']
+]
+
+AGREEMENT_COLUMNS = [
+    'sk_agrmnt_id',
+    'agrmnt_id',
+    'actual_from_dt',
+    'actual_to_dt',
+    'client_id',
+    'product_id',
+    'interest_rate'
+]
+
+AGREEMENTS = [
+    # u1: a year-long version with a shorter one overlapping it in March
+    [1, 'AGR1', '2020-01-01', '2020-12-31', 'u1', 300, 1.5],
+    [2, 'AGR2', '2020-03-01', '2020-04-01', 'u1', 301, 2.5],
+    # u2: consecutive versions, the last one open-ended
+    [3, 'AGR3', '2020-01-01', '2020-02-01', 'u2', 400, 3.0],
+    [4, 'AGR4', '2020-02-01', '9999-12-31', 'u2', 401, 3.5],
+    # u3: an open-ended version overlapped by a closed one, plus a gap before both
+    [5, 'AGR5', '2020-02-01', '9999-12-31', 'u3', 500, 4.0],
+    [6, 'AGR6', '2020-05-01', '2020-06-01', 'u3', 501, 4.5],
+    # u4: two versions starting the same day; the one listed last wins
+    [7, 'AGR7', '2020-01-01', '2020-06-01', 'u4', 600, 5.0],
+    [8, 'AGR8', '2020-01-01', '2020-03-01', 'u4', 601, 5.5]
+]
+
+TRANSACTION_COLUMNS = [
+    'transaction_id',
+    'date',
+    'user_id',
+    'is_blocked',
+    'transaction_amount',
+    'transaction_category_id'
+]
+
+TRANSACTIONS = [
+    ['t1', '2020-01-15', 'u1', 'False', '10.00', 1],
+    ['t2', '2020-03-15', 'u1', 'False', '20.00', 1],  # both u1 versions cover it
+    ['t3', '2020-06-01', 'u1', 'False', '30.00', 2],  # latest version ended, the earlier one still covers it
+    ['t4', '2020-12-31', 'u1', 'True', '40.00', 2],   # actual_to_dt is exclusive
+    ['t5', '2020-01-31', 'u2', 'False', '5.00', 3],
+    ['t6', '2020-02-01', 'u2', 'False', '6.00', 3],
+    ['t7', '2030-07-01', 'u2', 'False', '7.00', 3],   # open-ended version
+    ['t8', '2020-01-15', 'u3', 'False', '8.00', 4],   # before any version
+    ['t9', '2020-05-15', 'u3', 'False', '9.00', 4],
+    ['t10', '2021-01-01', 'u3', 'False', '1.00', 4],
+    ['t11', '2020-02-15', 'u4', 'False', '2.00', 5],
+    ['t12', '2020-04-15', 'u4', 'False', '3.00', 5],
+    ['t13', '2020-03-15', 'u5', 'False', '4.00', 5]    # unknown user
+]
+
+# transaction_id -> product_id of the agreement version valid on its date
+EXPECTED_PRODUCTS = {
+    't1': 300,
+    't2': 301,
+    't3': 300,
+    't4': None,
+    't5': 400,
+    't6': 401,
+    't7': 401,
+    't8': None,
+    't9': 501,
+    't10': 500,
+    't11': 601,
+    't12': 600,
+    't13': None
+}
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Cache location and size cap; both can be overridden per call
+CACHE_DIR_ENV = 'CSV_CACHE_DIR'
+DEFAULT_CACHE_DIR = '.csv_cache'
+DEFAULT_MAX_CACHE_MB = 4096
+CONVERT_CHUNK_SIZE = 1_000_000
+
+# Column types of the known input files, keyed by file name.
+# 'S' columns are stored as fixed-width bytes; unknown columns default to 'S'.
+SCHEMAS = {
+    'users.csv': {
+        'user_id': 'S',
+        'is_active': 'int8'
+    },
+    'transactions.csv': {
+        'transaction_id': 'S',
+        'date': 'datetime64[D]',
+        'user_id': 'S',
+        'is_blocked': 'bool',
+        'transaction_amount': 'float64',
+        'transaction_category_id': 'int64'
+    },
+    'dim_dep_agreement.csv': {
+        'sk_agrmnt_id': 'int64',
+        'agrmnt_id': 'S',
+        'actual_from_dt': 'datetime64[D]',
+        'actual_to_dt': 'datetime64[D]',
+        'client_id': 'S',
+        'product_id': 'int64',
+        'interest_rate': 'float64'
+    }
+}
+
+
+def _cache_dir(cache_dir: Optional[str]) -> str:
+    return cache_dir or os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+
+
+def file_fingerprint(filename: str) -> str:
+    """Cache key of a file: its absolute path, size and modification time."""
+    stat = os.stat(filename)
+    key = f"{os.path.abspath(filename)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _convert_column(values: pd.Series, dtype: str) -> np.ndarray:
+    """Convert a column of CSV text to its typed numpy representation."""
+    if dtype == 'S':
+        return values.to_numpy().astype('S')
+    if dtype == 'bool':
+        return (values == 'True').to_numpy()
+    if dtype.startswith('datetime64'):
+        return values.to_numpy().astype(dtype)
+    return values.astype(dtype).to_numpy()
+
+
+def _build_entry(filename: str, entry_dir: str) -> None:
+    """Parse the CSV once and write one .npy file per column."""
+    schema = SCHEMAS.get(os.path.basename(filename), {})
+    parts: Dict[str, List[np.ndarray]] = {}
+    for chunk in pd.read_csv(filename, dtype=str, keep_default_na=False, chunksize=CONVERT_CHUNK_SIZE):
+        for column in chunk.columns:
+            parts.setdefault(column, []).append(_convert_column(chunk[column], schema.get(column, 'S')))
+
+    columns = list(parts)
+    if not columns:
+        with open(filename, 'r') as f:
+            columns = f.readline().strip().split(',')
+
+    staging = tempfile.mkdtemp(dir=os.path.dirname(entry_dir))
+    try:
+        for column in columns:
+            values = np.concatenate(parts[column]) if column in parts else np.array([], dtype='S1')
+            np.save(os.path.join(staging, f"{column}.npy"), values)
+        with open(os.path.join(staging, 'meta.json'), 'w') as f:
+            json.dump({'source': os.path.abspath(filename), 'columns': columns}, f)
+        os.replace(staging, entry_dir)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def _entry_size(entry_dir: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+
+
+def evict(cache_dir: Optional[str] = None, max_cache_mb: float = DEFAULT_MAX_CACHE_MB, keep: Optional[str] = None) -> None:
+    """Remove least recently used entries until the cache fits in max_cache_mb."""
+    cache_dir = _cache_dir(cache_dir)
+    if not os.path.isdir(cache_dir):
+        return
+
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_dir() and os.path.exists(os.path.join(entry.path, 'meta.json')):
+            entries.append((entry.stat().st_mtime, entry.path, _entry_size(entry.path)))
+
+    total = sum(size for _, _, size in entries)
+    budget = max_cache_mb * 1024 * 1024
+    for _, path, size in sorted(entries):
+        if total <= budget:
+            break
+        if path == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def _drop_stale_entries(cache_dir: str, source: str) -> None:
+    """Remove entries built from an older version of the same file."""
+    for entry in os.scandir(cache_dir):
+        meta_path = os.path.join(entry.path, 'meta.json')
+        if not entry.is_dir() or not os.path.exists(meta_path):
+            continue
+        with open(meta_path, 'r') as f:
+            if json.load(f)['source'] == source:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def load_columns(
+    filename: str,
+    cache_dir: Optional[str] = None,
+    max_cache_mb: float = DEFAULT_MAX_CACHE_MB
+) -> Dict[str, np.ndarray]:
+    """
+    Return the columns of a CSV file as memory-mapped numpy arrays.
+    The first call for a given path/size/mtime converts the CSV into the cache;
+    later calls map the stored columns without parsing any text.
+    """
+    cache_dir = _cache_dir(cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    entry_dir = os.path.join(cache_dir, file_fingerprint(filename))
+
+    if not os.path.exists(os.path.join(entry_dir, 'meta.json')):
+        _drop_stale_entries(cache_dir, os.path.abspath(filename))
+        _build_entry(filename, entry_dir)
+        evict(cache_dir, max_cache_mb, keep=entry_dir)
+
+    # Touch the entry so eviction sees it as recently used
+    now = time.time()
+    os.utime(entry_dir, (now, now))
+
+    with open(os.path.join(entry_dir, 'meta.json'), 'r') as f:
+        columns = json.load(f)['columns']
+    return {
+        column: np.load(os.path.join(entry_dir, f"{column}.npy"), mmap_mode='r')
+        for column in columns
+    }
+
+
+def _as_text(values: np.ndarray) -> List[str]:
+    """Render a typed column back to the strings the CSV readers expect."""
+    if values.dtype.kind == 'S':
+        return [value.decode() for value in values.tolist()]
+    if values.dtype.kind == 'M':
+        return [str(value) for value in values.astype('datetime64[D]')]
+    return [str(value) for value in values.tolist()]
+
+
+def iter_cached_rows(filename: str, cache_dir: Optional[str] = None) -> Iterator[dict]:
+    """Yield the rows of a cached CSV file as dicts of strings, like csv.DictReader."""
+    columns = load_columns(filename, cache_dir)
+    names = list(columns)
+    texts = [_as_text(columns[name]) for name in names]
+    for values in zip(*texts):
+        yield dict(zip(names, values))
@@ -0,0 +1,133 @@
+import csv
+import hashlib
+import os
+from datetime import date, timedelta
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
+from typing import Callable, Iterable, Iterator, List, Sequence, Tuple, TypeVar
+
+T = TypeVar('T')
+
+EPOCH = date(1970, 1, 1)
+# Distinct date strings remembered by the parsers; input files hold a few hundred
+DATE_CACHE_SIZE = 1 << 16
+# Bytes hashed at the start of a file and just before an offset already read
+CHECKSUM_BYTES = 64 * 1024
+# Block size used to find the last complete line from the end of a file
+_SCAN_BLOCK = 64 * 1024
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def epoch_day(value: str) -> int:
+    """Days since 1970-01-01 for a YYYY-MM-DD string, memoized per distinct string."""
+    return (date.fromisoformat(value) - EPOCH).days
+
+
+def epoch_day_to_date(day: int) -> date:
+    return EPOCH + timedelta(days=day)
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_iso_date(value: str) -> date:
+    """date.fromisoformat, memoized per distinct string."""
+    return date.fromisoformat(value)
+
+
+def column_positions(header: Sequence[str], columns: Sequence[str]) -> List[int]:
+    """Positions of the named columns in a header row, in the order requested."""
+    missing = [column for column in columns if column not in header]
+    if missing:
+        raise ValueError(f"Missing columns {missing} in header {list(header)}")
+    return [header.index(column) for column in columns]
+
+
+def row_picker(positions: Sequence[int]) -> Callable[[Sequence[str]], Tuple[str, ...]]:
+    """A function returning the values at positions as a tuple, even for a single column."""
+    if len(positions) == 1:
+        position = positions[0]
+        return lambda row: (row[position],)
+    return itemgetter(*positions)
+
+
+def iter_rows(filename: str, columns: Sequence[str]) -> Iterator[Tuple[str, ...]]:
+    """
+    Yield the requested columns of every row as a tuple of strings, in the
+    order of columns. The header is resolved to positions once, so rows are
+    plain csv.reader lists instead of one dict per row. Blank lines are skipped
+    like csv.DictReader does.
+    """
+    with open(filename, 'r', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        pick = row_picker(column_positions(header, columns))
+        yield from map(pick, filter(None, reader))
+
+
+def read_range_lines(filename: str, start: int, end: int) -> Iterator[str]:
+    """Yield the decoded lines of the byte range [start, end) of a file; start is a line boundary."""
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        for line in f:
+            if remaining <= 0:
+                break
+            remaining -= len(line)
+            yield line.decode()
+
+
+def region_checksums(filename: str, offset: int) -> Tuple[str, str]:
+    """
+    sha1 of the first and of the last CHECKSUM_BYTES bytes before offset.
+    A file that was only appended to keeps both; a rewritten or truncated file
+    changes at least one of them with overwhelming probability.
+    """
+    with open(filename, 'rb') as f:
+        head = f.read(min(offset, CHECKSUM_BYTES))
+        tail_start = max(0, offset - CHECKSUM_BYTES)
+        f.seek(tail_start)
+        tail = f.read(offset - tail_start)
+    return hashlib.sha1(head).hexdigest(), hashlib.sha1(tail).hexdigest()
+
+
+def complete_lines_end(filename: str, start: int) -> int:
+    """
+    Offset just past the last newline at or after start, or start when no
+    complete line follows it. A line still being appended is left for the
+    next read.
+    """
+    with open(filename, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        while position > start:
+            block_start = max(start, position - _SCAN_BLOCK)
+            f.seek(block_start)
+            block = f.read(position - block_start)
+            newline = block.rfind(b'\n')
+            if newline >= 0:
+                return block_start + newline + 1
+            position = block_start
+    return start
+
+
+def header_end(filename: str) -> Tuple[list, int]:
+    """The header row of a CSV file and the offset of its first data row."""
+    with open(filename, 'rb') as f:
+        line = f.readline()
+    return next(csv.reader([line.decode()]), []), len(line)
+
+
+def chunked(rows: Iterable[T], chunk_size: int) -> Iterator[List[T]]:
+    """Group rows into lists of up to chunk_size rows."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_row_chunks(filename: str, columns: Sequence[str], chunk_size: int) -> Iterator[List[Tuple[str, ...]]]:
+    """iter_rows in lists of up to chunk_size rows."""
+    return chunked(iter_rows(filename, columns), chunk_size)
@@ -1,13 +1,34 @@
 # Copyright 2020 N26 GmbH
 
+import argparse
 import csv
 import os
 import random
+import shutil
 import uuid
-from typing import Dict, List, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional
+import numpy as np
+from partitioned_storage import partition_csv
 from utils import write_data
 from collections import defaultdict
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+
+# Defaults for the scalable generator
+DEFAULT_SEED = 42
+DEFAULT_CHUNK_SIZE = 1_000_000
+DEFAULT_END_DATE = date(2020, 12, 31)
+DEFAULT_DAYS_BACK = 100
+NUM_CATEGORIES = 11
+
+HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+# Positions of the four dashes in the 36 character UUID string
+UUID_DASHES = [8, 13, 18, 23]
+UUID_HEX_POSITIONS = [i for i in range(36) if i not in UUID_DASHES]
+
+# Transaction users and their preferred category, set once per worker
+_worker_users: Optional[np.ndarray] = None
+_worker_categories: Optional[np.ndarray] = None
 
 
 def generate_transactions(users: Dict[str, Any]) -> Dict[str, Any]:
@@ -174,4 +195,270 @@ def generate_agreements(users):
     return {
         'header': header,
         'data': data
-    } 
\ No newline at end of file
+    } 
+
+
+def random_uuids(rng: np.random.Generator, n: int) -> np.ndarray:
+    """Generate n random version 4 UUID strings as a fixed-width bytes ('S36') array."""
+    raw = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40  # version 4
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+
+    nibbles = np.empty((n, 32), dtype=np.uint8)
+    nibbles[:, 0::2] = raw >> 4
+    nibbles[:, 1::2] = raw & 0x0F
+
+    chars = np.full((n, 36), ord('-'), dtype=np.uint8)
+    chars[:, UUID_HEX_POSITIONS] = HEX_DIGITS[nibbles]
+    return chars.view('S36').ravel()
+
+
+def _text_field(values: np.ndarray) -> np.ndarray:
+    """View a fixed-width bytes array as an (n, width) matrix of NUL-padded characters."""
+    values = np.ascontiguousarray(values)
+    return values.view(np.uint8).reshape(len(values), values.dtype.itemsize)
+
+
+def _number_field(values: np.ndarray, digits: int, decimals: int = 0) -> np.ndarray:
+    """
+    Render non-negative integers as characters, NUL-padding leading zeros.
+    With decimals, the last digits go after a decimal point (cents -> 'd.dd').
+    """
+    width = digits + (decimals + 1 if decimals else 0)
+    chars = np.zeros((len(values), width), dtype=np.uint8)
+    remaining = values.astype(np.int64)
+    for position in range(width - 1, -1, -1):
+        if decimals and position == digits:
+            chars[:, position] = ord('.')
+            continue
+        chars[:, position] = ord('0') + remaining % 10
+        remaining //= 10
+    # Blank out leading zeros of the integer part, keeping at least one digit
+    leading = np.ones(len(values), dtype=bool)
+    for position in range(digits - 1):
+        leading &= chars[:, position] == ord('0')
+        chars[leading, position] = 0
+    return chars
+
+
+def csv_lines(fields: List[np.ndarray]) -> bytes:
+    """
+    Join character matrices into CSV lines in one vectorized pass.
+    Every field is an (n, width) uint8 matrix where NUL bytes are padding.
+    """
+    n = len(fields[0])
+    separator = np.full((n, 1), ord(','), dtype=np.uint8)
+    newline = np.full((n, 1), ord('\n'), dtype=np.uint8)
+    parts = []
+    for field in fields:
+        parts.extend([field, separator])
+    parts[-1] = newline
+    matrix = np.hstack(parts)
+    return matrix[matrix != 0].tobytes()
+
+
+def _init_transaction_worker(users: np.ndarray, categories: np.ndarray) -> None:
+    global _worker_users, _worker_categories
+    _worker_users = users
+    _worker_categories = categories
+
+
+def _write_transaction_chunk(
+    path: str,
+    seed: np.random.SeedSequence,
+    num_rows: int,
+    end_date: date,
+    days_back: int
+) -> int:
+    """Generate one chunk of transactions with its own seed and write it without a header."""
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(_worker_users), size=num_rows)
+
+    # 95% of transactions use the user's preferred category
+    categories = np.where(
+        rng.random(num_rows) < 0.95,
+        _worker_categories[picks],
+        rng.integers(0, NUM_CATEGORIES, size=num_rows)
+    )
+    dates = np.datetime64(end_date, 'D') - rng.integers(0, days_back + 1, size=num_rows)
+    blocked = np.where(rng.random(num_rows) < 0.01, b'True', b'False')
+    amount_cents = rng.integers(0, 5000, size=num_rows)
+
+    lines = csv_lines([
+        _text_field(random_uuids(rng, num_rows)),
+        _text_field(dates.astype('S10')),
+        _text_field(_worker_users[picks]),
+        _text_field(blocked),
+        _number_field(amount_cents, digits=2, decimals=2),
+        _number_field(categories, digits=2)
+    ])
+    with open(path, 'wb') as f:
+        f.write(lines)
+    return num_rows
+
+
+def write_agreement_versions(
+    path: str,
+    client_ids: np.ndarray,
+    versions_per_client: int,
+    rng: np.random.Generator,
+    start_date: date
+) -> int:
+    """
+    Write an SCD2 dim_dep_agreement.csv with one agreement per client.
+    Each agreement has versions_per_client consecutive versions of 5-60 days
+    starting at start_date; the last one is open-ended (9999-12-31). Half of
+    the versions repeat the previous product and rate, so they can be compacted.
+    """
+    num_clients = len(client_ids)
+    shape = (num_clients, versions_per_client)
+
+    durations = rng.integers(5, 61, size=shape)
+    offsets = np.cumsum(durations, axis=1) - durations
+    from_dates = np.datetime64(start_date, 'D') + offsets
+    to_dates = from_dates + durations
+    to_dates[:, -1] = np.datetime64('9999-12-31')
+
+    products = rng.integers(300, 601, size=shape)
+    rates = rng.integers(100, 1001, size=shape)  # interest rate in hundredths of a percent
+    repeats = rng.random(shape) < 0.5
+    for version in range(1, versions_per_client):
+        same = repeats[:, version]
+        products[same, version] = products[same, version - 1]
+        rates[same, version] = rates[same, version - 1]
+
+    num_rows = num_clients * versions_per_client
+    lines = csv_lines([
+        _number_field(np.arange(1, num_rows + 1), digits=12),
+        _number_field(np.repeat(np.arange(1, num_clients + 1), versions_per_client), digits=12),
+        _text_field(from_dates.ravel().astype('S10')),
+        _text_field(to_dates.ravel().astype('S10')),
+        _text_field(np.repeat(client_ids, versions_per_client)),
+        _number_field(products.ravel(), digits=3),
+        _number_field(rates.ravel(), digits=2, decimals=2)
+    ])
+    with open(path, 'wb') as f:
+        f.write(b'sk_agrmnt_id,agrmnt_id,actual_from_dt,actual_to_dt,client_id,product_id,interest_rate\n')
+        f.write(lines)
+    return num_rows
+
+
+def generate_dataset(
+    out_dir: str,
+    num_users: int = 1000,
+    num_transactions: int = 10000,
+    num_transaction_users: int = 1000,
+    active_ratio: float = 0.9,
+    seed: int = DEFAULT_SEED,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int = 1,
+    end_date: date = DEFAULT_END_DATE,
+    days_back: int = DEFAULT_DAYS_BACK,
+    agreement_versions: int = 0,
+    partitioned: bool = False
+) -> Dict[str, int]:
+    """
+    Generate users.csv and transactions.csv at any scale, and with
+    agreement_versions > 0 a dim_dep_agreement.csv for the users with transactions.
+    Rows are generated with vectorized numpy in chunks of chunk_size. Each chunk
+    has its own child seed, so the output only depends on seed and chunk_size,
+    not on the number of workers. Chunks are written as separate part files by
+    worker processes and concatenated in order. With partitioned, transactions
+    are split into a Hive-style transactions/date=YYYY-MM-DD/ layout instead of
+    one transactions.csv.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    users_path = os.path.join(out_dir, 'users.csv')
+    transactions_path = os.path.join(out_dir, 'transactions.csv')
+    agreements_path = os.path.join(out_dir, 'dim_dep_agreement.csv')
+    partitions_root = os.path.join(out_dir, 'transactions')
+    for path in (users_path, transactions_path, agreements_path, partitions_root):
+        if os.path.exists(path):
+            raise FileExistsError(f"File {path} already exists!")
+
+    num_chunks = -(-num_transactions // chunk_size)
+    users_seed, *chunk_seeds, agreements_seed = np.random.SeedSequence(seed).spawn(num_chunks + 2)
+    rng = np.random.default_rng(users_seed)
+
+    user_ids = random_uuids(rng, num_users)
+    is_active = np.where(rng.random(num_users) < active_ratio, b'1', b'0')
+    with open(users_path, 'wb') as f:
+        f.write(b'user_id,is_active\n')
+        for start in range(0, num_users, chunk_size):
+            end = start + chunk_size
+            f.write(csv_lines([_text_field(user_ids[start:end]), _text_field(is_active[start:end])]))
+
+    transaction_users = user_ids[rng.choice(num_users, size=min(num_transaction_users, num_users), replace=False)]
+    preferred_categories = rng.integers(0, NUM_CATEGORIES, size=len(transaction_users))
+
+    part_paths = [f"{transactions_path}.part-{i:05d}" for i in range(num_chunks)]
+    chunk_rows = [min(chunk_size, num_transactions - i * chunk_size) for i in range(num_chunks)]
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_transaction_worker,
+        initargs=(transaction_users, preferred_categories)
+    ) as pool:
+        futures = [
+            pool.submit(_write_transaction_chunk, path, chunk_seed, rows, end_date, days_back)
+            for path, chunk_seed, rows in zip(part_paths, chunk_seeds, chunk_rows)
+        ]
+        written = sum(future.result() for future in futures)
+
+    with open(transactions_path, 'wb') as out:
+        out.write(b'transaction_id,date,user_id,is_blocked,transaction_amount,transaction_category_id\n')
+        for path in part_paths:
+            with open(path, 'rb') as part:
+                shutil.copyfileobj(part, out, 16 * 1024 * 1024)
+            os.remove(path)
+
+    counts = {'users': num_users, 'transactions': written}
+    if partitioned:
+        counts['partitions'] = len(partition_csv(transactions_path, partitions_root))
+        os.remove(transactions_path)
+    if agreement_versions > 0:
+        counts['agreements'] = write_agreement_versions(
+            agreements_path,
+            transaction_users,
+            agreement_versions,
+            np.random.default_rng(agreements_seed),
+            end_date - timedelta(days=days_back + 30)
+        )
+    return counts
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Generate benchmark-size users.csv and transactions.csv.')
+    parser.add_argument('--out-dir', default='data', help='Directory for the generated files')
+    parser.add_argument('--users', type=int, default=1000, help='Number of users')
+    parser.add_argument('--transactions', type=int, default=10000, help='Number of transactions')
+    parser.add_argument('--transaction-users', type=int, default=1000,
+                        help='Number of users that have transactions')
+    parser.add_argument('--active-ratio', type=float, default=0.9, help='Share of active users')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Random seed')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rows per generated chunk')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+    parser.add_argument('--end-date', type=date.fromisoformat, default=DEFAULT_END_DATE,
+                        help='Latest transaction date (YYYY-MM-DD)')
+    parser.add_argument('--agreement-versions', type=int, default=0,
+                        help='SCD2 versions per agreement in dim_dep_agreement.csv (0: no agreements)')
+    parser.add_argument('--partitioned', action='store_true',
+                        help='Write transactions as date=YYYY-MM-DD/ partitions instead of one CSV')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    counts = generate_dataset(
+        args.out_dir,
+        num_users=args.users,
+        num_transactions=args.transactions,
+        num_transaction_users=args.transaction_users,
+        active_ratio=args.active_ratio,
+        seed=args.seed,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        end_date=args.end_date,
+        agreement_versions=args.agreement_versions,
+        partitioned=args.partitioned
+    )
+    print(f"Generated {counts} rows in {args.out_dir}")
@@ -1,26 +1,59 @@
 import csv
+import os
 from collections import defaultdict
-from typing import Dict, Set, Tuple, List
-from user_service import read_active_users
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple, List
+import numpy as np
+import pandas as pd
+from csv_cache import load_columns
+from csv_ingest import column_positions, read_range_lines
+from distinct_counters import HyperLogLog, UserBitmap
+from instrumentation import PipelineMetrics, stage, track
+from partitioned_storage import is_partitioned, iter_transaction_rows, transaction_files
+from user_service import UserIdDictionary, read_active_users
 
+# Rows per pandas chunk for the vectorized engine
+DEFAULT_CHUNK_SIZE = 1_000_000
+# Columns the category aggregation reads from transactions.csv
+TRANSACTION_COLUMNS = ('user_id', 'is_blocked', 'transaction_amount', 'transaction_category_id')
+# Shards per worker for the parallel engine; extra shards even out uneven workers
+SHARDS_PER_WORKER = 4
 
-def process_transactions(filename: str, active_users: Set[str]) -> Dict[int, Tuple[int, Set[str]]]:
+# Active users of the current parallel worker, set once by the pool initializer
+_worker_active_users: Set[str] = set()
+
+
+def process_transactions(
+    filename: str,
+    active_users: Set[str],
+    metrics: Optional[PipelineMetrics] = None,
+    rows: Optional[Iterable[Tuple[str, ...]]] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Dict[int, Tuple[int, Set[str]]]:
     """
     Process transactions and return aggregated data by category.
     Returns dict with category_id -> (sum_amount, set of unique user_ids)
+    filename is a transactions CSV or a date-partitioned directory; start and
+    end (inclusive YYYY-MM-DD) limit the dates aggregated, pruning partitions.
+    rows optionally supplies TRANSACTION_COLUMNS tuples that were already read
+    (e.g. by a prefetch thread) instead of reading filename.
     """
     category_data = defaultdict(lambda: (0, set()))  # (sum_amount, set of unique users)
+    if rows is None:
+        rows = iter_transaction_rows(filename, TRANSACTION_COLUMNS, start, end)
     
-    with open(filename, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
+    # Parsing, filtering and aggregation share one loop, so they are measured as one stage
+    with stage(metrics, 'scan_transactions') as scan:
+        for user_id, is_blocked, transaction_amount, transaction_category_id in rows:
+            scan.rows += 1
             # Skip if transaction is blocked or user not active
-            if row['is_blocked'] == 'True' or row['user_id'] not in active_users:
+            if is_blocked == 'True' or user_id not in active_users:
                 continue
                 
-            category_id = int(row['transaction_category_id'])
-            amount = int(float(row['transaction_amount']))
-            user_id = row['user_id']
+            category_id = int(transaction_category_id)
+            amount = int(float(transaction_amount))
             
             # Update category data
             current_sum, current_users = category_data[category_id]
@@ -31,10 +64,268 @@ def process_transactions(filename: str, active_users: Set[str]) -> Dict[int, Tup
     return category_data
 
 
+def _cached_chunks(filename: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Yield fixed-size slices of the memory-mapped cached columns as DataFrames."""
+    columns = load_columns(filename)
+    num_rows = len(columns['user_id'])
+    for start in range(0, num_rows, chunk_size):
+        end = start + chunk_size
+        yield pd.DataFrame({
+            'user_id': columns['user_id'][start:end].astype(str),
+            'is_blocked': np.where(columns['is_blocked'][start:end], 'True', 'False'),
+            'transaction_amount': columns['transaction_amount'][start:end],
+            'transaction_category_id': columns['transaction_category_id'][start:end]
+        })
+
+
+def read_transaction_chunks(
+    filename: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Parse the columns the aggregation needs in DataFrame chunks of up to
+    chunk_size rows, from a transactions CSV or a date-partitioned directory.
+    start and end limit the dates read: partitions outside the range are never
+    opened, a flat file is filtered chunk by chunk.
+    """
+    filter_dates = (start is not None or end is not None) and not is_partitioned(filename)
+    columns = list(TRANSACTION_COLUMNS) + (['date'] if filter_dates else [])
+    for path in transaction_files(filename, start, end):
+        chunks = pd.read_csv(
+            path,
+            usecols=columns,
+            dtype={
+                'user_id': str,
+                'is_blocked': str,
+                'transaction_amount': np.float64,
+                'transaction_category_id': np.int64,
+                'date': str
+            },
+            keep_default_na=False,
+            chunksize=chunk_size
+        )
+        for chunk in chunks:
+            if filter_dates:
+                mask = pd.Series(True, index=chunk.index)
+                if start is not None:
+                    mask &= chunk['date'] >= start
+                if end is not None:
+                    mask &= chunk['date'] <= end
+                chunk = chunk[mask]
+            yield chunk
+
+
+def process_transactions_vectorized(
+    filename: str,
+    active_users: Set[str],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    use_cache: bool = False,
+    metrics: Optional[PipelineMetrics] = None,
+    chunks: Optional[Iterable[pd.DataFrame]] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Dict[int, Tuple[int, Set[str]]]:
+    """
+    Columnar variant of process_transactions with the same result.
+    Reads the file in fixed-size chunks, filters blocked transactions and
+    inactive users with vectorized masks and aggregates each chunk with groupby.
+    With use_cache, chunks are sliced from the columnar cache instead of parsed.
+    chunks optionally supplies DataFrames from read_transaction_chunks that were
+    already read (e.g. by a prefetch thread). start and end limit the dates
+    aggregated as in read_transaction_chunks; the columnar cache covers whole
+    flat files only.
+    """
+    category_data = {}
+    active = pd.Index(list(active_users))
+
+    if chunks is None and use_cache:
+        if start is not None or end is not None or is_partitioned(filename):
+            raise ValueError("The columnar cache only serves whole flat transaction files")
+        chunks = _cached_chunks(filename, chunk_size)
+    elif chunks is None:
+        chunks = read_transaction_chunks(filename, chunk_size, start, end)
+    for chunk in track(metrics, 'read_chunks', chunks, count=len):
+        with stage(metrics, 'filter', len(chunk)):
+            mask = (chunk['is_blocked'] != 'True') & chunk['user_id'].isin(active)
+            valid = chunk[mask]
+        if valid.empty:
+            continue
+
+        with stage(metrics, 'aggregate', len(valid)):
+            # int(float(x)) truncates per row, so truncate before summing
+            amounts = np.trunc(valid['transaction_amount'].to_numpy()).astype(np.int64)
+            categories = valid['transaction_category_id'].to_numpy()
+            sums = pd.Series(amounts).groupby(categories).sum()
+            users = valid['user_id'].groupby(categories).unique()
+
+            for category_id, chunk_sum in sums.items():
+                current_sum, current_users = category_data.get(int(category_id), (0, set()))
+                current_users.update(users[category_id])
+                category_data[int(category_id)] = (current_sum + int(chunk_sum), current_users)
+
+    return category_data
+
+
+def process_transactions_interned(
+    filename: str,
+    active_users: UserBitmap,
+    user_ids: UserIdDictionary,
+    distinct: str = 'bitmap',
+    metrics: Optional[PipelineMetrics] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Dict[int, Tuple[int, object]]:
+    """
+    Variant of process_transactions that works on dense integer user ids.
+    Each category tracks its users in a UserBitmap ('bitmap', exact) or a
+    HyperLogLog ('hll', approximate with fixed memory per category).
+    Users missing from the dictionary are treated as inactive. Sketches hash
+    the user's UUID rather than its dense id, so 'hll' counts match the
+    parallel engine's on the same data.
+    start and end limit the dates aggregated as in process_transactions.
+    """
+    if distinct == 'bitmap':
+        new_counter = partial(UserBitmap, len(user_ids))
+    elif distinct == 'hll':
+        new_counter = HyperLogLog
+    else:
+        raise ValueError(f"Unsupported distinct mode for interned ids: {distinct}")
+    sketch_uuids = distinct == 'hll'
+
+    category_data = {}  # category_id -> [sum_amount, user counter]
+
+    with stage(metrics, 'scan_transactions') as scan:
+        for user_id, is_blocked, transaction_amount, transaction_category_id in iter_transaction_rows(
+            filename, TRANSACTION_COLUMNS, start, end
+        ):
+            scan.rows += 1
+            dense_id = user_ids.get(user_id)
+            if is_blocked == 'True' or dense_id is None or dense_id not in active_users:
+                continue
+
+            category_id = int(transaction_category_id)
+            entry = category_data.get(category_id)
+            if entry is None:
+                entry = category_data[category_id] = [0, new_counter()]
+            entry[0] += int(float(transaction_amount))
+            entry[1].add(user_id if sketch_uuids else dense_id)
+
+    return {category_id: (sum_amount, users) for category_id, (sum_amount, users) in category_data.items()}
+
+
+def split_shards(filename: str, num_shards: int) -> List[Tuple[int, int]]:
+    """
+    Split a CSV file into up to num_shards byte ranges that start and end on
+    line boundaries. The header line is excluded from every range.
+    """
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as f:
+        f.readline()
+        bounds = [f.tell()]
+        data_size = size - bounds[0]
+        for shard in range(1, num_shards):
+            target = bounds[0] + data_size * shard // num_shards
+            if target <= bounds[-1]:
+                continue
+            # Finish the line containing the byte before target
+            f.seek(target - 1)
+            f.readline()
+            position = f.tell()
+            if bounds[-1] < position < size:
+                bounds.append(position)
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+
+def _init_worker(active_users: Set[str]) -> None:
+    global _worker_active_users
+    _worker_active_users = active_users
+
+
+def _aggregate_shard(filename: str, start: int, end: int, distinct: str) -> Dict[int, Tuple[int, object]]:
+    """Aggregate one shard into mergeable (sum_amount, users) partials."""
+    with open(filename, 'r') as f:
+        header = next(csv.reader(f))
+    user_col, blocked_col, amount_col, category_col = column_positions(header, TRANSACTION_COLUMNS)
+    new_counter = HyperLogLog if distinct == 'hll' else set
+
+    partial_data = {}
+    for row in csv.reader(read_range_lines(filename, start, end)):
+        user_id = row[user_col]
+        if row[blocked_col] == 'True' or user_id not in _worker_active_users:
+            continue
+
+        category_id = int(row[category_col])
+        entry = partial_data.get(category_id)
+        if entry is None:
+            entry = partial_data[category_id] = [0, new_counter()]
+        entry[0] += int(float(row[amount_col]))
+        entry[1].add(user_id)
+
+    return {category_id: (sum_amount, users) for category_id, (sum_amount, users) in partial_data.items()}
+
+
+def merge_category_data(partials: Iterable[Dict[int, Tuple[int, object]]]) -> Dict[int, Tuple[int, object]]:
+    """Combine per-shard aggregates: sums are added, user sets or sketches are unioned."""
+    category_data = {}
+    for partial_data in partials:
+        for category_id, (sum_amount, users) in partial_data.items():
+            if category_id not in category_data:
+                category_data[category_id] = (sum_amount, users)
+                continue
+            current_sum, current_users = category_data[category_id]
+            current_users.update(users)
+            category_data[category_id] = (current_sum + sum_amount, current_users)
+    return category_data
+
+
+def process_transactions_parallel(
+    filename: str,
+    active_users: Set[str],
+    workers: Optional[int] = None,
+    distinct: str = 'exact',
+    metrics: Optional[PipelineMetrics] = None
+) -> Dict[int, Tuple[int, object]]:
+    """
+    Multi-process variant of process_transactions.
+    The file is split into line-aligned byte ranges, each range is aggregated
+    in a ProcessPoolExecutor worker and the partial results are merged.
+    distinct is 'exact' (sets of UUIDs) or 'hll' (HyperLogLog per category).
+    """
+    if distinct not in ('exact', 'hll'):
+        raise ValueError(f"Unsupported distinct mode for the parallel engine: {distinct}")
+    if is_partitioned(filename):
+        raise ValueError("The parallel engine shards a flat transactions CSV, not a partitioned directory")
+
+    workers = workers or os.cpu_count() or 1
+    with stage(metrics, 'split_shards'):
+        shards = split_shards(filename, workers * SHARDS_PER_WORKER)
+    if not shards:
+        return {}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(active_users,)) as pool:
+        futures = [pool.submit(_aggregate_shard, filename, start, end, distinct) for start, end in shards]
+        # Waiting on a shard is charged to aggregate_shards, folding it in to merge_partials.
+        # Rows are counted inside the workers, so shards do not contribute to throughput here.
+        partials = track(metrics, 'aggregate_shards', (future.result() for future in futures), count=lambda _: 0)
+        with stage(metrics, 'merge_partials'):
+            return merge_category_data(partials)
+
+
+ENGINES = {
+    'python': process_transactions,
+    'vectorized': process_transactions_vectorized,
+    'parallel': process_transactions_parallel
+}
+
+
 def format_results(category_data: Dict[int, Tuple[int, Set[str]]]) -> List[Tuple[int, int, int]]:
     """
     Format and sort the results.
     Returns list of (category_id, sum_amount, number_of_unique_users)
+    The user count is approximate when users are tracked with a HyperLogLog.
     """
     results = [
         (category_id, sum_amount, len(users))  # len(users) gives count of unique users
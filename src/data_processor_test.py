@@ -0,0 +1,209 @@
+import os
+import sys
+import tempfile
+from config.data_processor_test_config import (
+    USERS, USER_COLUMNS, SAMPLE_DATA, TRANSACTION_COLUMNS, EXPECTED_RESULTS
+)
+from data_processor import (
+    ENGINES, TRANSACTION_COLUMNS as AGGREGATED_COLUMNS, format_results, process_transactions,
+    process_transactions_interned, process_transactions_parallel, process_transactions_vectorized
+)
+from aggregate_checkpoint import process_transactions_incremental
+from concurrent_loading import ConcurrentLoader
+from csv_ingest import iter_row_chunks
+from distinct_counters import HyperLogLog
+from instrumentation import PipelineMetrics
+from main import process_concurrently
+from partitioned_storage import partition_csv, prune_partitions
+from user_service import UserIdDictionary, read_active_user_ids, read_active_users
+from utils import write_data
+
+
+def write_sample_files(directory):
+    users_path = os.path.join(directory, 'users.csv')
+    transactions_path = os.path.join(directory, 'transactions.csv')
+    write_data(users_path, USER_COLUMNS, USERS)
+    write_data(transactions_path, TRANSACTION_COLUMNS, SAMPLE_DATA)
+    return users_path, transactions_path
+
+
+def run_tests():
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            users_path, transactions_path = write_sample_files(directory)
+            active_users = read_active_users(users_path)
+
+            for engine, process in sorted(ENGINES.items()):
+                print(f"\nRunning '{engine}' engine...")
+                results = format_results(process(transactions_path, active_users))
+                for category_id, sum_amount, num_users in results:
+                    print(f"  {category_id},{sum_amount},{num_users}")
+
+                actual = {category_id: (sum_amount, num_users) for category_id, sum_amount, num_users in results}
+                assert actual == EXPECTED_RESULTS, \
+                    f"Engine '{engine}' mismatch: expected {EXPECTED_RESULTS}, got {actual}"
+
+            for distinct in ('bitmap', 'hll'):
+                print(f"\nRunning interned engine with '{distinct}' user counting...")
+                user_ids = UserIdDictionary()
+                active_ids = read_active_user_ids(users_path, user_ids)
+                category_data = process_transactions_interned(transactions_path, active_ids, user_ids, distinct)
+                actual = {category_id: (sum_amount, num_users)
+                          for category_id, sum_amount, num_users in format_results(category_data)}
+                assert actual == EXPECTED_RESULTS, \
+                    f"Distinct mode '{distinct}' mismatch: expected {EXPECTED_RESULTS}, got {actual}"
+
+            print("\nRunning vectorized engine through the columnar cache...")
+            cache_dir = os.environ.get('CSV_CACHE_DIR')
+            os.environ['CSV_CACHE_DIR'] = os.path.join(directory, 'cache')
+            try:
+                for _ in range(2):  # first run builds the cache, second maps it
+                    cached_users = read_active_users(users_path, use_cache=True)
+                    category_data = process_transactions_vectorized(transactions_path, cached_users, use_cache=True)
+                    actual = {category_id: (sum_amount, num_users)
+                              for category_id, sum_amount, num_users in format_results(category_data)}
+                    assert actual == EXPECTED_RESULTS, \
+                        f"Cached vectorized mismatch: expected {EXPECTED_RESULTS}, got {actual}"
+            finally:
+                if cache_dir is None:
+                    del os.environ['CSV_CACHE_DIR']
+                else:
+                    os.environ['CSV_CACHE_DIR'] = cache_dir
+
+            print("\nRunning parallel engine with 'hll' user counting...")
+            category_data = process_transactions_parallel(transactions_path, active_users, workers=2, distinct='hll')
+            actual = {category_id: (sum_amount, num_users)
+                      for category_id, sum_amount, num_users in format_results(category_data)}
+            assert actual == EXPECTED_RESULTS, \
+                f"Parallel 'hll' mismatch: expected {EXPECTED_RESULTS}, got {actual}"
+
+            print("\nComparing 'hll' counts of the interned and parallel engines...")
+            many_users_path = os.path.join(directory, 'many_users.csv')
+            many_transactions_path = os.path.join(directory, 'many_transactions.csv')
+            many_users = [[f"user-{i:05d}", '1'] for i in range(5000)]
+            write_data(many_users_path, USER_COLUMNS, many_users)
+            write_data(many_transactions_path, TRANSACTION_COLUMNS, [
+                [f"tx-{i}", '2020-01-01', user_id, 'False', '1.00', i % 3]
+                for i, (user_id, _) in enumerate(many_users * 2)
+            ])
+            user_ids = UserIdDictionary()
+            active_ids = read_active_user_ids(many_users_path, user_ids)
+            interned = format_results(
+                process_transactions_interned(many_transactions_path, active_ids, user_ids, 'hll')
+            )
+            parallel = format_results(process_transactions_parallel(
+                many_transactions_path, read_active_users(many_users_path), workers=2, distinct='hll'
+            ))
+            print(f"  interned: {interned}\n  parallel: {parallel}")
+            assert interned == parallel, f"'hll' counts differ: interned {interned}, parallel {parallel}"
+
+            print("\nRunning engines over date partitions...")
+            partitions_root = os.path.join(directory, 'transactions')
+            counts = partition_csv(transactions_path, partitions_root)
+            assert sum(counts.values()) == len(SAMPLE_DATA), f"Partitioned {counts}, expected {len(SAMPLE_DATA)} rows"
+            in_range = prune_partitions(partitions_root, '2020-01-10', '2020-01-15')
+            assert len(in_range) == 3, f"Expected 3 partitions between 2020-01-10 and 2020-01-15, got {in_range}"
+            for engine in ('python', 'vectorized'):
+                actual = {category_id: (sum_amount, num_users) for category_id, sum_amount, num_users
+                          in format_results(ENGINES[engine](partitions_root, active_users))}
+                assert actual == EXPECTED_RESULTS, \
+                    f"Partitioned '{engine}' mismatch: expected {EXPECTED_RESULTS}, got {actual}"
+                flat = format_results(ENGINES[engine](transactions_path, active_users, start='2020-01-10', end='2020-01-15'))
+                pruned = format_results(ENGINES[engine](partitions_root, active_users, start='2020-01-10', end='2020-01-15'))
+                print(f"  {engine}: {pruned}")
+                assert flat == pruned == [(1, 7, 1), (5, 0, 1)], \
+                    f"Date range '{engine}' mismatch: flat {flat}, partitioned {pruned}"
+
+            print("\nRunning python engine on prefetched chunks with users loaded in a worker...")
+            with ConcurrentLoader() as loader:
+                users_future = loader.submit(read_active_users, users_path)
+                chunks = loader.prefetch(iter_row_chunks(transactions_path, AGGREGATED_COLUMNS, 3), depth=1)
+                rows = (row for chunk in chunks for row in chunk)
+                category_data = process_transactions(transactions_path, users_future.result(), rows=rows)
+            actual = {category_id: (sum_amount, num_users)
+                      for category_id, sum_amount, num_users in format_results(category_data)}
+            assert actual == EXPECTED_RESULTS, \
+                f"Prefetched python engine mismatch: expected {EXPECTED_RESULTS}, got {actual}"
+
+            print("\nLoading users concurrently for a date range...")
+            working_dir = os.getcwd()
+            os.chdir(directory)  # process_concurrently reads users.csv from the working directory
+            try:
+                for engine in ('python', 'vectorized'):
+                    concurrent = format_results(process_concurrently(
+                        engine, transactions=transactions_path, start='2020-01-10', end='2020-01-15'
+                    ))
+                    assert concurrent == [(1, 7, 1), (5, 0, 1)], f"Concurrent '{engine}' date range: got {concurrent}"
+                try:
+                    process_concurrently(
+                        'vectorized', use_cache=True, transactions=transactions_path, start='2020-01-10', end='2020-01-15'
+                    )
+                    raise AssertionError("The cached vectorized engine ignored a date range")
+                except ValueError:
+                    pass
+            finally:
+                os.chdir(working_dir)
+
+            print("\nRecording stage metrics for the vectorized engine...")
+            metrics = PipelineMetrics('data_processor_test')
+            process_transactions_vectorized(transactions_path, active_users, chunk_size=2, metrics=metrics)
+            stages = {stage['stage']: stage for stage in metrics.report()['stages']}
+            for name, stage in stages.items():
+                print(f"  {name}: {stage['rows']} rows in {stage['calls']} calls")
+            num_transactions = sum(1 for _ in open(transactions_path)) - 1
+            assert stages['read_chunks']['rows'] == num_transactions, \
+                f"Expected {num_transactions} rows read, got {stages['read_chunks']['rows']}"
+            assert stages['filter']['calls'] == -(-num_transactions // 2), \
+                f"Expected one filter call per chunk, got {stages['filter']['calls']}"
+            assert 'aggregate' in stages, "Missing aggregate stage"
+
+            print("\nAggregating an appended transactions file from a checkpoint...")
+            appended_path = os.path.join(directory, 'appended.csv')
+            checkpoint = os.path.join(directory, 'aggregates.pickle')
+            write_data(appended_path, TRANSACTION_COLUMNS, SAMPLE_DATA[:5])
+            _, offset = process_transactions_incremental(appended_path, active_users, checkpoint, 'users-v1')
+            assert offset == 0, f"First run should build the checkpoint, resumed at {offset}"
+            with open(appended_path, 'a', newline='') as f:
+                f.writelines(','.join(map(str, row)) + '\r\n' for row in SAMPLE_DATA[5:])
+                f.write('ffff-4fff,2020-01-20,becf')  # incomplete line, left for the next run
+            metrics = PipelineMetrics('data_processor_test')
+            category_data, offset = process_transactions_incremental(
+                appended_path, active_users, checkpoint, 'users-v1', metrics
+            )
+            scanned = {stage['stage']: stage for stage in metrics.report()['stages']}['scan_transactions']['rows']
+            actual = {category_id: (sum_amount, num_users)
+                      for category_id, sum_amount, num_users in format_results(category_data)}
+            print(f"  resumed at byte {offset}, scanned {scanned} rows")
+            assert offset > 0 and scanned == len(SAMPLE_DATA) - 5, \
+                f"Expected to resume and scan {len(SAMPLE_DATA) - 5} rows, resumed at {offset} with {scanned}"
+            assert actual == EXPECTED_RESULTS, \
+                f"Checkpointed mismatch: expected {EXPECTED_RESULTS}, got {actual}"
+
+            os.remove(appended_path)
+            write_data(appended_path, TRANSACTION_COLUMNS, SAMPLE_DATA[::-1])
+            category_data, offset = process_transactions_incremental(appended_path, active_users, checkpoint, 'users-v1')
+            actual = {category_id: (sum_amount, num_users)
+                      for category_id, sum_amount, num_users in format_results(category_data)}
+            assert offset == 0, f"A rewritten file should be rebuilt, resumed at {offset}"
+            assert actual == EXPECTED_RESULTS, \
+                f"Rebuilt checkpoint mismatch: expected {EXPECTED_RESULTS}, got {actual}"
+            _, offset = process_transactions_incremental(appended_path, active_users, checkpoint, 'users-v2')
+            assert offset == 0, f"Changed users should rebuild the checkpoint, resumed at {offset}"
+
+        print("\nChecking HyperLogLog accuracy...")
+        counter = HyperLogLog()
+        for user_id in range(100000):
+            counter.add(user_id)
+        error = abs(len(counter) - 100000) / 100000
+        print(f"  Estimated {len(counter)} distinct users (error {error:.2%})")
+        assert error < 0.03, f"HyperLogLog error too large: {error:.2%}"
+
+    except Exception as e:
+        print(f"Error during test execution: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    print("Starting category aggregation tests...")
+    run_tests()
+    print("Tests completed successfully.")
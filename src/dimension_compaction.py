@@ -0,0 +1,235 @@
+import argparse
+import csv
+import sys
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+import duckdb
+import pandas as pd
+
+from csv_ingest import iter_rows, parse_iso_date
+
+COLUMNS = [
+    'sk_agrmnt_id',
+    'agrmnt_id',
+    'actual_from_dt',
+    'actual_to_dt',
+    'client_id',
+    'product_id',
+    'interest_rate'
+]
+DEFAULT_STORE_PATH = 'data/dim_dep_agreement.duckdb'
+
+SCHEMA = [
+    # Compacted versions that can no longer change
+    """
+    CREATE TABLE IF NOT EXISTS dim_dep_agreement_history (
+        sk_agrmnt_id BIGINT,
+        agrmnt_id VARCHAR,
+        actual_from_dt DATE,
+        actual_to_dt DATE,
+        client_id VARCHAR,
+        product_id BIGINT,
+        interest_rate DOUBLE
+    )
+    """,
+    # Latest compacted version of every agreement; later batches may extend it
+    """
+    CREATE TABLE IF NOT EXISTS dim_dep_agreement_current (
+        sk_agrmnt_id BIGINT,
+        agrmnt_id VARCHAR PRIMARY KEY,
+        actual_from_dt DATE,
+        actual_to_dt DATE,
+        client_id VARCHAR,
+        product_id BIGINT,
+        interest_rate DOUBLE
+    )
+    """
+]
+
+
+class DimensionVersion(NamedTuple):
+    sk_agrmnt_id: int
+    agrmnt_id: str
+    actual_from_dt: date
+    actual_to_dt: date
+    client_id: str
+    product_id: int
+    interest_rate: float
+
+
+def read_versions(filename: str) -> Iterator[DimensionVersion]:
+    """Stream typed versions from a dim_dep_agreement CSV."""
+    for sk, agrmnt_id, from_dt, to_dt, client_id, product_id, rate in iter_rows(filename, COLUMNS):
+        yield DimensionVersion(
+            int(sk), agrmnt_id, parse_iso_date(from_dt), parse_iso_date(to_dt),
+            client_id, int(product_id), float(rate)
+        )
+
+
+def compact_versions(versions: Iterable[DimensionVersion]) -> Iterator[DimensionVersion]:
+    """
+    Merge consecutive versions of an agreement with identical product_id and
+    interest_rate. Input must be sorted by (agrmnt_id, actual_from_dt).
+    A merged version keeps the first sk_agrmnt_id and actual_from_dt and takes
+    the actual_to_dt of the last version in the run. A version whose end date
+    overlaps the next version's start is closed at that start.
+    Only the open version of the current agreement is held in memory.
+    """
+    current: Optional[DimensionVersion] = None
+    for version in versions:
+        if current is not None and version.agrmnt_id == current.agrmnt_id:
+            if version.actual_from_dt < current.actual_from_dt:
+                raise ValueError(
+                    f"Versions of agreement {version.agrmnt_id} are not sorted by actual_from_dt "
+                    f"(sk_agrmnt_id {version.sk_agrmnt_id})"
+                )
+            if (version.product_id, version.interest_rate) == (current.product_id, current.interest_rate):
+                current = current._replace(actual_to_dt=version.actual_to_dt)
+                continue
+            if current.actual_to_dt > version.actual_from_dt:
+                current = current._replace(actual_to_dt=version.actual_from_dt)
+        if current is not None:
+            yield current
+        current = version
+    if current is not None:
+        yield current
+
+
+def write_versions(versions: Iterable[DimensionVersion], out: Optional[str] = None) -> int:
+    """Write versions as CSV to a file (or stdout) as they are produced."""
+    f = open(out, 'w', newline='') if out else sys.stdout
+    try:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        count = 0
+        for version in versions:
+            writer.writerow(version)
+            count += 1
+        return count
+    finally:
+        if out:
+            f.close()
+
+
+class CompactedDimension:
+    """
+    Compacted agreement dimension in a DuckDB file, maintained incrementally.
+    A batch only reads the current version of the agreements it contains:
+    those versions are merged with the batch, finished versions are appended
+    to the history table and the current versions are replaced.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.conn = duckdb.connect(path)
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> 'CompactedDimension':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _current_versions(self, agrmnt_ids: List[str]) -> Dict[str, DimensionVersion]:
+        self.conn.register('batch_agreements', pd.DataFrame({'agrmnt_id': agrmnt_ids}))
+        try:
+            rows = self.conn.execute(f"""
+                SELECT {', '.join(COLUMNS)}
+                FROM dim_dep_agreement_current
+                SEMI JOIN batch_agreements USING (agrmnt_id)
+            """).fetchall()
+        finally:
+            self.conn.unregister('batch_agreements')
+        return {row[1]: DimensionVersion(*row) for row in rows}
+
+    def merge_batch(self, versions: Iterable[DimensionVersion]) -> Dict[str, int]:
+        """
+        Merge a batch of new versions into the compacted dimension.
+        Batch versions of an agreement must start on or after its current version.
+        """
+        batch = sorted(versions, key=lambda v: (v.agrmnt_id, v.actual_from_dt))
+        if not batch:
+            return {'input': 0, 'closed': 0, 'current': 0}
+        current = self._current_versions(sorted({v.agrmnt_id for v in batch}))
+
+        def with_current() -> Iterator[DimensionVersion]:
+            agrmnt_id = None
+            for version in batch:
+                if version.agrmnt_id != agrmnt_id:
+                    agrmnt_id = version.agrmnt_id
+                    stored = current.get(agrmnt_id)
+                    if stored is not None:
+                        if version.actual_from_dt < stored.actual_from_dt:
+                            raise ValueError(
+                                f"Batch version {version.sk_agrmnt_id} of agreement {agrmnt_id} starts before "
+                                f"the stored current version ({stored.actual_from_dt})"
+                            )
+                        yield stored
+                yield version
+
+        closed, latest = [], {}
+        for version in compact_versions(with_current()):
+            previous = latest.get(version.agrmnt_id)
+            if previous is not None:
+                closed.append(previous)
+            latest[version.agrmnt_id] = version
+
+        closed_df = pd.DataFrame(closed, columns=COLUMNS)
+        latest_df = pd.DataFrame(list(latest.values()), columns=COLUMNS)
+        self.conn.execute("BEGIN TRANSACTION")
+        try:
+            self.conn.register('closed_versions', closed_df)
+            self.conn.register('latest_versions', latest_df)
+            self.conn.execute("INSERT INTO dim_dep_agreement_history SELECT * FROM closed_versions")
+            self.conn.execute("""
+                DELETE FROM dim_dep_agreement_current
+                WHERE agrmnt_id IN (SELECT agrmnt_id FROM latest_versions)
+            """)
+            self.conn.execute("INSERT INTO dim_dep_agreement_current SELECT * FROM latest_versions")
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        finally:
+            self.conn.unregister('closed_versions')
+            self.conn.unregister('latest_versions')
+        return {'input': len(batch), 'closed': len(closed), 'current': len(latest)}
+
+    def versions(self) -> Iterator[DimensionVersion]:
+        """The whole compacted dimension, ordered by (agrmnt_id, actual_from_dt)."""
+        cursor = self.conn.execute(f"""
+            SELECT {', '.join(COLUMNS)} FROM dim_dep_agreement_history
+            UNION ALL
+            SELECT {', '.join(COLUMNS)} FROM dim_dep_agreement_current
+            ORDER BY agrmnt_id, actual_from_dt
+        """)
+        while True:
+            batch = cursor.fetchmany(10000)
+            if not batch:
+                break
+            for row in batch:
+                yield DimensionVersion(*row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compact SCD2 versions of dim_dep_agreement.')
+    parser.add_argument('input', help='dim_dep_agreement CSV sorted by (agrmnt_id, actual_from_dt)')
+    parser.add_argument('--out', default=None, help='Output CSV (default: stdout)')
+    parser.add_argument('--store', default=None,
+                        help='Merge the input as a new batch into this compacted DuckDB dimension instead')
+    args = parser.parse_args()
+
+    if args.store:
+        with CompactedDimension(args.store) as dimension:
+            counts = dimension.merge_batch(read_versions(args.input))
+            print(f"Merged {counts['input']} versions: {counts['closed']} closed, {counts['current']} current")
+        return
+    write_versions(compact_versions(read_versions(args.input)), args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,17 @@
-import duckdb
 import pandas as pd
-from config.dimension_test_config import SAMPLE_DATA, COLUMNS
+from config.dimension_test_config import SAMPLE_DATA, COLUMNS, EXPECTED_COMPACTED
+from dimension_compaction import CompactedDimension, DimensionVersion, compact_versions
+from query_registry import close_connections, get_connection, registry
+import os
 import sys
-from datetime import datetime
-
-def read_query_file(file_path):
-    try:
-        with open(file_path, 'r') as f:
-            return f.read()
-    except Exception as e:
-        print(f"Error reading query file: {e}")
-        return None
+import tempfile
+from datetime import date, datetime
 
 def run_tests():
     try:
         print("Starting dimension deduplication tests...")
         print("Initializing DuckDB...")
-        conn = duckdb.connect(':memory:')
+        conn = get_connection()
         
         print("Creating test data...")
         # Create DataFrame with proper date types
@@ -29,11 +24,7 @@ def run_tests():
         conn.register('dim_dep_agreement', df)
         
         print("\nDeduplicating records...")
-        # Read and execute SQL query
-        with open('src/queries/dimension_deduplication/dimension_deduplication_optimized.sql', 'r') as f:
-            query = f.read()
-        
-        result = conn.execute(query).fetchdf()
+        result = registry.execute(conn, 'dimension_deduplication/dimension_deduplication_optimized').fetchdf()
         
         # Print statistics and analysis
         print("\nDeduplication Analysis:")
@@ -80,7 +71,33 @@ def run_tests():
         print("\nDeduplicated Results:")
         print(result.to_string(index=False))
         
-        conn.close()
+        close_connections()
+
+        print("\nCompacting with the streaming engine...")
+        versions = sorted(
+            (DimensionVersion(
+                row['sk_agrmnt_id'], str(row['agrmnt_id']),
+                date.fromisoformat(row['actual_from_dt']), date.fromisoformat(row['actual_to_dt']),
+                str(row['client_id']), row['product_id'], row['interest_rate']
+            ) for row in SAMPLE_DATA),
+            key=lambda v: (v.agrmnt_id, v.actual_from_dt)
+        )
+        compacted = [(v.sk_agrmnt_id, v.actual_from_dt.isoformat(), v.actual_to_dt.isoformat())
+                     for v in compact_versions(versions)]
+        for row in compacted:
+            print(f"  {row}")
+        assert compacted == EXPECTED_COMPACTED, f"Unexpected compaction: {compacted}"
+
+        print("\nCompacting incrementally in two batches...")
+        with tempfile.TemporaryDirectory() as directory:
+            with CompactedDimension(os.path.join(directory, 'dimension.duckdb')) as dimension:
+                first_batch = (1, 2, 6, 7, 10)
+                dimension.merge_batch(v for v in versions if v.sk_agrmnt_id in first_batch)
+                dimension.merge_batch(v for v in versions if v.sk_agrmnt_id not in first_batch)
+                incremental = [(v.sk_agrmnt_id, v.actual_from_dt.isoformat(), v.actual_to_dt.isoformat())
+                               for v in dimension.versions()]
+        assert incremental == EXPECTED_COMPACTED, f"Unexpected incremental compaction: {incremental}"
+        print("Incremental compaction matches the full compaction")
         
     except Exception as e:
         print(f"Error during test execution: {e}")
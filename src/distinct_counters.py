@@ -0,0 +1,76 @@
+import hashlib
+import math
+from typing import Union
+
+# Default HyperLogLog precision: 2^14 one-byte registers (16 KB) per counter,
+# about 0.8% standard error on the distinct count.
+DEFAULT_HLL_PRECISION = 14
+
+
+class UserBitmap:
+    """Set of dense integer user ids stored as one bit per id."""
+
+    def __init__(self, size: int = 0):
+        self._bits = bytearray((size + 7) // 8)
+
+    def add(self, user_id: int) -> None:
+        byte = user_id >> 3
+        if byte >= len(self._bits):
+            self._bits.extend(bytes(byte + 1 - len(self._bits)))
+        self._bits[byte] |= 1 << (user_id & 7)
+
+    def __contains__(self, user_id: int) -> bool:
+        byte = user_id >> 3
+        return byte < len(self._bits) and bool(self._bits[byte] & (1 << (user_id & 7)))
+
+    def __len__(self) -> int:
+        return bin(int.from_bytes(self._bits, 'little')).count('1')
+
+    def update(self, other: 'UserBitmap') -> None:
+        """Union another bitmap into this one."""
+        if len(other._bits) > len(self._bits):
+            self._bits.extend(bytes(len(other._bits) - len(self._bits)))
+        merged = int.from_bytes(self._bits, 'little') | int.from_bytes(other._bits, 'little')
+        self._bits = bytearray(merged.to_bytes(len(self._bits), 'little'))
+
+
+class HyperLogLog:
+    """Approximate distinct counter with fixed memory of 2^precision bytes."""
+
+    def __init__(self, precision: int = DEFAULT_HLL_PRECISION):
+        if not 4 <= precision <= 18:
+            raise ValueError(f"HyperLogLog precision must be between 4 and 18, got {precision}")
+        self.precision = precision
+        self._registers = bytearray(1 << precision)
+
+    def add(self, value: Union[int, str]) -> None:
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        hashed = int.from_bytes(digest, 'big')
+        rest_bits = 64 - self.precision
+        register = hashed >> rest_bits
+        rest = hashed & ((1 << rest_bits) - 1)
+        rank = rest_bits - rest.bit_length() + 1
+        if rank > self._registers[register]:
+            self._registers[register] = rank
+
+    def estimate(self) -> float:
+        m = len(self._registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self._registers)
+        zeros = self._registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Small range correction (linear counting)
+            return m * math.log(m / zeros)
+        return raw
+
+    def __len__(self) -> int:
+        return int(round(self.estimate()))
+
+    def update(self, other: 'HyperLogLog') -> None:
+        """Union another counter of the same precision into this one."""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog counters with different precision")
+        self._registers = bytearray(map(max, self._registers, other._registers))
+
+
+DISTINCT_MODES = ('exact', 'bitmap', 'hll')
@@ -0,0 +1,125 @@
+import heapq
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+# Upper bound on rows per pickle record when spilling a run; keeps pickling
+# overhead low. Records are smaller when the budget is tight (see _batch_rows).
+SPILL_BATCH_SIZE = 1000
+DEFAULT_MEMORY_BUDGET_MB = 256
+# Most runs merged at once; more runs are merged in several passes, so open
+# files and merge buffers do not grow with the input
+MAX_MERGE_FAN_IN = 16
+# Rows between two row size samples, so rows with variable-length strings
+# are charged by a running average instead of the first row's size
+ROW_SIZE_SAMPLE_INTERVAL = 64
+
+
+def estimate_row_size(row: Any) -> int:
+    """Rough in-memory size of a row: the container plus its values."""
+    values = row.values() if hasattr(row, 'values') else row
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in values)
+
+
+def _batch_rows(budget_bytes: float, row_size: float) -> int:
+    """Rows per spill record, so MAX_MERGE_FAN_IN runs each holding one record fit the budget."""
+    return max(1, min(SPILL_BATCH_SIZE, int(budget_bytes / MAX_MERGE_FAN_IN / max(row_size, 1))))
+
+
+def _write_run(rows: Iterable[Any], batch_rows: int, spill_dir: str) -> str:
+    """Write sorted rows to a new file in spill_dir as pickled batches and close it."""
+    fd, path = tempfile.mkstemp(dir=spill_dir, suffix='.run')
+    with os.fdopen(fd, 'wb') as spill:
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, batch_rows))
+            if not batch:
+                break
+            pickle.dump(batch, spill, pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def _read_run(path: str) -> Iterator[Any]:
+    """Stream rows back from a spilled run, one batch in memory at a time."""
+    with open(path, 'rb') as spill:
+        while True:
+            try:
+                batch = pickle.load(spill)
+            except EOFError:
+                return
+            yield from batch
+
+
+def _merge_runs(paths: List[str], key: Callable[[Any], Any], batch_rows: int, spill_dir: str) -> List[str]:
+    """
+    Merge runs MAX_MERGE_FAN_IN at a time until at most that many are left.
+    Groups keep their order, so rows with equal keys stay in input order.
+    """
+    while len(paths) > MAX_MERGE_FAN_IN:
+        merged = []
+        for start in range(0, len(paths), MAX_MERGE_FAN_IN):
+            group = paths[start:start + MAX_MERGE_FAN_IN]
+            if len(group) == 1:
+                merged.append(group[0])
+                continue
+            merged.append(_write_run(heapq.merge(*map(_read_run, group), key=key), batch_rows, spill_dir))
+            for path in group:
+                os.remove(path)
+        paths = merged
+    return paths
+
+
+def external_sort(
+    rows: Iterable[Any],
+    key: Callable[[Any], Any],
+    memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+    tmp_dir: Optional[str] = None
+) -> Iterator[Any]:
+    """
+    Sort rows under a memory budget.
+    Rows are buffered until the estimated size of the buffer exceeds the budget,
+    then sorted and spilled to a temp file. Row sizes are re-sampled every
+    ROW_SIZE_SAMPLE_INTERVAL rows. Spilled runs are merged at most
+    MAX_MERGE_FAN_IN at a time, in several passes when there are more, and the
+    last ones are merged lazily, so the caller receives rows as soon as the
+    input is exhausted. Open files and memory stay bounded by the budget
+    rather than growing with the input.
+    """
+    budget_bytes = memory_budget_mb * 1024 * 1024
+    run = []
+    run_bytes = 0.0
+    sampled_bytes = 0
+    samples = 0
+    row_size = 0.0
+    spill_dir = None
+    paths = []
+    try:
+        for row in rows:
+            if len(run) % ROW_SIZE_SAMPLE_INTERVAL == 0:
+                sampled_bytes += estimate_row_size(row)
+                samples += 1
+                row_size = sampled_bytes / samples
+            run.append(row)
+            run_bytes += row_size
+            if run_bytes >= budget_bytes:
+                if spill_dir is None:
+                    spill_dir = tempfile.mkdtemp(prefix='external_sort-', dir=tmp_dir)
+                run.sort(key=key)
+                paths.append(_write_run(run, _batch_rows(budget_bytes, row_size), spill_dir))
+                run = []
+                run_bytes = 0.0
+
+        run.sort(key=key)
+        if not paths:
+            yield from run
+            return
+
+        paths = _merge_runs(paths, key, _batch_rows(budget_bytes, row_size), spill_dir)
+        yield from heapq.merge(*map(_read_run, paths), iter(run), key=key)
+    finally:
+        if spill_dir is not None:
+            shutil.rmtree(spill_dir, ignore_errors=True)
@@ -0,0 +1,181 @@
+import argparse
+import csv
+import sys
+from collections import deque
+from datetime import date, timedelta
+from typing import Iterable, Iterator, Optional, Tuple
+
+import duckdb
+
+from csv_ingest import parse_iso_date
+from external_sort import DEFAULT_MEMORY_BUDGET_MB, external_sort
+from partitioned_storage import iter_transaction_rows, shift_date, sql_date_filter, sql_files
+from query_registry import registry
+
+FEATURE_COLUMN = '# Transactions within previous 7 days'
+FEATURE_HEADER = ['transaction_id', 'user_id', 'date', FEATURE_COLUMN]
+WINDOW_DAYS = 7
+MAIN_QUERY = 'feature_table/main'
+
+# (transaction_id, user_id, date)
+Transaction = Tuple[str, str, date]
+
+
+def read_transactions(
+    filename: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Iterator[Transaction]:
+    """
+    Stream (transaction_id, user_id, date) from a transactions CSV or a
+    date-partitioned directory, limited to start <= date <= end.
+    """
+    rows = iter_transaction_rows(filename, ('transaction_id', 'user_id', 'date'), start, end)
+    for transaction_id, user_id, date_str in rows:
+        yield transaction_id, user_id, parse_iso_date(date_str)
+
+
+def _lookback_start(start: Optional[str], window_days: int = WINDOW_DAYS) -> Optional[str]:
+    """First date whose transactions can count towards features from start on."""
+    return shift_date(start, -window_days) if start is not None else None
+
+
+def count_previous_transactions(
+    transactions: Iterable[Transaction],
+    window_days: int = WINDOW_DAYS
+) -> Iterator[Tuple[str, str, date, int]]:
+    """
+    Single pass over transactions sorted by (user_id, date).
+    For each transaction, counts the same user's transactions in the
+    window_days calendar days before its date (same-day transactions excluded).
+    Only the current user's window is held in memory: a deque of
+    [date, transactions on that date] pairs plus their running total.
+    """
+    current_user = None
+    window = deque()
+    total = 0
+    for transaction_id, user_id, day in transactions:
+        if user_id != current_user:
+            if current_user is not None and user_id < current_user:
+                raise ValueError(f"Transactions are not sorted by user_id at {transaction_id}")
+            current_user = user_id
+            window.clear()
+            total = 0
+        elif day < window[-1][0]:
+            raise ValueError(f"Transactions are not sorted by date at {transaction_id}")
+
+        window_start = day - timedelta(days=window_days)
+        while window and window[0][0] < window_start:
+            total -= window.popleft()[1]
+
+        same_day = window[-1][1] if window and window[-1][0] == day else 0
+        yield transaction_id, user_id, day, total - same_day
+
+        if same_day:
+            window[-1][1] += 1
+        else:
+            window.append([day, 1])
+        total += 1
+
+
+def compute_feature_table(
+    transactions_file: str,
+    presorted: bool = False,
+    memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Iterator[Tuple[str, str, date, int]]:
+    """
+    Stream the feature table for a transactions CSV with the native engine.
+    Unless presorted, input is ordered by (user_id, date) with an external sort.
+    start and end (inclusive YYYY-MM-DD) limit the output to those dates. Only
+    transactions from WINDOW_DAYS before start on are read, so a partitioned
+    input opens just the partitions the window can reach.
+    """
+    transactions = read_transactions(transactions_file, _lookback_start(start), end)
+    if not presorted:
+        transactions = external_sort(
+            transactions, key=lambda t: (t[1], t[2]), memory_budget_mb=memory_budget_mb
+        )
+    features = count_previous_transactions(transactions)
+    if start is None:
+        return features
+    first_day = parse_iso_date(start)
+    return (feature for feature in features if feature[2] >= first_day)
+
+
+def compute_feature_table_sql(
+    transactions_file: str,
+    query: str = MAIN_QUERY,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Iterator[Tuple[str, str, date, int]]:
+    """
+    Run the DuckDB window query over a transactions CSV (or the partitions
+    a date range needs) and stream its rows for start <= date <= end.
+    """
+    lookback_start = _lookback_start(start)
+    conn = duckdb.connect(':memory:')
+    try:
+        conn.execute(
+            f"CREATE VIEW transactions AS "
+            f"SELECT * FROM read_csv({sql_files(transactions_file, lookback_start, end)}, "
+            f"header = true, all_varchar = true) "
+            f"WHERE {sql_date_filter('CAST(date AS DATE)', lookback_start, end)}"
+        )
+        cursor = registry.execute(conn, query)
+        first_day = parse_iso_date(start) if start is not None else None
+        while True:
+            batch = cursor.fetchmany(10000)
+            if not batch:
+                break
+            if first_day is None:
+                yield from batch
+            else:
+                yield from (row for row in batch if row[2] >= first_day)
+    finally:
+        conn.close()
+
+
+ENGINES = {
+    'native': compute_feature_table,
+    'sql': compute_feature_table_sql
+}
+
+
+def write_feature_table(rows: Iterable[Tuple[str, str, date, int]], out: Optional[str] = None) -> int:
+    """Write feature rows as CSV to a file (or stdout) as they are produced."""
+    f = open(out, 'w', newline='') if out else sys.stdout
+    try:
+        writer = csv.writer(f)
+        writer.writerow(FEATURE_HEADER)
+        count = 0
+        for transaction_id, user_id, day, num_transactions in rows:
+            writer.writerow([transaction_id, user_id, day.isoformat(), num_transactions])
+            count += 1
+        return count
+    finally:
+        if out:
+            f.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compute the 7-day transaction count feature table.')
+    parser.add_argument('transactions', help='Transactions CSV file or date=YYYY-MM-DD/ partitioned directory')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='native')
+    parser.add_argument('--presorted', action='store_true',
+                        help='Input is already sorted by (user_id, date) (native engine)')
+    parser.add_argument('--start', default=None, help='First date to compute features for (YYYY-MM-DD)')
+    parser.add_argument('--end', default=None, help='Last date to compute features for (YYYY-MM-DD)')
+    parser.add_argument('--out', default=None, help='Output CSV (default: stdout)')
+    args = parser.parse_args()
+
+    if args.engine == 'native':
+        rows = compute_feature_table(args.transactions, presorted=args.presorted, start=args.start, end=args.end)
+    else:
+        rows = compute_feature_table_sql(args.transactions, start=args.start, end=args.end)
+    write_feature_table(rows, args.out)
+
+
+if __name__ == '__main__':
+    main()
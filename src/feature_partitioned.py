@@ -0,0 +1,186 @@
+import argparse
+import csv
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+import duckdb
+
+from feature_engine import FEATURE_HEADER, MAIN_QUERY
+from partitioned_storage import hash_partition, iter_transaction_rows
+from query_registry import registry, sql_literal
+
+DEFAULT_BUCKETS = 8
+DEFAULT_RETRIES = 2
+# DuckDB memory limit per worker; each bucket only has to fit its share of users
+BUCKET_MEMORY_LIMIT = '1GB'
+# The window query only reads these columns, so buckets carry nothing else
+BUCKET_COLUMNS = ('transaction_id', 'user_id', 'date')
+
+
+def partition_by_user(
+    transactions_file: str,
+    out_dir: str,
+    num_buckets: int = DEFAULT_BUCKETS
+) -> List[str]:
+    """
+    Hash-partition transactions by user_id into num_buckets CSV files.
+    Every user's transactions land in one bucket, so the per-user window can
+    be computed bucket by bucket. transactions_file may be a flat CSV or a
+    date-partitioned directory.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = [os.path.join(out_dir, f"bucket-{bucket:05d}.csv") for bucket in range(num_buckets)]
+    hash_partition(iter_transaction_rows(transactions_file, BUCKET_COLUMNS), BUCKET_COLUMNS, 'user_id', paths)
+    return paths
+
+
+def compute_bucket(
+    bucket_file: str,
+    out_file: str,
+    query: str = MAIN_QUERY,
+    memory_limit: str = BUCKET_MEMORY_LIMIT,
+    threads: int = 1
+) -> int:
+    """
+    Run the window query over one bucket in its own DuckDB connection and
+    write the features without a header. Runs in a worker process; the output
+    is written to a temp name and renamed, so a failed attempt leaves nothing
+    behind. Returns the number of feature rows.
+    """
+    conn = duckdb.connect(':memory:', config={'memory_limit': memory_limit, 'threads': threads})
+    try:
+        conn.execute(
+            "CREATE VIEW transactions AS "
+            f"SELECT * FROM read_csv({sql_literal(bucket_file)}, header = true, all_varchar = true)"
+        )
+        partial_file = out_file + '.partial'
+        select = registry.statements(query)[0].query.strip().rstrip(';')
+        (num_rows,) = conn.execute(
+            f"COPY ({select}) TO {sql_literal(partial_file)} (FORMAT csv, HEADER false)"
+        ).fetchone()
+    finally:
+        conn.close()
+    os.replace(partial_file, out_file)
+    return num_rows
+
+
+def run_buckets(
+    bucket_files: List[str],
+    out_dir: str,
+    workers: Optional[int] = None,
+    retries: int = DEFAULT_RETRIES,
+    memory_limit: str = BUCKET_MEMORY_LIMIT
+) -> List[Tuple[str, int]]:
+    """
+    Coordinator: compute every bucket in a pool of worker processes and retry
+    failed buckets up to `retries` times. A worker that dies (e.g. killed for
+    running out of memory) breaks the pool; the pool is then replaced and every
+    unfinished bucket is resubmitted, counting as an attempt for each.
+    Returns (output file, feature rows) pairs in bucket order.
+    """
+    out_files = [os.path.join(out_dir, f"features-{bucket:05d}.csv") for bucket in range(len(bucket_files))]
+    attempts: Dict[int, int] = {bucket: 0 for bucket in range(len(bucket_files))}
+    num_rows: Dict[int, int] = {}
+    pending = set(attempts)
+    workers = workers or os.cpu_count() or 1
+
+    def give_up(bucket: int, error: BaseException):
+        raise RuntimeError(f"Bucket {bucket} failed after {attempts[bucket]} attempts: {error}") from error
+
+    while pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            running = {}
+
+            def submit(bucket: int) -> None:
+                attempts[bucket] += 1
+                future = pool.submit(compute_bucket, bucket_files[bucket], out_files[bucket], memory_limit=memory_limit)
+                running[future] = bucket
+
+            for bucket in sorted(pending):
+                submit(bucket)
+            try:
+                while running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        bucket = running.pop(future)
+                        error = future.exception()
+                        if error is None:
+                            num_rows[bucket] = future.result()
+                            pending.discard(bucket)
+                        elif isinstance(error, BrokenProcessPool):
+                            raise error
+                        elif attempts[bucket] > retries:
+                            give_up(bucket, error)
+                        else:
+                            print(f"Bucket {bucket} failed ({error}), retrying", file=sys.stderr)
+                            submit(bucket)
+            except BrokenProcessPool as error:
+                for bucket in pending:
+                    if attempts[bucket] > retries:
+                        give_up(bucket, error)
+                print(f"Worker pool broke ({error}), resubmitting {len(pending)} buckets", file=sys.stderr)
+    return [(out_file, num_rows[bucket]) for bucket, out_file in enumerate(out_files)]
+
+
+def compute_feature_table_partitioned(
+    transactions_file: str,
+    out: Optional[str] = None,
+    num_buckets: int = DEFAULT_BUCKETS,
+    workers: Optional[int] = None,
+    retries: int = DEFAULT_RETRIES,
+    memory_limit: str = BUCKET_MEMORY_LIMIT,
+    work_dir: Optional[str] = None
+) -> int:
+    """
+    Compute the feature table by hash-partitioning users into num_buckets,
+    running the window query per bucket in worker processes and concatenating
+    the bucket outputs to out (or stdout). Rows are ordered by (user_id, date)
+    within each bucket. Returns the number of feature rows.
+    """
+    scratch = tempfile.mkdtemp(prefix='feature-buckets-', dir=work_dir)
+    try:
+        bucket_files = partition_by_user(transactions_file, os.path.join(scratch, 'input'), num_buckets)
+        results = run_buckets(bucket_files, scratch, workers, retries, memory_limit)
+
+        f = open(out, 'w', newline='') if out else sys.stdout
+        try:
+            # DuckDB's COPY ends lines with \n, so the header does too
+            csv.writer(f, lineterminator='\n').writerow(FEATURE_HEADER)
+            f.flush()
+            for path, _ in results:
+                with open(path, 'r', newline='') as part:
+                    shutil.copyfileobj(part, f, 1 << 20)
+            return sum(num_rows for _, num_rows in results)
+        finally:
+            if out:
+                f.close()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compute the 7-day feature table in hash-partitioned user buckets across worker processes.'
+    )
+    parser.add_argument('transactions', help='Transactions CSV file or date=YYYY-MM-DD/ partitioned directory')
+    parser.add_argument('--buckets', type=int, default=DEFAULT_BUCKETS, help='Number of user_id hash buckets')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES, help='Retries per failed bucket')
+    parser.add_argument('--memory-limit', default=BUCKET_MEMORY_LIMIT, help='DuckDB memory limit per worker')
+    parser.add_argument('--work-dir', default=None, help='Directory for bucket files (default: system temp)')
+    parser.add_argument('--out', default=None, help='Output CSV (default: stdout)')
+    args = parser.parse_args()
+
+    num_rows = compute_feature_table_partitioned(
+        args.transactions, args.out, args.buckets, args.workers, args.retries, args.memory_limit, args.work_dir
+    )
+    print(f"Computed {num_rows} feature rows in {args.buckets} buckets", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+import argparse
+import http.client
+import json
+import os
+import socket
+import sys
+import threading
+from array import array
+from bisect import bisect_left, insort
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from csv_ingest import epoch_day
+from feature_engine import WINDOW_DAYS, read_transactions
+from feature_store import FeatureStore
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# Largest request body accepted, so a bad client cannot make the server buffer without bound
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+DateLike = Union[str, date]
+
+
+def _day(value: DateLike) -> int:
+    """Days since the epoch of a date or YYYY-MM-DD string."""
+    if isinstance(value, str):
+        return epoch_day(value)
+    if isinstance(value, date):
+        return epoch_day(value.isoformat())
+    raise TypeError(f"Expected a date or YYYY-MM-DD string, got {type(value).__name__} {value!r}")
+
+
+class FeatureIndex:
+    """
+    In-memory index of every user's transaction dates, as a sorted array of
+    days since the epoch per user. A lookup counts the user's transactions in
+    the window_days calendar days before as_of (same-day excluded, like
+    main.sql) with two binary searches, so it never scans history.
+    New transactions are inserted in place; dates at or after a user's latest
+    date are plain appends.
+    """
+
+    def __init__(self):
+        self._days: Dict[str, array] = {}
+        self._lock = threading.Lock()
+        self.num_transactions = 0
+
+    def __len__(self) -> int:
+        return len(self._days)
+
+    def add(self, user_id: str, day: DateLike) -> None:
+        value = _day(day)
+        with self._lock:
+            days = self._days.get(user_id)
+            if days is None:
+                days = self._days[user_id] = array('i')
+            if not days or days[-1] <= value:
+                days.append(value)
+            else:
+                insort(days, value)
+            self.num_transactions += 1
+
+    def add_many(self, transactions: Iterable[Tuple[str, DateLike]]) -> int:
+        """Add (user_id, date) pairs; returns how many were added."""
+        count = 0
+        for user_id, day in transactions:
+            self.add(user_id, day)
+            count += 1
+        return count
+
+    def count(self, user_id: str, as_of: DateLike, window_days: int = WINDOW_DAYS) -> int:
+        """Transactions of user_id with as_of - window_days <= date < as_of."""
+        day = _day(as_of)
+        with self._lock:
+            days = self._days.get(user_id)
+            if not days:
+                return 0
+            return bisect_left(days, day) - bisect_left(days, day - window_days)
+
+    def count_many(self, lookups: Sequence[Tuple[str, DateLike]], window_days: int = WINDOW_DAYS) -> List[int]:
+        return [self.count(user_id, as_of, window_days) for user_id, as_of in lookups]
+
+    @classmethod
+    def from_store(cls, store: FeatureStore) -> 'FeatureIndex':
+        """Index every transaction already in a feature store."""
+        index = cls()
+        index.add_many(store.iter_transaction_dates())
+        return index
+
+    @classmethod
+    def from_transactions(cls, filename: str) -> 'FeatureIndex':
+        """Index a transactions CSV or date-partitioned directory."""
+        index = cls()
+        index.add_many((user_id, day) for _, user_id, day in read_transactions(filename))
+        return index
+
+
+class FeatureService:
+    """
+    The operations behind the server: lookups against the index and ingestion
+    of new transactions. With a store, ingested transactions are appended to
+    it first, so the store validates them and stays in step with the index.
+    """
+
+    def __init__(self, index: FeatureIndex, store: Optional[FeatureStore] = None):
+        self.index = index
+        self.store = store
+        self._ingest_lock = threading.Lock()
+
+    def health(self) -> dict:
+        return {'users': len(self.index), 'transactions': self.index.num_transactions}
+
+    def lookup(self, request: dict) -> dict:
+        window_days = int(request.get('window_days', WINDOW_DAYS))
+        return {'count': self.index.count(request['user_id'], request['as_of'], window_days)}
+
+    def lookup_batch(self, request: dict) -> dict:
+        window_days = int(request.get('window_days', WINDOW_DAYS))
+        return {'counts': self.index.count_many(request['lookups'], window_days)}
+
+    def ingest(self, request: dict) -> dict:
+        """Add [transaction_id, user_id, YYYY-MM-DD] rows without reloading anything."""
+        transactions = [
+            (transaction_id, user_id, date.fromisoformat(day))
+            for transaction_id, user_id, day in request['transactions']
+        ]
+        with self._ingest_lock:
+            if self.store is not None and not self.store.append_batch(transactions, request.get('batch_id')):
+                # Nothing new, or a batch the store already loaded
+                return {'ingested': 0}
+            count = self.index.add_many((user_id, day) for _, user_id, day in transactions)
+        return {'ingested': count}
+
+    ROUTES = {
+        ('GET', '/health'): health,
+        ('POST', '/lookup'): lookup,
+        ('POST', '/lookup_batch'): lookup_batch,
+        ('POST', '/ingest'): ingest
+    }
+
+
+class FeatureRequestHandler(BaseHTTPRequestHandler):
+    """JSON over HTTP/1.1 with keep-alive, so a client pays for connecting once."""
+
+    protocol_version = 'HTTP/1.1'
+    # Buffer each response so headers and body leave in one send instead of stalling on Nagle
+    wbufsize = -1
+    service: FeatureService = None
+
+    def _respond(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method: str) -> None:
+        route = FeatureService.ROUTES.get((method, self.path))
+        if route is None:
+            self._respond(404, {'error': f"No route for {method} {self.path}"})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_REQUEST_BYTES:
+            self._respond(413, {'error': f"Request body over {MAX_REQUEST_BYTES} bytes"})
+            self.close_connection = True
+            return
+        try:
+            request = json.loads(self.rfile.read(length)) if length else {}
+            self._respond(200, route(self.service, request) if method == 'POST' else route(self.service))
+        except (KeyError, TypeError, ValueError) as e:
+            self._respond(400, {'error': f"{type(e).__name__}: {e}"})
+
+    def do_GET(self) -> None:
+        self._handle('GET')
+
+    def do_POST(self) -> None:
+        self._handle('POST')
+
+    def address_string(self) -> str:
+        # Unix socket peers have no address
+        return str(self.client_address or 'unix')
+
+    def log_message(self, format: str, *args) -> None:
+        # Per-request logging would dominate sub-millisecond lookups
+        pass
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self) -> None:
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        super().server_bind()
+
+
+def make_server(
+    service: FeatureService,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    socket_path: Optional[str] = None
+):
+    """
+    An HTTP server for the service on localhost (port 0 picks a free port),
+    or on a Unix socket when socket_path is given. Call serve_forever() on it.
+    """
+    handler = type('BoundFeatureRequestHandler', (FeatureRequestHandler,), {'service': service})
+    if socket_path is not None:
+        return ThreadingUnixHTTPServer(socket_path, handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class FeatureClient:
+    """
+    Client for the feature server over localhost HTTP or a Unix socket.
+    One connection is kept open and reused for every request; a client is
+    not meant to be shared between threads.
+    """
+
+    def __init__(
+        self,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        socket_path: Optional[str] = None,
+        timeout: float = 5.0
+    ):
+        if socket_path is not None:
+            self._conn = _UnixHTTPConnection(socket_path, timeout)
+        else:
+            self._conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        # Small requests go out at once instead of waiting on Nagle's algorithm
+        self._conn.connect()
+        if self._conn.sock.family != socket.AF_UNIX:
+            self._conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _request(self, method: str, path: str, payload: Optional[dict] = None) -> dict:
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        self._conn.request(method, path, body, headers)
+        response = self._conn.getresponse()
+        result = json.loads(response.read())
+        if response.status != 200:
+            raise RuntimeError(f"Feature server returned {response.status}: {result.get('error')}")
+        return result
+
+    def health(self) -> dict:
+        return self._request('GET', '/health')
+
+    def lookup(self, user_id: str, as_of: DateLike, window_days: int = WINDOW_DAYS) -> int:
+        """Transactions of user_id in the window_days before as_of."""
+        as_of = as_of if isinstance(as_of, str) else as_of.isoformat()
+        return self._request('POST', '/lookup', {'user_id': user_id, 'as_of': as_of, 'window_days': window_days})['count']
+
+    def lookup_batch(self, lookups: Iterable[Tuple[str, DateLike]], window_days: int = WINDOW_DAYS) -> List[int]:
+        """lookup for many (user_id, as_of) pairs in one round trip."""
+        pairs = [[user_id, as_of if isinstance(as_of, str) else as_of.isoformat()] for user_id, as_of in lookups]
+        return self._request('POST', '/lookup_batch', {'lookups': pairs, 'window_days': window_days})['counts']
+
+    def ingest(self, transactions: Iterable[Tuple[str, str, DateLike]], batch_id: Optional[str] = None) -> int:
+        """Add (transaction_id, user_id, date) rows to the running server."""
+        rows = [
+            [transaction_id, user_id, day if isinstance(day, str) else day.isoformat()]
+            for transaction_id, user_id, day in transactions
+        ]
+        return self._request('POST', '/ingest', {'transactions': rows, 'batch_id': batch_id})['ingested']
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> 'FeatureClient':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve 7-day transaction counts from an in-memory index.')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--store', help='DuckDB feature store to load; ingested transactions are appended to it')
+    source.add_argument('--transactions', help='Transactions CSV or date=YYYY-MM-DD/ partitioned directory to load')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='Address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on')
+    parser.add_argument('--socket', default=None, help='Listen on this Unix socket instead of TCP')
+    args = parser.parse_args()
+
+    store = FeatureStore(args.store) if args.store else None
+    index = FeatureIndex.from_store(store) if store else FeatureIndex.from_transactions(args.transactions)
+    server = make_server(FeatureService(index, store), args.host, args.port, args.socket)
+    where = args.socket or f"http://{args.host}:{server.server_address[1]}"
+    print(f"Serving {index.num_transactions} transactions of {len(index)} users on {where}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if store is not None:
+            store.close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == '__main__':
+    main()
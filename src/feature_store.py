@@ -0,0 +1,188 @@
+import argparse
+import os
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import duckdb
+import pandas as pd
+
+from feature_engine import FEATURE_COLUMN, WINDOW_DAYS, Transaction, count_previous_transactions, read_transactions
+
+DEFAULT_STORE_PATH = 'data/feature_store.duckdb'
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS transaction_features (
+        transaction_id VARCHAR,
+        user_id VARCHAR,
+        date DATE,
+        transactions_last_7_days INTEGER
+    )
+    """,
+    # Dates inside each user's trailing window, enough to continue the feature
+    # for any later transaction without reading older history.
+    """
+    CREATE TABLE IF NOT EXISTS user_window_state (
+        user_id VARCHAR,
+        date DATE,
+        num_transactions INTEGER
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_user_window_state_user ON user_window_state(user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS loaded_batches (
+        batch_id VARCHAR PRIMARY KEY,
+        num_rows BIGINT,
+        loaded_at TIMESTAMP DEFAULT current_timestamp
+    )
+    """
+]
+
+
+class FeatureStore:
+    """
+    Persisted 7-day transaction count feature, maintained incrementally.
+    Each batch only reads the window state of the users it contains, computes
+    features for its own rows and replaces those users' state.
+    Batches must not contain dates earlier than what was already loaded for a user.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH, window_days: int = WINDOW_DAYS):
+        self.window_days = window_days
+        self.conn = duckdb.connect(path)
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> 'FeatureStore':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _load_state(self, user_ids: List[str]) -> pd.DataFrame:
+        self.conn.register('batch_users', pd.DataFrame({'user_id': user_ids}))
+        try:
+            return self.conn.execute("""
+                SELECT s.user_id, s.date, s.num_transactions
+                FROM user_window_state s
+                SEMI JOIN batch_users b ON s.user_id = b.user_id
+                ORDER BY s.user_id, s.date
+            """).fetchdf()
+        finally:
+            self.conn.unregister('batch_users')
+
+    def append_batch(self, transactions: Iterable[Transaction], batch_id: Optional[str] = None) -> int:
+        """
+        Compute and store features for a batch of (transaction_id, user_id, date).
+        Returns the number of rows stored; a batch_id that was already loaded is skipped.
+        """
+        if batch_id is not None and self.conn.execute(
+            "SELECT 1 FROM loaded_batches WHERE batch_id = ?", [batch_id]
+        ).fetchone():
+            print(f"Batch {batch_id} already loaded, skipping")
+            return 0
+
+        batch = sorted(transactions, key=lambda t: (t[1], t[2]))
+        if not batch:
+            return 0
+        user_ids = sorted({user_id for _, user_id, _ in batch})
+        state = self._load_state(user_ids)
+
+        # Seed each user's window with the stored dates as unnamed transactions
+        seeds = defaultdict(list)
+        for user_id, day, num_transactions in state.itertuples(index=False):
+            seeds[user_id].extend([(None, user_id, pd.Timestamp(day).date())] * int(num_transactions))
+
+        first_date = {}
+        for transaction in batch:
+            first_date.setdefault(transaction[1], transaction[2])
+        for user_id, seed in seeds.items():
+            if seed[-1][2] > first_date[user_id]:
+                raise ValueError(
+                    f"Batch has transactions for user {user_id} on {first_date[user_id]}, "
+                    f"before already loaded data ({seed[-1][2]})"
+                )
+
+        def with_state() -> Iterable[Transaction]:
+            current_user = None
+            for transaction in batch:
+                if transaction[1] != current_user:
+                    current_user = transaction[1]
+                    yield from seeds.get(current_user, [])
+                yield transaction
+
+        features = [
+            row for row in count_previous_transactions(with_state(), self.window_days)
+            if row[0] is not None
+        ]
+        features_df = pd.DataFrame(features, columns=['transaction_id', 'user_id', 'date', 'transactions_last_7_days'])
+
+        # New state: each user's dates within the window of their latest date
+        windows = defaultdict(lambda: defaultdict(int))
+        for _, user_id, day in batch + [seed for user_seeds in seeds.values() for seed in user_seeds]:
+            windows[user_id][day] += 1
+        state_rows = []
+        for user_id, counts in windows.items():
+            keep_from = max(counts) - timedelta(days=self.window_days)
+            state_rows.extend((user_id, day, n) for day, n in counts.items() if day >= keep_from)
+        state_df = pd.DataFrame(state_rows, columns=['user_id', 'date', 'num_transactions'])
+
+        self.conn.execute("BEGIN TRANSACTION")
+        try:
+            self.conn.register('new_features', features_df)
+            self.conn.register('new_state', state_df)
+            self.conn.execute("INSERT INTO transaction_features SELECT * FROM new_features")
+            self.conn.execute("DELETE FROM user_window_state WHERE user_id IN (SELECT DISTINCT user_id FROM new_state)")
+            self.conn.execute("INSERT INTO user_window_state SELECT * FROM new_state")
+            if batch_id is not None:
+                self.conn.execute(
+                    "INSERT INTO loaded_batches (batch_id, num_rows) VALUES (?, ?)", [batch_id, len(features)]
+                )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        finally:
+            self.conn.unregister('new_features')
+            self.conn.unregister('new_state')
+        return len(features)
+
+    def append_file(self, filename: str, batch_id: Optional[str] = None) -> int:
+        """Load a daily transactions CSV; the file name is the default batch id."""
+        return self.append_batch(read_transactions(filename), batch_id or os.path.basename(filename))
+
+    def iter_transaction_dates(self, batch_size: int = 10000) -> Iterator[Tuple[str, date]]:
+        """(user_id, date) of every stored transaction, ordered by user and date."""
+        cursor = self.conn.execute("SELECT user_id, date FROM transaction_features ORDER BY user_id, date")
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                return
+            yield from batch
+
+    def features(self) -> pd.DataFrame:
+        """The stored feature table, in the same layout as queries/feature_table/main.sql."""
+        return self.conn.execute(f"""
+            SELECT transaction_id, user_id, date, transactions_last_7_days AS "{FEATURE_COLUMN}"
+            FROM transaction_features
+            ORDER BY user_id, date
+        """).fetchdf()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Append daily transaction batches to the feature store.')
+    parser.add_argument('batches', nargs='+', help='Transactions CSV files, in date order')
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH, help='DuckDB feature store file')
+    args = parser.parse_args()
+
+    with FeatureStore(args.store) as store:
+        for filename in args.batches:
+            print(f"Loaded {store.append_file(filename)} transactions from {filename}")
+
+
+if __name__ == '__main__':
+    main()
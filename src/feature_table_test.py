@@ -1,22 +1,24 @@
-import duckdb
 import pandas as pd
 from datetime import datetime, timedelta
 from config.test_config import SAMPLE_DATA, EXPECTED_COLUMNS
+from csv_ingest import epoch_day, epoch_day_to_date
+from feature_engine import FEATURE_COLUMN, count_previous_transactions
+from feature_partitioned import compute_feature_table_partitioned
+from feature_server import FeatureClient, FeatureIndex, FeatureService, make_server
+from feature_windows import compute_window_features, feature_columns
+from feature_store import FeatureStore
+from query_profiler import find_plan_regressions, profile_queries, summarize_profile
+from query_registry import Warehouse, close_connections, get_connection, registry
+import os
 import sys
-
-def read_query_file(file_path):
-    try:
-        with open(file_path, 'r') as f:
-            return f.read()
-    except Exception as e:
-        print(f"Error reading query file: {e}")
-        return None
+import tempfile
+import threading
 
 def run_tests():
     try:
         print("Initializing DuckDB...")
         # Initialize DuckDB with more memory and debug logging
-        conn = duckdb.connect(':memory:', config={'memory_limit': '2GB'})
+        conn = get_connection(config={'memory_limit': '2GB'})
         
         print("Creating test data...")
         # Create DataFrame
@@ -34,12 +36,8 @@ def run_tests():
         print(f"Number of rows in transactions table: {result[0]}")
 
         print("\nCalculating 7-day window counts...")
-        # Read and execute SQL query
-        with open('src/queries/feature_table/main.sql', 'r') as f:
-            query = f.read()
-        
-        # Execute query
-        result = conn.execute(query).fetchdf()
+        # Execute the registered query
+        result = registry.execute(conn, 'feature_table/main').fetchdf()
         
         # Verify columns
         assert all(col in result.columns for col in EXPECTED_COLUMNS), "Missing expected columns"
@@ -70,13 +68,176 @@ def run_tests():
         }
 
         for idx, row in result.iterrows():
-            key = (row['transaction_id'], row['user_id'], row['date'])
+            key = (row['transaction_id'], row['user_id'], row['date'].strftime('%Y-%m-%d'))
             if key in expected_results:
-                assert row['transactions_last_7_days'] == expected_results[key], \
-                    f"Mismatch for {key}: expected {expected_results[key]}, got {row['transactions_last_7_days']}"
+                assert row[FEATURE_COLUMN] == expected_results[key], \
+                    f"Mismatch for {key}: expected {expected_results[key]}, got {row[FEATURE_COLUMN]}"
+
+        print("\nComparing native streaming engine with SQL...")
+        transactions = sorted(
+            ((t['transaction_id'], t['user_id'], datetime.strptime(t['date'], '%Y-%m-%d').date())
+             for t in SAMPLE_DATA),
+            key=lambda t: (t[1], t[2])
+        )
+        native = {
+            (transaction_id, user_id, day.isoformat()): count
+            for transaction_id, user_id, day, count in count_previous_transactions(transactions)
+        }
+        sql = {
+            (row['transaction_id'], row['user_id'], row['date'].strftime('%Y-%m-%d')): row[FEATURE_COLUMN]
+            for _, row in result.iterrows()
+        }
+        assert native == sql, f"Native engine differs from SQL: {native} != {sql}"
+        print(f"Native engine matches SQL on {len(native)} transactions")
+
+        print("\nLoading daily batches into the incremental feature store...")
+        with tempfile.TemporaryDirectory() as directory:
+            with FeatureStore(os.path.join(directory, 'features.duckdb')) as store:
+                for day in sorted({t[2] for t in transactions}):
+                    store.append_batch([t for t in transactions if t[2] == day], batch_id=day.isoformat())
+                stored = store.features()
+        incremental = {
+            (row['transaction_id'], row['user_id'], row['date'].strftime('%Y-%m-%d')): row[FEATURE_COLUMN]
+            for _, row in stored.iterrows()
+        }
+        assert incremental == native, f"Incremental features differ: {incremental} != {native}"
+        print(f"Incremental feature store matches on {len(incremental)} transactions")
+
+        print("\nComputing the feature table in hash-partitioned user buckets...")
+        with tempfile.TemporaryDirectory() as directory:
+            transactions_path = os.path.join(directory, 'transactions.csv')
+            output_path = os.path.join(directory, 'features.csv')
+            df.to_csv(transactions_path, index=False)
+            num_rows = compute_feature_table_partitioned(transactions_path, output_path, num_buckets=3, workers=2)
+            bucketed = pd.read_csv(output_path, dtype=str)
+        partitioned = {
+            (row['transaction_id'], row['user_id'], row['date']): int(row[FEATURE_COLUMN])
+            for _, row in bucketed.iterrows()
+        }
+        assert num_rows == len(bucketed), f"Reported {num_rows} rows, wrote {len(bucketed)}"
+        assert partitioned == native, f"Partitioned features differ: {partitioned} != {native}"
+        print(f"Partitioned execution matches on {len(partitioned)} transactions")
+
+        print("\nComputing 1/7/30-day window features in one sweep...")
+        # Deterministic amounts (in cents) and categories for the sample transactions
+        window_inputs = sorted(
+            ((t['transaction_id'], t['user_id'], epoch_day(t['date']), 100 * i + 25, i % 3)
+             for i, t in enumerate(SAMPLE_DATA)),
+            key=lambda t: (t[1], t[2])
+        )
+        windows = (1, 7, 30)
+        swept = {row[0]: dict(zip(feature_columns(windows), row[3:]))
+                 for row in compute_window_features(window_inputs, windows)}
+        for transaction_id, user_id, day, _, _ in window_inputs:
+            for days in windows:
+                previous = [t for t in window_inputs if t[1] == user_id and day - days <= t[2] < day]
+                expected = {
+                    f'count_{days}d': len(previous),
+                    f'amount_sum_{days}d': sum(t[3] for t in previous) / 100,
+                    f'distinct_categories_{days}d': len({t[4] for t in previous})
+                }
+                actual = {column: swept[transaction_id][column] for column in expected}
+                assert actual == expected, f"Window features of {transaction_id}: expected {expected}, got {actual}"
+            assert swept[transaction_id]['count_7d'] == native[(transaction_id, user_id, epoch_day_to_date(day).isoformat())], \
+                f"count_7d of {transaction_id} differs from the 7-day feature"
+        print(f"Window features match a brute-force count on {len(swept)} transactions")
+
+        print("\nServing features from the in-memory index...")
+        with tempfile.TemporaryDirectory() as directory:
+            with FeatureStore(os.path.join(directory, 'features.duckdb')) as store:
+                store.append_batch(transactions, batch_id='sample')
+                service = FeatureService(FeatureIndex.from_store(store), store)
+                servers = [
+                    make_server(service, port=0),
+                    make_server(service, socket_path=os.path.join(directory, 'features.sock'))
+                ]
+                for server in servers:
+                    threading.Thread(target=server.serve_forever, daemon=True).start()
+                try:
+                    clients = [FeatureClient(port=servers[0].server_address[1]),
+                               FeatureClient(socket_path=servers[1].server_address)]
+                    for client in clients:
+                        lookups = [key[1:] for key in native]
+                        assert client.lookup_batch(lookups) == list(native.values()), "Batched lookups differ"
+                        for (_, user_id, day), count in native.items():
+                            assert client.lookup(user_id, day) == count, f"Lookup of {user_id} on {day} differs"
+                    try:
+                        clients[0]._request('POST', '/lookup', {'user_id': 'becf-457e', 'as_of': 20200120})
+                        raise AssertionError("A numeric as_of was accepted")
+                    except RuntimeError as e:
+                        assert '400' in str(e), f"Expected a 400 for a numeric as_of, got {e}"
+                    before = clients[0].lookup('becf-457e', '2020-01-20')
+                    assert clients[0].ingest([('new-0001', 'becf-457e', '2020-01-18')], batch_id='late') == 1
+                    assert clients[0].ingest([('new-0001', 'becf-457e', '2020-01-18')], batch_id='late') == 0
+                    after = clients[1].lookup('becf-457e', '2020-01-20')
+                    assert after == before + 1, f"Ingested transaction not served: {before} -> {after}"
+                    assert len(store.features()) == len(transactions) + 1, "Ingested transaction not stored"
+                    for client in clients:
+                        client.close()
+                finally:
+                    for server in servers:
+                        server.shutdown()
+                        server.server_close()
+        print(f"Served lookups match on {len(native)} transactions over TCP and a Unix socket")
+
+        print("\nIngesting appended transactions into the warehouse...")
+        try:
+            get_connection(config={'memory_limit': '1GB'})
+            raise AssertionError("A cached connection was returned for another config")
+        except ValueError:
+            pass
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, 'transactions.csv')
+            df.iloc[:4].to_csv(csv_path, index=False)
+            warehouse = Warehouse(os.path.join(directory, 'warehouse.duckdb'))
+            assert warehouse.ingest('transactions', csv_path) == 4, "Expected the first 4 rows loaded"
+            assert warehouse.ingest('transactions', csv_path) == 0, "An unchanged file was loaded again"
+            appended = df.iloc[4:].to_csv(index=False, header=False)
+            with open(csv_path, 'a') as f:
+                # The last line is still being written and waits for the next ingest
+                f.write(appended[:-5])
+            assert warehouse.ingest('transactions', csv_path) == 2, "Expected only the complete appended lines loaded"
+            with open(csv_path, 'a') as f:
+                f.write(appended[-5:])
+            assert warehouse.ingest('transactions', csv_path) == 1, "Expected the completed last line loaded"
+            ingested = warehouse.run('feature_table/main')
+            assert sorted(ingested['transaction_id']) == sorted(result['transaction_id']), \
+                "Warehouse rows differ from the source"
+            df.iloc[:2].to_csv(csv_path, index=False)
+            assert warehouse.ingest('transactions', csv_path) == 2, "A rewritten file should rebuild the table"
+            close_connections()
+        print(f"Warehouse loaded {len(ingested)} rows in appended ranges")
+
+        print("\nProfiling the feature table query...")
+        with tempfile.TemporaryDirectory() as directory:
+            df.to_csv(os.path.join(directory, 'transactions.csv'), index=False)
+            profiles_dir = os.path.join(directory, 'profiles')
+            report = profile_queries(directory, profiles_dir, ['feature_table/main'], repeat=1)
+            assert os.path.exists(os.path.join(profiles_dir, 'feature_table', 'main.0.json')), "Profile not saved"
+        profile = report['queries']['feature_table/main#0']
+        assert any('WINDOW' in operator for operator in profile['plan']), f"No window operator in {profile['plan']}"
+        assert not find_plan_regressions(report, report), "A profile should not regress against itself"
+        changed = {'queries': {'feature_table/main#0': dict(profile, plan=profile['plan'][1:], seconds=0.0)}}
+        regressions = find_plan_regressions(report, changed, min_seconds=0.0)
+        assert any('plan changed' in regression for regression in regressions), \
+            f"Plan change not flagged: {regressions}"
+        print(f"Profiled plan: {' > '.join(operator.strip() for operator in profile['plan'])}")
+        legacy = summarize_profile({
+            'result': 0.5, 'timing': 0.5, 'cardinality': 3,
+            'children': [{'name': 'PROJECTION', 'timing': 0.1, 'cardinality': 3, 'children': [
+                {'name': 'WINDOW', 'timing': 0.4, 'cardinality': 3, 'children': []}
+            ]}]
+        })
+        assert legacy['plan'] == ['PROJECTION', '  WINDOW'] and legacy['seconds'] == 0.5 and legacy['rows'] == 3, \
+            f"DuckDB 0.10 profile misread: {legacy}"
+        try:
+            summarize_profile({'children': [{'op': 'PROJECTION'}]})
+            raise AssertionError("An unrecognized profile format was summarized")
+        except ValueError:
+            pass
 
         print("\nClosing connection...")
-        conn.close()
+        close_connections()
 
     except Exception as e:
         print(f"Error during test execution: {e}", file=sys.stderr)
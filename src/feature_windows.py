@@ -0,0 +1,202 @@
+import argparse
+import csv
+import sys
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from csv_ingest import epoch_day, epoch_day_to_date
+from external_sort import DEFAULT_MEMORY_BUDGET_MB, external_sort
+from partitioned_storage import iter_transaction_rows, shift_date
+
+DEFAULT_WINDOWS = (1, 7, 30, 90)
+# count: transactions, amount_sum: sum of transaction_amount, distinct_categories: transaction_category_id values
+METRICS = ('count', 'amount_sum', 'distinct_categories')
+INPUT_COLUMNS = ('transaction_id', 'user_id', 'date', 'transaction_amount', 'transaction_category_id')
+
+# (transaction_id, user_id, day as days since the epoch, amount in cents, category_id)
+WindowInput = Tuple[str, str, int, int, int]
+
+
+def feature_columns(windows: Sequence[int], metrics: Sequence[str] = METRICS) -> List[str]:
+    """Names of the feature columns, e.g. count_7d, grouped by window."""
+    return [f"{metric}_{days}d" for days in windows for metric in metrics]
+
+
+def feature_header(windows: Sequence[int], metrics: Sequence[str] = METRICS) -> List[str]:
+    return ['transaction_id', 'user_id', 'date'] + feature_columns(windows, metrics)
+
+
+def read_window_inputs(
+    filename: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Iterator[WindowInput]:
+    """
+    Stream the columns the window features need from a transactions CSV or a
+    date-partitioned directory. Amounts become integer cents, so prefix sums
+    are exact.
+    """
+    for transaction_id, user_id, date_str, amount, category_id in iter_transaction_rows(
+        filename, INPUT_COLUMNS, start, end
+    ):
+        yield transaction_id, user_id, epoch_day(date_str), round(float(amount) * 100), int(category_id)
+
+
+def _validate(windows: Sequence[int], metrics: Sequence[str]) -> None:
+    if not windows or any(days < 1 for days in windows):
+        raise ValueError(f"Window lengths must be positive days, got {list(windows)}")
+    unknown = [metric for metric in metrics if metric not in METRICS]
+    if unknown or not metrics:
+        raise ValueError(f"Unknown metrics {unknown}, expected some of {METRICS}")
+
+
+def _user_features(
+    rows: List[WindowInput],
+    windows: Sequence[int],
+    metrics: Sequence[str]
+) -> Iterator[tuple]:
+    """
+    Sweep one user's transactions in date order. Each window keeps a pointer
+    to its first transaction, and the current day's group starts at `day_start`,
+    so a window spans rows [lo, day_start). Counts and amount sums are
+    differences of prefix sums; distinct categories come from a per-window
+    Counter that gains a day's categories once the day is over and loses them
+    as the window's pointer moves past.
+    """
+    days = [row[2] for row in rows]
+    prefix_amounts = [0]
+    for row in rows:
+        prefix_amounts.append(prefix_amounts[-1] + row[3])
+
+    with_categories = 'distinct_categories' in metrics
+    pointers = [0] * len(windows)
+    categories = [Counter() for _ in windows] if with_categories else []
+    day_start = 0
+
+    for i, (transaction_id, user_id, day, _, _) in enumerate(rows):
+        if i and day < days[i - 1]:
+            raise ValueError(f"Transactions are not sorted by date at {transaction_id}")
+        if i and day != days[i - 1]:
+            # Yesterday's (or earlier) transactions enter every window
+            for counter in categories:
+                counter.update(row[4] for row in rows[day_start:i])
+            day_start = i
+
+        values = []
+        for w, window_days in enumerate(windows):
+            lo = pointers[w]
+            window_start = day - window_days
+            while lo < day_start and days[lo] < window_start:
+                if with_categories:
+                    counter = categories[w]
+                    category = rows[lo][4]
+                    counter[category] -= 1
+                    if not counter[category]:
+                        del counter[category]
+                lo += 1
+            pointers[w] = lo
+
+            for metric in metrics:
+                if metric == 'count':
+                    values.append(day_start - lo)
+                elif metric == 'amount_sum':
+                    values.append((prefix_amounts[day_start] - prefix_amounts[lo]) / 100)
+                else:
+                    values.append(len(categories[w]))
+        yield (transaction_id, user_id, epoch_day_to_date(day), *values)
+
+
+def compute_window_features(
+    transactions: Iterable[WindowInput],
+    windows: Sequence[int] = DEFAULT_WINDOWS,
+    metrics: Sequence[str] = METRICS
+) -> Iterator[tuple]:
+    """
+    Multi-window features over transactions sorted by (user_id, date), in one
+    pass per user. Each output row is (transaction_id, user_id, date, *features)
+    with features ordered as feature_columns(windows, metrics). A window of N
+    days covers the N calendar days before the transaction date, same-day
+    transactions excluded, like the 7-day feature of main.sql.
+    """
+    _validate(windows, metrics)
+    previous_user = None
+    for user_id, user_rows in groupby(transactions, key=itemgetter(1)):
+        if previous_user is not None and user_id < previous_user:
+            raise ValueError(f"Transactions are not sorted by user_id at user {user_id}")
+        previous_user = user_id
+        yield from _user_features(list(user_rows), windows, metrics)
+
+
+def compute_window_feature_table(
+    transactions_file: str,
+    windows: Sequence[int] = DEFAULT_WINDOWS,
+    metrics: Sequence[str] = METRICS,
+    presorted: bool = False,
+    memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Iterator[tuple]:
+    """
+    Stream the wide feature table of a transactions CSV or partitioned
+    directory. Unless presorted, input is ordered by (user_id, date) with an
+    external sort, once for all windows. start and end limit the output dates;
+    transactions are read from the longest window before start on.
+    """
+    _validate(windows, metrics)
+    lookback_start = shift_date(start, -max(windows)) if start is not None else None
+    transactions = read_window_inputs(transactions_file, lookback_start, end)
+    if not presorted:
+        transactions = external_sort(transactions, key=itemgetter(1, 2), memory_budget_mb=memory_budget_mb)
+    features = compute_window_features(transactions, windows, metrics)
+    if start is None:
+        return features
+    first_day = epoch_day_to_date(epoch_day(start))
+    return (feature for feature in features if feature[2] >= first_day)
+
+
+def write_window_feature_table(
+    rows: Iterable[tuple],
+    windows: Sequence[int] = DEFAULT_WINDOWS,
+    metrics: Sequence[str] = METRICS,
+    out: Optional[str] = None
+) -> int:
+    """Write wide feature rows as CSV to a file (or stdout) as they are produced."""
+    f = open(out, 'w', newline='') if out else sys.stdout
+    try:
+        writer = csv.writer(f)
+        writer.writerow(feature_header(windows, metrics))
+        count = 0
+        for transaction_id, user_id, day, *values in rows:
+            writer.writerow([transaction_id, user_id, day.isoformat(), *values])
+            count += 1
+        return count
+    finally:
+        if out:
+            f.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compute transaction count, amount and distinct category features over several windows.'
+    )
+    parser.add_argument('transactions', help='Transactions CSV file or date=YYYY-MM-DD/ partitioned directory')
+    parser.add_argument('--windows', type=int, nargs='+', default=list(DEFAULT_WINDOWS),
+                        help='Window lengths in days')
+    parser.add_argument('--metrics', nargs='+', choices=METRICS, default=list(METRICS),
+                        help='Aggregations per window')
+    parser.add_argument('--presorted', action='store_true', help='Input is already sorted by (user_id, date)')
+    parser.add_argument('--start', default=None, help='First date to compute features for (YYYY-MM-DD)')
+    parser.add_argument('--end', default=None, help='Last date to compute features for (YYYY-MM-DD)')
+    parser.add_argument('--out', default=None, help='Output CSV (default: stdout)')
+    args = parser.parse_args()
+
+    rows = compute_window_feature_table(
+        args.transactions, args.windows, args.metrics, args.presorted, start=args.start, end=args.end
+    )
+    write_window_feature_table(rows, args.windows, args.metrics, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+import cProfile
+import json
+import os
+import pstats
+import resource
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+T = TypeVar('T')
+
+DEFAULT_PROFILE_TOP = 25
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class StageRecord:
+    """Accumulated measurements of one named pipeline stage."""
+
+    __slots__ = ('name', 'calls', 'rows', 'wall_seconds', 'cpu_seconds',
+                 'child_wall_seconds', 'child_cpu_seconds', 'peak_rss_mb', 'rss_growth_mb')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.rows = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.child_wall_seconds = 0.0
+        self.child_cpu_seconds = 0.0
+        self.peak_rss_mb = 0.0
+        self.rss_growth_mb = 0.0
+
+    def as_dict(self) -> Dict[str, object]:
+        self_wall = self.wall_seconds - self.child_wall_seconds
+        return {
+            'stage': self.name,
+            'calls': self.calls,
+            'rows': self.rows,
+            'wall_seconds': round(self.wall_seconds, 6),
+            'self_wall_seconds': round(self_wall, 6),
+            'cpu_seconds': round(self.cpu_seconds, 6),
+            'self_cpu_seconds': round(self.cpu_seconds - self.child_cpu_seconds, 6),
+            'rows_per_second': round(self.rows / self_wall, 1) if self.rows and self_wall > 0 else None,
+            'peak_rss_mb': round(self.peak_rss_mb, 1),
+            'rss_growth_mb': round(self.rss_growth_mb, 1)
+        }
+
+
+class PipelineMetrics:
+    """
+    Per-stage wall time, CPU time, rows/s and peak RSS for one pipeline run.
+    Stages can nest and repeat: repeated entries of the same stage accumulate,
+    and self_* times exclude time spent in nested stages. With profile=True,
+    the whole run is profiled with cProfile and the hottest functions are
+    added to the report.
+    """
+
+    def __init__(self, pipeline: str, profile: bool = False, profile_top: int = DEFAULT_PROFILE_TOP):
+        self.pipeline = pipeline
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self._stages: Dict[str, StageRecord] = {}
+        self._active: List[StageRecord] = []
+        self.profile_top = profile_top
+        self._profiler = cProfile.Profile() if profile else None
+        if self._profiler is not None:
+            self._profiler.enable()
+
+    def _record(self, name: str) -> StageRecord:
+        record = self._stages.get(name)
+        if record is None:
+            record = self._stages[name] = StageRecord(name)
+        return record
+
+    def _enter(self, record: StageRecord):
+        self._active.append(record)
+        return time.perf_counter(), time.process_time()
+
+    def _exit(self, record: StageRecord, start) -> None:
+        start_wall, start_cpu = start
+        wall = time.perf_counter() - start_wall
+        cpu = time.process_time() - start_cpu
+        self._active.pop()
+        record.wall_seconds += wall
+        record.cpu_seconds += cpu
+        if self._active:
+            parent = self._active[-1]
+            parent.child_wall_seconds += wall
+            parent.child_cpu_seconds += cpu
+
+    @contextmanager
+    def stage(self, name: str, rows: Optional[int] = None) -> Iterator[StageRecord]:
+        """Measure a block; set `.rows` on the yielded record (or pass rows) for throughput."""
+        record = self._record(name)
+        record.calls += 1
+        if rows:
+            record.rows += rows
+        start_rss = peak_rss_mb()
+        start = self._enter(record)
+        try:
+            yield record
+        finally:
+            self._exit(record, start)
+            self._sample_rss(record, start_rss)
+
+    @staticmethod
+    def _sample_rss(record: StageRecord, start_rss: float) -> None:
+        rss = peak_rss_mb()
+        record.peak_rss_mb = max(record.peak_rss_mb, rss)
+        record.rss_growth_mb += rss - start_rss
+
+    def track(self, name: str, iterable: Iterable[T], count: Optional[Callable[[T], int]] = None) -> Iterator[T]:
+        """
+        Wrap an iterator so time spent producing each item is charged to a stage.
+        Meant for coarse items (chunks, batches, sorted runs); RSS is sampled once
+        when the iterator is exhausted rather than per item. count maps an item to
+        its number of rows (e.g. len for DataFrame chunks); by default each item is a row.
+        """
+        record = self._record(name)
+        record.calls += 1
+        start_rss = peak_rss_mb()
+        iterator = iter(iterable)
+        try:
+            while True:
+                start = self._enter(record)
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self._exit(record, start)
+                record.rows += count(item) if count else 1
+                yield item
+        finally:
+            self._sample_rss(record, start_rss)
+
+    def report(self) -> Dict[str, object]:
+        report = {
+            'pipeline': self.pipeline,
+            'started_at': self.started_at,
+            'pid': os.getpid(),
+            'wall_seconds': round(time.perf_counter() - self._start_wall, 6),
+            'cpu_seconds': round(time.process_time() - self._start_cpu, 6),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+            'stages': [record.as_dict() for record in self._stages.values()]
+        }
+        if self._profiler is not None:
+            self._profiler.disable()
+            report['hot_functions'] = self._hot_functions()
+            self._profiler.enable()
+        return report
+
+    def _hot_functions(self) -> List[Dict[str, object]]:
+        stats = pstats.Stats(self._profiler)
+        rows = []
+        for (filename, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+            rows.append({
+                'function': f"{os.path.basename(filename)}:{line}({function})",
+                'calls': calls,
+                'total_seconds': round(total, 6),
+                'cumulative_seconds': round(cumulative, 6)
+            })
+        rows.sort(key=lambda row: row['total_seconds'], reverse=True)
+        return rows[:self.profile_top]
+
+    def write_json(self, path: str) -> None:
+        """Write the report as JSON for the metrics system."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def print_summary(self, file=sys.stderr) -> None:
+        print(f"\nStage metrics for {self.pipeline}:", file=file)
+        for stage in self.report()['stages']:
+            throughput = f"{stage['rows_per_second']:>12,.0f} rows/s" if stage['rows_per_second'] else ' ' * 19
+            print(f"  {stage['stage']:<28} {stage['self_wall_seconds']:>9.3f}s wall "
+                  f"{stage['self_cpu_seconds']:>9.3f}s cpu {throughput} {stage['peak_rss_mb']:>9.1f} MB",
+                  file=file)
+
+
+def stage(metrics: Optional[PipelineMetrics], name: str, rows: Optional[int] = None):
+    """metrics.stage(name) when instrumentation is on, otherwise a no-op context."""
+    if metrics is None:
+        return nullcontext(StageRecord(name))
+    return metrics.stage(name, rows)
+
+
+def track(
+    metrics: Optional[PipelineMetrics],
+    name: str,
+    iterable: Iterable[T],
+    count: Optional[Callable[[T], int]] = None
+) -> Iterable[T]:
+    """metrics.track(name, iterable) when instrumentation is on, otherwise the iterable itself."""
+    if metrics is None:
+        return iterable
+    return metrics.track(name, iterable, count)
@@ -1,95 +1,715 @@
-import csv
+import argparse
+from bisect import bisect_right
 from collections import defaultdict
-from datetime import datetime
+from itertools import chain, groupby, zip_longest
+from operator import attrgetter
 import sys
-from typing import Dict, List, Set, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+import math
 import os
+import shutil
+import tempfile
+import duckdb
+from concurrent_loading import DEFAULT_PREFETCH_CHUNKS, ConcurrentLoader
+from csv_cache import load_columns
+from csv_ingest import chunked, epoch_day, iter_rows
+from external_sort import DEFAULT_MEMORY_BUDGET_MB, external_sort
+from instrumentation import PipelineMetrics, stage, track
+from output_sinks import SINK_FORMATS, open_sink, resolve_format, write_batches
+from partitioned_storage import (
+    MAX_OPEN_PARTITIONS, hash_partition, is_partitioned, iter_transaction_rows, sql_date_filter, sql_files
+)
+from query_registry import registry, sql_literal
 
-def parse_date(date_str: str) -> datetime:
-    """Parse date string to datetime object."""
-    return datetime.strptime(date_str, '%Y-%m-%d')
+# (actual_from_dt, actual_to_dt, product_id, interest_rate), dates as days since the epoch
+AgreementVersion = Tuple[int, int, int, float]
+# client_id -> (sorted from dates, running max of to dates, versions sorted by from date)
+AgreementIndex = Dict[str, Tuple[List[int], List[int], List[AgreementVersion]]]
 
-def load_users(filename: str) -> Dict[str, bool]:
+# Columns read from transactions.csv, in the order join_chunk unpacks them
+TRANSACTION_COLUMNS = (
+    'transaction_id', 'date', 'user_id', 'is_blocked', 'transaction_amount', 'transaction_category_id'
+)
+AGREEMENT_COLUMNS = ('client_id', 'actual_from_dt', 'actual_to_dt', 'product_id', 'interest_rate')
+
+NO_AGREEMENT = (None, None)
+
+
+class JoinedRow:
+    """
+    One joined transaction. With __slots__ a row costs a fixed-size object
+    instead of a 9-key dict; dict-style access (row['user_id'], 'user_id' in row,
+    keys(), as_dict()) keeps mapping-based callers working.
+    """
+
+    FIELDS = (
+        'transaction_id',
+        'transaction_date',
+        'user_id',
+        'is_blocked',
+        'transaction_amount',
+        'transaction_category_id',
+        'is_active',
+        'product_id',
+        'interest_rate'
+    )
+    __slots__ = FIELDS
+    # Column types for typed output sinks (Arrow, Parquet)
+    SCHEMA = tuple(zip(FIELDS, (
+        'string', 'string', 'string', 'bool', 'int64', 'int64', 'bool', 'int64', 'float64'
+    )))
+
+    def __init__(
+        self,
+        transaction_id: str,
+        transaction_date: str,
+        user_id: str,
+        is_blocked: bool,
+        transaction_amount: int,
+        transaction_category_id: int,
+        is_active: bool,
+        product_id: Optional[int],
+        interest_rate: Optional[float]
+    ):
+        self.transaction_id = transaction_id
+        self.transaction_date = transaction_date
+        self.user_id = user_id
+        self.is_blocked = is_blocked
+        self.transaction_amount = transaction_amount
+        self.transaction_category_id = transaction_category_id
+        self.is_active = is_active
+        self.product_id = product_id
+        self.interest_rate = interest_rate
+
+    def values(self) -> Tuple:
+        return (
+            self.transaction_id, self.transaction_date, self.user_id, self.is_blocked,
+            self.transaction_amount, self.transaction_category_id, self.is_active,
+            self.product_id, self.interest_rate
+        )
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.FIELDS
+
+    def as_dict(self) -> dict:
+        return dict(zip(self.FIELDS, self.values()))
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+
+    def __getitem__(self, key: str):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.FIELDS
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, JoinedRow):
+            return self.values() == other.values()
+        if isinstance(other, dict):
+            return self.as_dict() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"JoinedRow({', '.join(f'{key}={value!r}' for key, value in zip(self.FIELDS, self.values()))})"
+
+    def __reduce__(self):
+        # Pickle as a plain tuple of values; spilled sort runs stay compact
+        return JoinedRow, self.values()
+
+POINT_IN_TIME_QUERY = 'join_datasets/point_in_time_join'
+DUCKDB_BATCH_SIZE = 10000
+# Transactions per agreement lookup batch
+JOIN_CHUNK_SIZE = 10000
+
+# Join strategies chosen by plan_join
+IN_MEMORY_JOIN = 'in_memory'
+GRACE_HASH_JOIN = 'grace'
+# Loaded dimensions take about this many bytes of memory per byte of CSV (dict entries, str objects)
+DIMENSION_MEMORY_FACTOR = 4
+# Share of the join's memory budget the dimensions may use; the sort buffers the rest
+DIMENSION_BUDGET_SHARE = 0.5
+USER_COLUMNS = ('user_id', 'is_active')
+
+# Typed views over the raw CSVs, matching how the Python loaders parse them
+DUCKDB_INPUT_VIEWS = {
+    'transactions': """
+        SELECT
+            transaction_id,
+            CAST(date AS DATE) AS transaction_date,
+            user_id,
+            lower(is_blocked) = 'true' AS is_blocked,
+            CAST(trunc(CAST(transaction_amount AS DOUBLE)) AS BIGINT) AS transaction_amount,
+            CAST(transaction_category_id AS BIGINT) AS transaction_category_id
+        FROM read_csv({path}, header = true, all_varchar = true)
+    """,
+    'users': """
+        SELECT user_id, lower(is_active) IN ('1', 'true') AS is_active
+        FROM read_csv({path}, header = true, all_varchar = true)
+    """,
+    'dim_dep_agreement': """
+        SELECT
+            client_id,
+            CAST(actual_from_dt AS DATE) AS actual_from_dt,
+            CAST(actual_to_dt AS DATE) AS actual_to_dt,
+            CAST(product_id AS BIGINT) AS product_id,
+            CAST(interest_rate AS DOUBLE) AS interest_rate,
+            -- Position in the file, which breaks ties between versions starting the same day
+            row_number() OVER () AS version_number
+        FROM read_csv({path}, header = true, all_varchar = true)
+    """
+}
+
+def parse_date(date_str: str) -> int:
+    """Parse a YYYY-MM-DD string to days since the epoch, so date checks compare integers."""
+    return epoch_day(date_str)
+
+def load_users(filename: str, use_cache: bool = False) -> Dict[str, bool]:
     """Load users and their active status into memory."""
-    users = {}
-    with open(filename, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            users[row['user_id']] = row['is_active'].lower() == 'true'
-    return users
-
-def load_agreements(filename: str) -> Dict[str, List[Tuple[datetime, datetime, int, float]]]:
-    """Load agreements into memory, organized by client_id."""
+    if use_cache:
+        columns = load_columns(filename)
+        user_ids = [user_id.decode() for user_id in columns['user_id'].tolist()]
+        return dict(zip(user_ids, (columns['is_active'] == 1).tolist()))
+
+    return {
+        user_id: is_active.lower() in ('1', 'true')
+        for user_id, is_active in iter_rows(filename, ('user_id', 'is_active'))
+    }
+
+def build_agreement_index(
+    agreements: Dict[str, List[AgreementVersion]]
+) -> AgreementIndex:
+    """
+    Sort each client's agreement versions by actual_from_dt for binary search.
+    The running max of actual_to_dt lets lookups stop early when versions overlap.
+    """
+    index = {}
+    for client_id, versions in agreements.items():
+        versions = sorted(versions, key=lambda v: v[0])
+        from_dates = [v[0] for v in versions]
+        reach = []
+        max_to_date = None
+        for version in versions:
+            if max_to_date is None or version[1] > max_to_date:
+                max_to_date = version[1]
+            reach.append(max_to_date)
+        index[client_id] = (from_dates, reach, versions)
+    return index
+
+def load_agreements(filename: str, use_cache: bool = False) -> AgreementIndex:
+    """Load agreements into memory, indexed by client_id and sorted by actual_from_dt."""
     agreements = defaultdict(list)
-    with open(filename, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            client_id = row['client_id']
-            from_date = parse_date(row['actual_from_dt'])
-            to_date = parse_date(row['actual_to_dt'])
-            product_id = int(row['product_id'])
-            interest_rate = float(row['interest_rate'])
-            agreements[client_id].append((from_date, to_date, product_id, interest_rate))
-    return agreements
+    if use_cache:
+        columns = load_columns(filename)
+        rows = zip(
+            columns['client_id'].tolist(),
+            columns['actual_from_dt'].astype('datetime64[D]').astype('int64').tolist(),
+            columns['actual_to_dt'].astype('datetime64[D]').astype('int64').tolist(),
+            columns['product_id'].tolist(),
+            columns['interest_rate'].tolist()
+        )
+        for client_id, from_date, to_date, product_id, interest_rate in rows:
+            agreements[client_id.decode()].append((from_date, to_date, product_id, interest_rate))
+        return build_agreement_index(agreements)
 
-def find_matching_agreement(
-    agreements: List[Tuple[datetime, datetime, int, float]], 
-    transaction_date: datetime
-) -> Tuple[int, float]:
-    """Find matching agreement for transaction date."""
-    for from_date, to_date, product_id, interest_rate in agreements:
-        if from_date <= transaction_date < to_date:
+    for client_id, from_dt, to_dt, product_id, interest_rate in iter_rows(filename, AGREEMENT_COLUMNS):
+        agreements[client_id].append((epoch_day(from_dt), epoch_day(to_dt), int(product_id), float(interest_rate)))
+    return build_agreement_index(agreements)
+
+def count_agreement_versions(agreements: AgreementIndex) -> int:
+    """Number of agreement rows in an index; the index itself has one entry per client."""
+    return sum(len(versions) for _, _, versions in agreements.values())
+
+def _match_at(
+    client_index: Tuple[List[int], List[int], List[AgreementVersion]],
+    position: int,
+    transaction_date: int
+) -> Tuple[Optional[int], Optional[float]]:
+    """Walk back from the last version starting on or before the date to the one covering it."""
+    _, reach, versions = client_index
+    while position >= 0 and reach[position] > transaction_date:
+        _, to_date, product_id, interest_rate = versions[position]
+        if transaction_date < to_date:
             return product_id, interest_rate
-    return None, None
+        position -= 1
+    return NO_AGREEMENT
+
+def find_matching_agreement(
+    client_index: Tuple[List[int], List[int], List[AgreementVersion]],
+    transaction_date: int
+) -> Tuple[Optional[int], Optional[float]]:
+    """Find the agreement version valid at the transaction date using binary search."""
+    from_dates = client_index[0]
+    position = bisect_right(from_dates, transaction_date) - 1
+    return _match_at(client_index, position, transaction_date)
+
+def find_matching_agreements(
+    agreements: AgreementIndex,
+    lookups: Sequence[Tuple[str, int]]
+) -> List[Tuple[Optional[int], Optional[float]]]:
+    """
+    Batched point-in-time lookup for a chunk of (client_id, transaction_date) pairs.
+    Lookups are visited in (client_id, date) order so each client's versions are
+    swept with a single forward pointer instead of one binary search per lookup.
+    Returns matches in the order of the input lookups.
+    """
+    matches = [NO_AGREEMENT] * len(lookups)
+    order = sorted(range(len(lookups)), key=lambda i: lookups[i])
+
+    current_client = None
+    client_index = None
+    position = -1
+    for i in order:
+        client_id, transaction_date = lookups[i]
+        if client_id != current_client:
+            current_client = client_id
+            client_index = agreements.get(client_id)
+            position = -1
+        if client_index is None:
+            continue
+
+        from_dates = client_index[0]
+        while position + 1 < len(from_dates) and from_dates[position + 1] <= transaction_date:
+            position += 1
+        matches[i] = _match_at(client_index, position, transaction_date)
+    return matches
+
+def join_transaction_chunks(
+    chunks: Iterable[List[Tuple[str, ...]]],
+    users: Dict[str, bool],
+    agreements: Optional[AgreementIndex] = None,
+    metrics: Optional[PipelineMetrics] = None
+) -> Iterator[JoinedRow]:
+    """
+    Join chunks of TRANSACTION_COLUMNS tuples with user data and the agreement
+    valid at the transaction date, in input order. Agreement lookups are
+    resolved per chunk, so only one chunk is held in memory at a time.
+    """
+    agreements = agreements or {}
+
+    def join_chunk(chunk: List[Tuple[str, ...]]) -> Iterator[JoinedRow]:
+        with stage(metrics, 'agreement_lookup', len(chunk)):
+            lookups = [(row[2], epoch_day(row[1])) for row in chunk]
+            matches = find_matching_agreements(agreements, lookups)
+        for row, (product_id, interest_rate) in zip(chunk, matches):
+            transaction_id, transaction_date, user_id, is_blocked, amount, category_id = row
+            yield JoinedRow(
+                transaction_id,
+                transaction_date,
+                user_id,
+                is_blocked.lower() == 'true',
+                int(float(amount)),
+                int(category_id),
+                users.get(user_id, False),
+                product_id,
+                interest_rate
+            )
+
+    for chunk in track(metrics, 'read_transactions', chunks, count=len):
+        yield from join_chunk(chunk)
+
+def iter_joined_transactions(
+    trans_file: str,
+    users: Dict[str, bool],
+    agreements: Optional[AgreementIndex] = None,
+    chunk_size: int = JOIN_CHUNK_SIZE,
+    metrics: Optional[PipelineMetrics] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Iterator[JoinedRow]:
+    """
+    Yield the transactions of trans_file (a CSV or a date-partitioned directory)
+    joined with users and agreements, in file order, limited to start <= date <= end.
+    """
+    chunks = chunked(iter_transaction_rows(trans_file, TRANSACTION_COLUMNS, start, end), chunk_size)
+    return join_transaction_chunks(chunks, users, agreements, metrics)
+
+def result_sort_key(row: JoinedRow) -> Tuple[str, str]:
+    """Output order of the joined dataset."""
+    return row.transaction_date, row.transaction_id
+
+def stream_transactions(
+    trans_file: str,
+    users: Dict[str, bool],
+    agreements: Optional[AgreementIndex] = None,
+    memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+    tmp_dir: Optional[str] = None,
+    metrics: Optional[PipelineMetrics] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Iterator[JoinedRow]:
+    """
+    Yield joined transactions ordered by (transaction_date, transaction_id).
+    Ordering uses an external merge sort that spills sorted runs to temp files
+    whenever the buffered rows exceed memory_budget_mb. trans_file may be a
+    date-partitioned directory, in which case only the partitions between start
+    and end are read and rows are sorted one date at a time.
+    """
+    joined = iter_joined_transactions(trans_file, users, agreements, metrics=metrics, start=start, end=end)
+    return _sort_joined(joined, memory_budget_mb, tmp_dir, metrics, is_partitioned(trans_file))
+
+def _sort_joined(
+    joined: Iterable[JoinedRow],
+    memory_budget_mb: float,
+    tmp_dir: Optional[str],
+    metrics: Optional[PipelineMetrics],
+    date_ordered: bool = False
+) -> Iterator[JoinedRow]:
+    """
+    Order joined rows by result_sort_key. Rows read from date partitions
+    already arrive in date order, so each date only needs sorting by id.
+    """
+    if date_ordered:
+        sorted_rows = chain.from_iterable(
+            external_sort(rows, key=result_sort_key, memory_budget_mb=memory_budget_mb, tmp_dir=tmp_dir)
+            for _, rows in groupby(joined, key=attrgetter('transaction_date'))
+        )
+    else:
+        sorted_rows = external_sort(joined, key=result_sort_key, memory_budget_mb=memory_budget_mb, tmp_dir=tmp_dir)
+    # Reading and lookups are nested stages, so the sort stage's self time is row building and sorting
+    return track(metrics, 'join_and_sort', sorted_rows)
+
+def stream_transactions_concurrent(
+    trans_file: str,
+    users_file: str,
+    agreements_file: str,
+    memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+    tmp_dir: Optional[str] = None,
+    use_processes: bool = True,
+    prefetch_chunks: int = DEFAULT_PREFETCH_CHUNKS,
+    metrics: Optional[PipelineMetrics] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Iterator[JoinedRow]:
+    """
+    stream_transactions with overlapped loading: users and agreements are
+    parsed side by side in worker processes (threads with use_processes=False)
+    while a background thread already reads and decodes transaction chunks.
+    The join starts as soon as both dimensions are ready.
+    """
+    with ConcurrentLoader(use_processes, max_workers=2) as loader:
+        users_future = loader.submit(load_users, users_file)
+        agreements_future = loader.submit(load_agreements, agreements_file)
+        rows = iter_transaction_rows(trans_file, TRANSACTION_COLUMNS, start, end)
+        chunks = loader.prefetch(chunked(rows, JOIN_CHUNK_SIZE), prefetch_chunks)
+
+        with stage(metrics, 'load_dimensions') as dimensions_stage:
+            users = users_future.result()
+            agreements = agreements_future.result()
+            dimensions_stage.rows = len(users) + count_agreement_versions(agreements)
+
+        joined = join_transaction_chunks(chunks, users, agreements, metrics)
+        yield from _sort_joined(joined, memory_budget_mb, tmp_dir, metrics, is_partitioned(trans_file))
+
+def estimate_dimensions_mb(users_file: str, agreements_file: str) -> float:
+    """Estimated memory of load_users plus load_agreements, from the CSV sizes."""
+    csv_bytes = os.path.getsize(users_file) + os.path.getsize(agreements_file)
+    return csv_bytes * DIMENSION_MEMORY_FACTOR / (1024 * 1024)
+
+def plan_join(users_file: str, agreements_file: str, memory_budget_mb: float) -> Tuple[str, int]:
+    """
+    Pick the join strategy for a memory budget: IN_MEMORY_JOIN when both
+    dimensions fit in their share of the budget, otherwise GRACE_HASH_JOIN
+    with enough partitions for one partition's dimensions to fit.
+    Returns (strategy, number of partitions). Raises ValueError when that
+    takes more than MAX_OPEN_PARTITIONS partitions, since fewer would not
+    keep a partition within the budget.
+    """
+    dimension_budget_mb = memory_budget_mb * DIMENSION_BUDGET_SHARE
+    estimate_mb = estimate_dimensions_mb(users_file, agreements_file)
+    if estimate_mb <= dimension_budget_mb:
+        return IN_MEMORY_JOIN, 1
+    # One more partition than strictly needed leaves room for uneven buckets
+    num_partitions = math.ceil(estimate_mb / dimension_budget_mb) + 1
+    if num_partitions > MAX_OPEN_PARTITIONS:
+        raise ValueError(
+            f"A {memory_budget_mb} MB budget needs {num_partitions} partitions for dimensions of ~{estimate_mb:.1f} MB, "
+            f"at most {MAX_OPEN_PARTITIONS} are supported; raise --memory-budget-mb to at least "
+            f"{math.ceil(estimate_mb / (MAX_OPEN_PARTITIONS - 1) / DIMENSION_BUDGET_SHARE * 100) / 100} MB"
+        )
+    return GRACE_HASH_JOIN, num_partitions
+
+def grace_hash_join(
+    trans_file: str,
+    users_file: str,
+    agreements_file: str,
+    num_partitions: int,
+    tmp_dir: Optional[str] = None,
+    metrics: Optional[PipelineMetrics] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Iterator[JoinedRow]:
+    """
+    Join dimensions that do not fit in memory. Transactions, users and
+    agreements are hash-partitioned on user_id / client_id into temp CSVs,
+    then each partition's users and agreements are loaded and its
+    transactions joined, one partition at a time. Rows come out grouped by
+    partition, not in result order.
+    """
+    work_dir = tempfile.mkdtemp(prefix='grace-join-', dir=tmp_dir)
+    try:
+        def paths(name: str) -> List[str]:
+            return [os.path.join(work_dir, f"{name}-{partition:05d}.csv") for partition in range(num_partitions)]
+
+        users_paths, agreements_paths, transactions_paths = paths('users'), paths('agreements'), paths('transactions')
+        with stage(metrics, 'grace_partition') as partition_stage:
+            partition_stage.rows += sum(hash_partition(
+                iter_rows(users_file, USER_COLUMNS), USER_COLUMNS, 'user_id', users_paths
+            ))
+            partition_stage.rows += sum(hash_partition(
+                iter_rows(agreements_file, AGREEMENT_COLUMNS), AGREEMENT_COLUMNS, 'client_id', agreements_paths
+            ))
+            partition_stage.rows += sum(hash_partition(
+                iter_transaction_rows(trans_file, TRANSACTION_COLUMNS, start, end),
+                TRANSACTION_COLUMNS, 'user_id', transactions_paths
+            ))
+
+        for users_path, agreements_path, transactions_path in zip(users_paths, agreements_paths, transactions_paths):
+            with stage(metrics, 'load_dimensions') as dimensions_stage:
+                users = load_users(users_path)
+                agreements = load_agreements(agreements_path)
+                dimensions_stage.rows += len(users) + count_agreement_versions(agreements)
+            chunks = chunked(iter_rows(transactions_path, TRANSACTION_COLUMNS), JOIN_CHUNK_SIZE)
+            yield from join_transaction_chunks(chunks, users, agreements, metrics)
+            # Free this partition's dimensions before the next one is loaded
+            del users, agreements
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def stream_transactions_budgeted(
+    trans_file: str,
+    users_file: str,
+    agreements_file: str,
+    memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+    tmp_dir: Optional[str] = None,
+    concurrent: bool = True,
+    metrics: Optional[PipelineMetrics] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Iterator[JoinedRow]:
+    """
+    stream_transactions under one memory budget for the whole join. The
+    strategy comes from plan_join and is reported on stderr: the in-memory
+    hash join (loading concurrently unless concurrent=False) or a grace hash
+    join. Either way the output is sorted by result_sort_key with the rest of
+    the budget, so both strategies produce the same rows in the same order.
+    """
+    with stage(metrics, 'plan_join'):
+        strategy, num_partitions = plan_join(users_file, agreements_file, memory_budget_mb)
+    estimate_mb = estimate_dimensions_mb(users_file, agreements_file)
+    sort_budget_mb = memory_budget_mb * (1 - DIMENSION_BUDGET_SHARE)
+    if strategy == GRACE_HASH_JOIN:
+        print(f"Join strategy: grace hash join in {num_partitions} partitions "
+              f"(dimensions ~{estimate_mb:.1f} MB, budget {memory_budget_mb:g} MB)", file=sys.stderr)
+        joined = grace_hash_join(trans_file, users_file, agreements_file, num_partitions, tmp_dir, metrics, start, end)
+        return _sort_joined(joined, sort_budget_mb, tmp_dir, metrics)
+
+    print(f"Join strategy: in-memory hash join "
+          f"(dimensions ~{estimate_mb:.1f} MB, budget {memory_budget_mb:g} MB)", file=sys.stderr)
+    if concurrent:
+        return stream_transactions_concurrent(
+            trans_file, users_file, agreements_file, sort_budget_mb, tmp_dir, metrics=metrics, start=start, end=end
+        )
+    with stage(metrics, 'load_dimensions') as dimensions_stage:
+        users = load_users(users_file)
+        agreements = load_agreements(agreements_file)
+        dimensions_stage.rows = len(users) + count_agreement_versions(agreements)
+    return stream_transactions(trans_file, users, agreements, sort_budget_mb, tmp_dir, metrics, start, end)
 
 def process_transactions(
     trans_file: str,
-    users: Dict[str, bool]
-) -> List[dict]:
-    """Process transactions and join with user data."""
-    results = []
-    
-    with open(trans_file, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            transaction_date = parse_date(row['date'])
-            user_id = row['user_id']
-            
-            # Get user status
-            is_active = users.get(user_id, False)
-            
-            results.append({
-                'transaction_id': row['transaction_id'],
-                'transaction_date': row['date'],
-                'user_id': user_id,
-                'is_blocked': row['is_blocked'].lower() == 'true',
-                'transaction_amount': int(row['transaction_amount']),
-                'transaction_category_id': int(row['transaction_category_id']),
-                'is_active': is_active
-            })
-    
-    return sorted(results, key=lambda x: (x['transaction_date'], x['transaction_id']))
-
-def print_results(results: List[dict]) -> None:
-    """Print results in CSV format."""
-    if not results:
-        return
-    
-    headers = results[0].keys()
-    writer = csv.DictWriter(sys.stdout, fieldnames=headers)
-    writer.writeheader()
-    writer.writerows(results)
+    users: Dict[str, bool],
+    agreements: Optional[AgreementIndex] = None,
+    memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB
+) -> List[JoinedRow]:
+    """Process transactions and join with user and agreement data."""
+    return list(stream_transactions(trans_file, users, agreements, memory_budget_mb))
+
+def write_results(results: Iterable[JoinedRow], path: str = '-', fmt: Optional[str] = None) -> int:
+    """
+    Stream results into an output sink in batches as they are produced.
+    fmt is one of SINK_FORMATS, by default inferred from the path's extension;
+    path '-' writes CSV to stdout. Returns the number of rows written.
+    """
+    # Pull the first row before opening the sink, so input errors surface before any output
+    results = iter(results)
+    first = next(results, None)
+    rows = chain([first], results) if first is not None else ()
+    with open_sink(path, JoinedRow.SCHEMA, fmt) as sink:
+        return write_batches(sink, (row.values() for row in rows))
+
+def print_results(results: Iterable[JoinedRow]) -> None:
+    """Print results in CSV format as they are produced."""
+    write_results(results, '-', 'csv')
+
+def stream_transactions_duckdb(
+    trans_file: str,
+    users_file: str,
+    agreements_file: str,
+    batch_size: int = DUCKDB_BATCH_SIZE,
+    threads: Optional[int] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Iterator[JoinedRow]:
+    """
+    DuckDB backend: scan the three CSVs directly, resolve agreements with a
+    range join that picks the same version as _match_at, and stream the
+    ordered result back in batches of batch_size rows.
+    Only the transaction partitions between start and end are scanned.
+    """
+    for path in (trans_file, users_file, agreements_file):
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+
+    conn = duckdb.connect(':memory:')
+    try:
+        if threads:
+            conn.execute(f"SET threads TO {int(threads)}")
+        for view, files in (
+            ('transactions', sql_files(trans_file, start, end)),
+            ('users', sql_literal(users_file)),
+            ('dim_dep_agreement', sql_literal(agreements_file))
+        ):
+            select = DUCKDB_INPUT_VIEWS[view].format(path=files)
+            if view == 'transactions' and (start is not None or end is not None):
+                # Partitions are already pruned; the filter also limits a flat file
+                select = f"SELECT * FROM ({select}) WHERE " + sql_date_filter('transaction_date', start, end)
+            conn.execute(f"CREATE VIEW {view} AS {select}")
+
+        cursor = registry.execute(conn, POINT_IN_TIME_QUERY)
+        columns = tuple(description[0] for description in cursor.description)
+        if columns != JoinedRow.FIELDS:
+            raise ValueError(f"{POINT_IN_TIME_QUERY} returns {columns}, expected {JoinedRow.FIELDS}")
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            for row in batch:
+                yield JoinedRow(*row)
+    finally:
+        conn.close()
+
+def compare_backends(
+    trans_file: str,
+    users_file: str,
+    agreements_file: str,
+    max_reported: int = 10,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> List[str]:
+    """
+    Parity check: run the Python and DuckDB backends on the same input and
+    diff their ordered output row by row. Returns descriptions of mismatches.
+    """
+    users = load_users(users_file)
+    agreements = load_agreements(agreements_file)
+    python_rows = stream_transactions(trans_file, users, agreements, start=start, end=end)
+    duckdb_rows = stream_transactions_duckdb(trans_file, users_file, agreements_file, start=start, end=end)
+
+    differences = []
+    num_differences = 0
+    missing = object()
+    for position, (expected, actual) in enumerate(zip_longest(python_rows, duckdb_rows, fillvalue=missing)):
+        if expected == actual:
+            continue
+        num_differences += 1
+        if len(differences) < max_reported:
+            if expected is missing or actual is missing:
+                side = 'python' if expected is missing else 'duckdb'
+                differences.append(f"row {position}: missing from {side} output")
+            else:
+                fields = [key for key in JoinedRow.FIELDS if expected[key] != actual[key]]
+                differences.append(
+                    f"row {position} ({expected.transaction_id}): "
+                    + ', '.join(f"{key} python={expected[key]!r} duckdb={actual[key]!r}" for key in fields)
+                )
+    if num_differences > len(differences):
+        differences.append(f"... {num_differences - len(differences)} more differences")
+    return differences
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Join transactions with users and agreements.')
+    parser.add_argument('--backend', choices=['python', 'duckdb'], default='python',
+                        help='Join engine')
+    parser.add_argument('--parity', action='store_true',
+                        help='Diff the DuckDB backend against the Python backend instead of printing results')
+    parser.add_argument('--data-dir', default='data', help='Directory with the input CSVs')
+    parser.add_argument('--start', default=None, help='First transaction date to join (YYYY-MM-DD)')
+    parser.add_argument('--end', default=None, help='Last transaction date to join (YYYY-MM-DD)')
+    parser.add_argument('--serial-load', action='store_true',
+                        help='Load users, agreements and transactions one after another instead of concurrently')
+    parser.add_argument('--memory-budget-mb', type=float, default=None,
+                        help='Memory budget for the Python join; dimensions that do not fit use a grace hash join')
+    parser.add_argument('--output', default='-',
+                        help="Output file, or '-' for CSV on stdout")
+    parser.add_argument('--format', choices=SINK_FORMATS, default=None,
+                        help='Output format (default: from the --output extension)')
+    parser.add_argument('--metrics-json', default=None,
+                        help='Write per-stage timing, throughput and memory metrics to this JSON file')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile the run with cProfile and include the hottest functions in the metrics')
+    return parser.parse_args()
 
 def main():
     """Main function to process and join datasets."""
+    args = parse_args()
+    users_file = os.path.join(args.data_dir, 'users.csv')
+    # A transactions/ directory holds the date-partitioned layout
+    trans_file = os.path.join(args.data_dir, 'transactions')
+    if not is_partitioned(trans_file):
+        trans_file += '.csv'
+    date_range = {'start': args.start, 'end': args.end}
+    agreements_file = os.path.join(args.data_dir, 'dim_dep_agreement.csv')
     try:
-        users = load_users('data/users.csv')
-        results = process_transactions('data/transactions.csv', users)
-        print_results(results)
+        if args.parity:
+            differences = compare_backends(trans_file, users_file, agreements_file, **date_range)
+            if differences:
+                print("DuckDB and Python backends differ:")
+                for difference in differences:
+                    print(f"  {difference}")
+                sys.exit(1)
+            print("DuckDB and Python backends produce identical results")
+            return
+
+        resolve_format(args.output, args.format)
+        metrics = PipelineMetrics('join_datasets', profile=args.profile) if args.metrics_json or args.profile else None
+        if args.backend == 'duckdb':
+            results = track(metrics, 'duckdb_query', stream_transactions_duckdb(
+                trans_file, users_file, agreements_file, **date_range
+            ))
+        elif args.memory_budget_mb is not None:
+            results = stream_transactions_budgeted(
+                trans_file, users_file, agreements_file, args.memory_budget_mb,
+                concurrent=not args.serial_load, metrics=metrics, **date_range
+            )
+        elif not args.serial_load:
+            results = stream_transactions_concurrent(
+                trans_file, users_file, agreements_file, metrics=metrics, **date_range
+            )
+        else:
+            with stage(metrics, 'load_users') as users_stage:
+                users = load_users(users_file)
+                users_stage.rows = len(users)
+            with stage(metrics, 'load_agreements') as agreements_stage:
+                agreements = load_agreements(agreements_file)
+                agreements_stage.rows = count_agreement_versions(agreements)
+            results = stream_transactions(trans_file, users, agreements, metrics=metrics, **date_range)
+        with stage(metrics, 'write_output') as output_stage:
+            output_stage.rows = write_results(results, args.output, args.format)
+
+        if metrics is not None:
+            metrics.print_summary()
+            if args.metrics_json:
+                metrics.write_json(args.metrics_json)
     except FileNotFoundError as e:
         print(f"Error: {e}")
         print("Please ensure data files are generated using 'make generate' first")
         sys.exit(1)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,7 +1,23 @@
 import csv
 import os
+import resource
+import tempfile
 from datetime import datetime
-from join_datasets import process_transactions, load_users, load_agreements
+import duckdb
+import pyarrow.ipc
+from external_sort import external_sort
+from instrumentation import PipelineMetrics
+from config.join_datasets_test_config import (
+    USERS, USER_COLUMNS, AGREEMENTS, AGREEMENT_COLUMNS, TRANSACTIONS, TRANSACTION_COLUMNS, EXPECTED_PRODUCTS
+)
+from output_sinks import SINK_FORMATS
+from join_datasets import (
+    process_transactions, load_users, load_agreements, find_matching_agreement, parse_date,
+    compare_backends, write_results, estimate_dimensions_mb, plan_join, stream_transactions_budgeted,
+    stream_transactions_duckdb,
+    GRACE_HASH_JOIN, IN_MEMORY_JOIN
+)
+from utils import write_data
 import main  # Import main instead of data_generator
 
 def run_tests():
@@ -21,6 +37,16 @@ def run_tests():
         
         # Validate results
         validate_results(results)
+        validate_agreement_lookups(results, agreements_dict)
+        validate_output_sinks(results)
+        validate_external_sort(results)
+        validate_budgeted_join(results, transactions_path, users_path, agreements_path)
+
+        # DuckDB backend must match the Python backend
+        differences = compare_backends(transactions_path, users_path, agreements_path)
+        assert not differences, "DuckDB backend differs:\n" + "\n".join(differences)
+
+        validate_point_in_time_fixture()
         
         print("All tests passed successfully!")
         return True
@@ -54,6 +80,121 @@ def validate_results(results):
     print(f"Active users: {len([r for r in results if r['is_active']])}")
     print(f"Blocked transactions: {len([r for r in results if r['is_blocked']])}")
 
+def validate_agreement_lookups(results, agreements):
+    """Batched agreement lookups must match the single binary-search lookup."""
+    for result in results:
+        client_index = agreements.get(result['user_id'])
+        expected = (None, None)
+        if client_index is not None:
+            expected = find_matching_agreement(client_index, parse_date(result['transaction_date']))
+        actual = (result['product_id'], result['interest_rate'])
+        assert actual == expected, \
+            f"Agreement mismatch for {result['transaction_id']}: expected {expected}, got {actual}"
+
+def validate_output_sinks(results):
+    """Every output sink must round-trip the results without loss."""
+    readers = {
+        'csv': duckdb.read_csv,
+        'jsonl': duckdb.read_json,
+        'arrow': lambda path: duckdb.from_arrow(pyarrow.ipc.open_file(path).read_all()),
+        'parquet': duckdb.read_parquet
+    }
+    expected = (
+        len(results),
+        sum(r['transaction_amount'] for r in results),
+        sum(1 for r in results if r['product_id'] is not None)
+    )
+    expected_rows = [(r['transaction_id'], r['product_id']) for r in results]
+    with tempfile.TemporaryDirectory() as directory:
+        for fmt in SINK_FORMATS:
+            path = os.path.join(directory, f'joined.{fmt}')
+            written = write_results(results, path)
+            assert written == len(results), f"{fmt} sink wrote {written} of {len(results)} rows"
+            relation = readers[fmt](path)
+            actual = relation.query(
+                'joined', "SELECT count(*), coalesce(sum(transaction_amount), 0), count(product_id) FROM joined"
+            ).fetchone()
+            assert actual == expected, f"{fmt} sink round trip: expected {expected}, got {actual}"
+            actual_rows = relation.query(
+                'joined', "SELECT CAST(transaction_id AS VARCHAR), CAST(product_id AS BIGINT) FROM joined"
+            ).fetchall()
+            assert actual_rows == expected_rows, f"{fmt} sink round trip changed rows or their order"
+            print(f"{fmt} sink round trip OK ({written} rows)")
+
+def validate_external_sort(results):
+    """
+    A budget far below the input spills hundreds of runs; the merge must stay
+    within a small open file limit and keep rows with equal keys in input order.
+    """
+    soft_limit, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(64, hard_limit), hard_limit))
+    try:
+        key = lambda row: row['transaction_date']
+        merged = list(external_sort(results, key=key, memory_budget_mb=0.01))
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft_limit, hard_limit))
+    assert merged == sorted(results, key=key), "External sort differs from a stable in-memory sort"
+    print(f"External sort of {len(merged)} rows in a 0.01 MB budget matches")
+
+def validate_budgeted_join(results, transactions_path, users_path, agreements_path):
+    """
+    The grace hash join must produce the in-memory join's rows in the same order.
+    The budget is set from the dimension estimate so the join uses a handful of
+    partitions and sort runs; a budget needing more partitions than can be
+    written at once must be rejected.
+    """
+    assert plan_join(users_path, agreements_path, 1024)[0] == IN_MEMORY_JOIN, "Expected an in-memory join for 1GB"
+    memory_budget_mb = estimate_dimensions_mb(users_path, agreements_path) / 2
+    strategy, num_partitions = plan_join(users_path, agreements_path, memory_budget_mb)
+    assert strategy == GRACE_HASH_JOIN and 1 < num_partitions <= 8, \
+        f"Expected a grace join in a few partitions, got {strategy} with {num_partitions} partitions"
+    grace = list(stream_transactions_budgeted(transactions_path, users_path, agreements_path, memory_budget_mb))
+    assert grace == results, "Grace hash join differs from the in-memory join"
+    print(f"Grace hash join in {num_partitions} partitions matches ({len(grace)} rows)")
+    try:
+        plan_join(users_path, agreements_path, memory_budget_mb / 1000)
+        raise AssertionError("A budget needing too many partitions was accepted")
+    except ValueError:
+        pass
+
+def validate_point_in_time_fixture():
+    """
+    Every backend must pick the covering agreement version on a fixture with
+    overlapping, consecutive, open-ended and same-day versions.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        users_path = os.path.join(directory, 'users.csv')
+        agreements_path = os.path.join(directory, 'dim_dep_agreement.csv')
+        transactions_path = os.path.join(directory, 'transactions.csv')
+        write_data(users_path, USER_COLUMNS, USERS)
+        write_data(agreements_path, AGREEMENT_COLUMNS, AGREEMENTS)
+        write_data(transactions_path, TRANSACTION_COLUMNS, TRANSACTIONS)
+
+        agreements = load_agreements(agreements_path)
+        python_rows = process_transactions(transactions_path, load_users(users_path), agreements)
+        validate_agreement_lookups(python_rows, agreements)
+        validate_output_sinks(python_rows)
+        metrics = PipelineMetrics('join_datasets_test')
+        backends = {
+            'python': python_rows,
+            'duckdb': list(stream_transactions_duckdb(transactions_path, users_path, agreements_path)),
+            'grace': list(stream_transactions_budgeted(
+                transactions_path, users_path, agreements_path,
+                memory_budget_mb=estimate_dimensions_mb(users_path, agreements_path) / 2, metrics=metrics
+            ))
+        }
+        loaded = {stage['stage']: stage for stage in metrics.report()['stages']}['load_dimensions']['rows']
+        assert loaded == len(USERS) + len(AGREEMENTS), \
+            f"Expected {len(USERS)} users and {len(AGREEMENTS)} agreement versions loaded, got {loaded} rows"
+        for backend, rows in backends.items():
+            actual = {row['transaction_id']: row['product_id'] for row in rows}
+            assert actual == EXPECTED_PRODUCTS, \
+                f"{backend} agreement matches: expected {EXPECTED_PRODUCTS}, got {actual}"
+
+        differences = compare_backends(transactions_path, users_path, agreements_path)
+        assert not differences, "DuckDB backend differs on the fixture:\n" + "\n".join(differences)
+    print(f"Point-in-time fixture matches on every backend ({len(EXPECTED_PRODUCTS)} transactions)")
+
 if __name__ == "__main__":
     print("Starting join datasets test...")
     run_tests()
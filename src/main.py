@@ -1,6 +1,20 @@
-from data_generator import generate_users, generate_transactions
-from data_processor import process_transactions, format_results
-from user_service import read_active_users
+import argparse
+from itertools import chain
+from typing import Optional
+from aggregate_checkpoint import process_transactions_incremental
+from concurrent_loading import ConcurrentLoader
+from csv_cache import file_fingerprint
+from csv_ingest import chunked
+from data_generator import generate_users, generate_transactions, generate_agreements
+from data_processor import (
+    ENGINES, TRANSACTION_COLUMNS, format_results, process_transactions, process_transactions_interned,
+    process_transactions_parallel, process_transactions_vectorized, read_transaction_chunks
+)
+from distinct_counters import DISTINCT_MODES
+from instrumentation import PipelineMetrics, stage
+from output_sinks import SINK_FORMATS, open_sink, resolve_format
+from partitioned_storage import is_partitioned, iter_transaction_rows
+from user_service import UserIdDictionary, read_active_user_ids, read_active_users
 from utils import write_data
 
 
@@ -9,28 +23,159 @@ def generate_data_files():
     print("Generating data files...")
     users = generate_users()
     transactions = generate_transactions(users)
+    agreements = generate_agreements(users)
 
     print(f"Generated {len(users['data'])} users")
     print(f"Generated {len(transactions['data'])} transactions")
+    print(f"Generated {len(agreements['data'])} agreements")
 
     write_data('users.csv', users['header'], users['data'])
     write_data('transactions.csv', transactions['header'], transactions['data'])
+    write_data('dim_dep_agreement.csv', agreements['header'], agreements['data'])
 
 
-def process_data():
-    """Process the data files and return results."""
+# Rows per chunk the prefetch thread hands to the row-at-a-time engine
+PREFETCH_CHUNK_ROWS = 10000
+# DataFrame chunks are large, so the vectorized engine prefetches fewer of them
+VECTORIZED_PREFETCH_CHUNKS = 2
+
+
+def process_concurrently(
+    engine: str,
+    use_cache: bool = False,
+    metrics: Optional[PipelineMetrics] = None,
+    transactions: str = 'transactions.csv',
+    start: Optional[str] = None,
+    end: Optional[str] = None
+):
+    """
+    Aggregate with the exact python or vectorized engine while overlapping
+    input loading: users.csv is parsed in a worker process while a background
+    thread already reads and decodes transaction chunks. Aggregation starts
+    once the active users are known.
+    """
+    with ConcurrentLoader(max_workers=1) as loader:
+        users_future = loader.submit(read_active_users, 'users.csv', use_cache)
+        if engine == 'vectorized':
+            # Cached chunks are memory-mapped slices that need no prefetching
+            chunks = None if use_cache else loader.prefetch(
+                read_transaction_chunks(transactions, start=start, end=end), VECTORIZED_PREFETCH_CHUNKS
+            )
+        else:
+            rows = iter_transaction_rows(transactions, TRANSACTION_COLUMNS, start, end)
+            chunks = loader.prefetch(chunked(rows, PREFETCH_CHUNK_ROWS))
+
+        with stage(metrics, 'read_active_users') as users_stage:
+            active_users = users_future.result()
+            users_stage.rows = len(active_users)
+        print(f"Found {len(active_users)} active users")
+
+        if engine == 'vectorized':
+            # Without prefetched chunks the engine reads the cache itself, and rejects a date range
+            return process_transactions_vectorized(
+                transactions, active_users, use_cache=use_cache, metrics=metrics, chunks=chunks,
+                start=start, end=end
+            )
+        return process_transactions(
+            transactions, active_users, metrics=metrics, rows=chain.from_iterable(chunks)
+        )
+
+
+def process_data(
+    engine: str = 'python',
+    distinct: str = 'exact',
+    workers: Optional[int] = None,
+    use_cache: bool = False,
+    metrics: Optional[PipelineMetrics] = None,
+    concurrent: bool = False,
+    transactions: str = 'transactions.csv',
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    checkpoint: Optional[str] = None
+):
+    """
+    Process the data files and return results.
+    engine selects the aggregation: 'python' (row at a time), 'vectorized' (chunked pandas)
+    or 'parallel' (byte-range shards aggregated by `workers` processes).
+    distinct selects how users are counted per category: 'exact' (sets of UUIDs),
+    'bitmap' (interned ids) or 'hll' (approximate, bounded memory).
+    use_cache reads users (and transactions for the vectorized engine) from the columnar cache.
+    metrics, when given, records each stage of the run.
+    concurrent overlaps loading users with reading transactions for the exact
+    python and vectorized engines (see process_concurrently); the parallel
+    engine already reads in its workers.
+    transactions is a CSV file or a date=YYYY-MM-DD/ partitioned directory;
+    start and end (inclusive) restrict the dates aggregated, and only the
+    matching partitions are opened.
+    checkpoint is a state file for an append-only flat transactions CSV: the
+    run only aggregates the rows appended since the last run (see
+    aggregate_checkpoint) and rebuilds the state when the file was rewritten.
+    """
     print("\nProcessing data...")
-    active_users = read_active_users('users.csv')
-    print(f"Found {len(active_users)} active users")
-    
-    category_data = process_transactions('transactions.csv', active_users)
+    if checkpoint is not None:
+        if engine != 'python' or distinct != 'exact':
+            raise ValueError("Checkpointed aggregation uses the python engine with exact user counts")
+        if start is not None or end is not None or is_partitioned(transactions):
+            raise ValueError("Checkpointed aggregation covers a whole flat transactions CSV")
+        with stage(metrics, 'read_active_users') as users_stage:
+            active_users = read_active_users('users.csv', use_cache)
+            users_stage.rows = len(active_users)
+        print(f"Found {len(active_users)} active users")
+        category_data, offset = process_transactions_incremental(
+            transactions, active_users, checkpoint, file_fingerprint('users.csv'), metrics=metrics
+        )
+        if offset:
+            print(f"Resumed from checkpoint {checkpoint} at byte {offset}")
+        else:
+            print(f"Rebuilt checkpoint {checkpoint} from the start of {transactions}")
+    elif concurrent and distinct == 'exact' and engine in ('python', 'vectorized'):
+        category_data = process_concurrently(engine, use_cache, metrics, transactions, start, end)
+    elif distinct != 'exact' and engine == 'python':
+        user_ids = UserIdDictionary()
+        with stage(metrics, 'read_active_users') as users_stage:
+            active_users = read_active_user_ids('users.csv', user_ids)
+            users_stage.rows = len(user_ids)
+        print(f"Found {len(active_users)} active users")
+        category_data = process_transactions_interned(
+            transactions, active_users, user_ids, distinct, metrics=metrics, start=start, end=end
+        )
+    elif distinct != 'exact' and engine != 'parallel':
+        raise ValueError(f"Distinct mode '{distinct}' is not supported by the {engine} engine")
+    else:
+        with stage(metrics, 'read_active_users') as users_stage:
+            active_users = read_active_users('users.csv', use_cache)
+            users_stage.rows = len(active_users)
+        print(f"Found {len(active_users)} active users")
+        if engine == 'parallel':
+            if start is not None or end is not None:
+                raise ValueError("The parallel engine does not support date ranges")
+            category_data = process_transactions_parallel(
+                transactions, active_users, workers, distinct, metrics=metrics
+            )
+        elif engine == 'vectorized':
+            category_data = process_transactions_vectorized(
+                transactions, active_users, use_cache=use_cache, metrics=metrics, start=start, end=end
+            )
+        else:
+            category_data = ENGINES[engine](transactions, active_users, metrics=metrics, start=start, end=end)
     print(f"Found {len(category_data)} transaction categories")
     
-    results = format_results(category_data)
+    with stage(metrics, 'format_results', len(category_data)):
+        results = format_results(category_data)
     print(f"Generated {len(results)} result rows")
     return results
 
 
+RESULT_SCHEMA = (('transaction_category_id', 'int64'), ('sum_amount', 'int64'), ('num_users', 'int64'))
+
+
+def write_results(results, path: str, fmt: Optional[str] = None) -> None:
+    """Write results to a file through an output sink (CSV, JSON lines, Arrow or Parquet)."""
+    with open_sink(path, RESULT_SCHEMA, fmt) as sink:
+        sink.write_batch(results)
+    print(f"\nWrote {len(results)} result rows to {path}")
+
+
 def print_results(results):
     """Print results in CSV format."""
     print("\nResults:")
@@ -43,15 +188,63 @@ def print_results(results):
         print(f"{category_id},{sum_amount},{num_users}")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='Generate data files and aggregate transactions by category.')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='python',
+                        help='Aggregation engine for transactions.csv')
+    parser.add_argument('--distinct', choices=DISTINCT_MODES, default='exact',
+                        help='How unique users are counted per category')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes for the parallel engine (default: all cores)')
+    parser.add_argument('--cache', action='store_true',
+                        help='Read inputs through the columnar CSV cache')
+    parser.add_argument('--transactions', default='transactions.csv',
+                        help='Transactions CSV or date=YYYY-MM-DD/ partitioned directory to aggregate')
+    parser.add_argument('--start', default=None, help='First transaction date to aggregate (YYYY-MM-DD)')
+    parser.add_argument('--end', default=None, help='Last transaction date to aggregate (YYYY-MM-DD)')
+    parser.add_argument('--checkpoint', default=None,
+                        help='Aggregate only rows appended since the last run, keeping state in this file')
+    parser.add_argument('--serial-load', action='store_true',
+                        help='Read users.csv before transactions.csv instead of concurrently')
+    parser.add_argument('--output', default=None,
+                        help='Write results to this file instead of printing them')
+    parser.add_argument('--format', choices=SINK_FORMATS, default=None,
+                        help='Output format (default: from the --output extension)')
+    parser.add_argument('--metrics-json', default=None,
+                        help='Write per-stage timing, throughput and memory metrics to this JSON file')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile the run with cProfile and include the hottest functions in the metrics')
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+    if args.output:
+        resolve_format(args.output, args.format)
+    metrics = PipelineMetrics('main', profile=args.profile) if args.metrics_json or args.profile else None
+
     # Generate data files
-    generate_data_files()
+    with stage(metrics, 'generate_data'):
+        generate_data_files()
     
     # Process data and get results
-    results = process_data()
+    results = process_data(
+        engine=args.engine, distinct=args.distinct, workers=args.workers, use_cache=args.cache,
+        metrics=metrics, concurrent=not args.serial_load,
+        transactions=args.transactions, start=args.start, end=args.end, checkpoint=args.checkpoint
+    )
     
-    # Print results
-    print_results(results)
+    # Print or write results
+    with stage(metrics, 'output_results', len(results)):
+        if args.output:
+            write_results(results, args.output, args.format)
+        else:
+            print_results(results)
+
+    if metrics is not None:
+        metrics.print_summary()
+        if args.metrics_json:
+            metrics.write_json(args.metrics_json)
 
 
 if __name__ == '__main__':
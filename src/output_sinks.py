@@ -0,0 +1,195 @@
+import csv
+import json
+import os
+import sys
+from abc import ABC, abstractmethod
+from itertools import islice
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+# Rows handed to a sink per write_batch call
+DEFAULT_BATCH_SIZE = 65536
+# Write buffer for text sinks; large writes keep syscalls off the hot path
+DEFAULT_BUFFER_SIZE = 1 << 20
+
+# (column name, type) with types 'string', 'int64', 'float64' or 'bool'
+Schema = Sequence[Tuple[str, str]]
+
+SINK_FORMATS = ('csv', 'jsonl', 'arrow', 'parquet')
+FORMAT_EXTENSIONS = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+    '.parquet': 'parquet'
+}
+
+
+def _import_pyarrow():
+    """pyarrow is imported on first use, so runs writing CSV or JSON lines never load it."""
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("The arrow and parquet sinks require pyarrow: pip install -r requirements.txt") from e
+    return pyarrow
+
+
+class OutputSink(ABC):
+    """
+    Destination for result rows, written in batches of tuples ordered like
+    the schema. Sinks are context managers; close() flushes the last batch.
+    """
+
+    def __init__(self, path: str, schema: Schema):
+        self.path = path
+        self.schema = list(schema)
+        self.columns = [name for name, _ in self.schema]
+        self.rows_written = 0
+
+    @abstractmethod
+    def write_batch(self, rows: List[tuple]) -> None:
+        """Write rows, each a tuple ordered like the schema."""
+
+    @abstractmethod
+    def close(self) -> None:
+        """Flush and release the destination."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _TextSink(OutputSink):
+    """Base for text sinks; path '-' writes to stdout."""
+
+    def __init__(self, path: str, schema: Schema, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        super().__init__(path, schema)
+        if path == '-':
+            self._file = sys.stdout
+        else:
+            self._file = open(path, 'w', newline='', buffering=buffer_size)
+
+    def close(self) -> None:
+        if self._file is sys.stdout:
+            self._file.flush()
+        else:
+            self._file.close()
+
+
+class CsvSink(_TextSink):
+    """CSV with a header row, matching csv.writer formatting of the values."""
+
+    def __init__(self, path: str, schema: Schema, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        super().__init__(path, schema, buffer_size)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.columns)
+
+    def write_batch(self, rows: List[tuple]) -> None:
+        self._writer.writerows(rows)
+        self.rows_written += len(rows)
+
+
+class JsonLinesSink(_TextSink):
+    """Newline-delimited JSON objects, one per row; DuckDB reads it with read_json."""
+
+    def write_batch(self, rows: List[tuple]) -> None:
+        columns = self.columns
+        dumps = json.dumps
+        self._file.write(''.join(dumps(dict(zip(columns, row))) + '\n' for row in rows))
+        self.rows_written += len(rows)
+
+
+class _ArrowSink(OutputSink):
+    """Base for pyarrow sinks: each batch becomes one RecordBatch with the declared schema."""
+
+    def __init__(self, path: str, schema: Schema):
+        super().__init__(path, schema)
+        self._pa = _import_pyarrow()
+        types = {
+            'string': self._pa.string(),
+            'int64': self._pa.int64(),
+            'float64': self._pa.float64(),
+            'bool': self._pa.bool_()
+        }
+        self.arrow_schema = self._pa.schema([(name, types[kind]) for name, kind in self.schema])
+        self._writer = self._open_writer()
+
+    @abstractmethod
+    def _open_writer(self):
+        """The pyarrow writer for self.path."""
+
+    def write_batch(self, rows: List[tuple]) -> None:
+        if not rows:
+            return
+        columns = list(zip(*rows))
+        arrays = [
+            self._pa.array(values, type=field.type)
+            for values, field in zip(columns, self.arrow_schema)
+        ]
+        self._writer.write_batch(self._pa.RecordBatch.from_arrays(arrays, schema=self.arrow_schema))
+        self.rows_written += len(rows)
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+class ArrowSink(_ArrowSink):
+    """Arrow IPC file format (Feather v2)."""
+
+    def _open_writer(self):
+        return self._pa.ipc.new_file(self.path, self.arrow_schema)
+
+
+class ParquetSink(_ArrowSink):
+    """Parquet file with one row group per batch."""
+
+    def _open_writer(self):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(self.path, self.arrow_schema)
+
+
+SINKS = {
+    'csv': CsvSink,
+    'jsonl': JsonLinesSink,
+    'arrow': ArrowSink,
+    'parquet': ParquetSink
+}
+
+
+def infer_format(path: str) -> str:
+    """Sink format from a file extension; stdout and unknown extensions are CSV."""
+    return FORMAT_EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'csv')
+
+
+def resolve_format(path: str, fmt: Optional[str] = None) -> str:
+    """
+    The sink format for a path, checked up front so a missing optional
+    dependency fails before a long pipeline run rather than at write time.
+    """
+    fmt = fmt or infer_format(path)
+    if fmt not in SINKS:
+        raise ValueError(f"Unknown output format '{fmt}', expected one of {SINK_FORMATS}")
+    if fmt in ('arrow', 'parquet'):
+        _import_pyarrow()
+    return fmt
+
+
+def open_sink(path: str, schema: Schema, fmt: Optional[str] = None) -> OutputSink:
+    """Open the sink for fmt, or for the format implied by the path's extension."""
+    fmt = resolve_format(path, fmt)
+    if path != '-' and os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    return SINKS[fmt](path, schema)
+
+
+def write_batches(sink: OutputSink, rows: Iterable[tuple], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Stream rows into a sink batch by batch; returns the number of rows written."""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return sink.rows_written
+        sink.write_batch(batch)
@@ -0,0 +1,187 @@
+import csv
+import os
+import zlib
+from datetime import date, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from csv_ingest import column_positions, iter_rows
+from query_registry import sql_literal
+
+# Hive-style layout: <root>/date=YYYY-MM-DD/part-00000.csv
+PARTITION_KEY = 'date'
+PARTITION_FILE = 'part-00000.csv'
+# Partition files open at once while splitting a flat file; dates beyond this are written in later passes
+MAX_OPEN_PARTITIONS = 256
+
+
+def is_partitioned(path: str) -> bool:
+    """A partitioned dataset is a directory of date=... partitions; a flat dataset is one CSV."""
+    return os.path.isdir(path)
+
+
+def partition_path(root: str, day: str) -> str:
+    return os.path.join(root, f"{PARTITION_KEY}={day}", PARTITION_FILE)
+
+
+def list_partitions(root: str) -> List[Tuple[str, str]]:
+    """(date string, partition file) pairs of a partitioned dataset, in date order."""
+    prefix = f"{PARTITION_KEY}="
+    partitions = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name, PARTITION_FILE)
+        if name.startswith(prefix) and os.path.isfile(path):
+            partitions.append((name[len(prefix):], path))
+    partitions.sort()
+    return partitions
+
+
+def prune_partitions(root: str, start: Optional[str] = None, end: Optional[str] = None) -> List[str]:
+    """
+    Files of the partitions with start <= date <= end (both optional, inclusive).
+    Pruning only looks at directory names; no partition outside the range is opened.
+    """
+    return [
+        path for day, path in list_partitions(root)
+        if (start is None or day >= start) and (end is None or day <= end)
+    ]
+
+
+def transaction_files(path: str, start: Optional[str] = None, end: Optional[str] = None) -> List[str]:
+    """The CSV files to read for a date range: the pruned partitions, or the flat file itself."""
+    return prune_partitions(path, start, end) if is_partitioned(path) else [path]
+
+
+def sql_files(path: str, start: Optional[str] = None, end: Optional[str] = None) -> str:
+    """
+    SQL argument for read_csv covering a flat or partitioned dataset: one
+    quoted path, or a list of the pruned partition files. Flat files cannot
+    be pruned, so callers filter their rows by date in SQL.
+    """
+    if not is_partitioned(path):
+        return sql_literal(path)
+    files = prune_partitions(path, start, end)
+    if not files:
+        raise ValueError(f"No partitions of {path} between {start} and {end}")
+    return '[' + ', '.join(sql_literal(filename) for filename in files) + ']'
+
+
+def sql_date_filter(column: str, start: Optional[str] = None, end: Optional[str] = None) -> str:
+    """SQL predicate limiting a DATE column to start <= column <= end (TRUE without bounds)."""
+    conditions = []
+    if start is not None:
+        conditions.append(f"{column} >= CAST({sql_literal(start)} AS DATE)")
+    if end is not None:
+        conditions.append(f"{column} <= CAST({sql_literal(end)} AS DATE)")
+    return ' AND '.join(conditions) or 'TRUE'
+
+
+def shift_date(day: str, days: int) -> str:
+    """YYYY-MM-DD string moved by a number of days."""
+    return (date.fromisoformat(day) + timedelta(days=days)).isoformat()
+
+
+def iter_transaction_rows(
+    path: str,
+    columns: Sequence[str],
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Iterator[Tuple[str, ...]]:
+    """
+    iter_rows over a flat or partitioned transactions dataset, limited to
+    start <= date <= end. Partitions outside the range are skipped unopened;
+    a flat file has to be scanned and its rows filtered by date.
+    """
+    if start is None and end is None:
+        for filename in transaction_files(path):
+            yield from iter_rows(filename, columns)
+        return
+
+    if is_partitioned(path):
+        for filename in prune_partitions(path, start, end):
+            yield from iter_rows(filename, columns)
+        return
+
+    # ISO dates compare correctly as strings
+    for row in iter_rows(path, (*columns, PARTITION_KEY)):
+        day = row[-1]
+        if (start is None or day >= start) and (end is None or day <= end):
+            yield row[:-1]
+
+
+def partition_csv(source: str, root: str) -> Dict[str, int]:
+    """
+    Split a flat transactions CSV into a date-partitioned layout under root.
+    Each partition file keeps the full header (including the date column), so
+    every partition is a standalone transactions CSV. Returns rows per date.
+    """
+    counts: Dict[str, int] = {}
+    pending = True
+    written = set()
+    while pending:
+        # Each pass writes up to MAX_OPEN_PARTITIONS new dates, so file handles stay bounded
+        pending = False
+        files: Dict[str, Tuple[TextIO, csv.writer]] = {}
+        try:
+            with open(source, 'r', newline='') as f:
+                reader = csv.reader(f)
+                header = next(reader)
+                (date_col,) = column_positions(header, (PARTITION_KEY,))
+                for row in reader:
+                    if not row:
+                        continue
+                    day = row[date_col]
+                    if day in written:
+                        continue
+                    target = files.get(day)
+                    if target is None:
+                        if len(files) >= MAX_OPEN_PARTITIONS:
+                            pending = True
+                            continue
+                        path = partition_path(root, day)
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        handle = open(path, 'w', newline='')
+                        target = files[day] = (handle, csv.writer(handle))
+                        target[1].writerow(header)
+                    target[1].writerow(row)
+                    counts[day] = counts.get(day, 0) + 1
+        finally:
+            for handle, _ in files.values():
+                handle.close()
+        written.update(files)
+    return counts
+
+
+def bucket_of(key: str, num_buckets: int) -> int:
+    """Stable hash bucket of a key; crc32 rather than hash() so every process agrees."""
+    return zlib.crc32(key.encode()) % num_buckets
+
+
+def hash_partition(
+    rows: Iterable[Sequence[str]],
+    columns: Sequence[str],
+    key: str,
+    paths: Sequence[str]
+) -> List[int]:
+    """
+    Write rows to one CSV per path, choosing the file by bucket_of the key
+    column. Every file starts with the columns as header, so a partition
+    reads like the full file. Returns the rows written per path.
+    """
+    if len(paths) > MAX_OPEN_PARTITIONS:
+        raise ValueError(f"At most {MAX_OPEN_PARTITIONS} hash partitions can be written at once, got {len(paths)}")
+    key_index = list(columns).index(key)
+    num_buckets = len(paths)
+    counts = [0] * num_buckets
+    files = [open(path, 'w', newline='') for path in paths]
+    try:
+        writers = [csv.writer(f) for f in files]
+        for writer in writers:
+            writer.writerow(columns)
+        for row in rows:
+            bucket = bucket_of(row[key_index], num_buckets)
+            writers[bucket].writerow(row)
+            counts[bucket] += 1
+    finally:
+        for f in files:
+            f.close()
+    return counts
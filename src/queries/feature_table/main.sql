@@ -2,6 +2,8 @@
 -- Computes the number of transactions per user within the previous 7 days
 
 -- Solution using Window Functions (Most Efficient)
+-- The RANGE frame covers the 7 calendar days before the transaction date
+-- (same-day transactions excluded), independent of how many rows fall in it.
 WITH daily_counts AS (
     SELECT 
         transaction_id,
@@ -12,7 +14,7 @@ WITH daily_counts AS (
                 COUNT(*) OVER (
                     PARTITION BY user_id 
                     ORDER BY CAST(date AS DATE)
-                    ROWS BETWEEN 7 PRECEDING AND 1 PRECEDING
+                    RANGE BETWEEN INTERVAL 7 DAYS PRECEDING AND INTERVAL 1 DAY PRECEDING
                 ),
                 0
             ) AS INTEGER
@@ -21,4 +21,8 @@ WITH daily_counts AS (
 SELECT * FROM daily_counts;
 
 -- Refresh materialized view:
-REFRESH MATERIALIZED VIEW mv_weekly_transaction_stats; 
\ No newline at end of file
+REFRESH MATERIALIZED VIEW mv_weekly_transaction_stats;
+
+-- A full REFRESH recomputes all history. src/feature_store.py maintains the same
+-- feature incrementally: it keeps each user's last 7 days of dates and computes
+-- only the rows of each new daily batch. 
\ No newline at end of file
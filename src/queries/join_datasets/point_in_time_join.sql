@@ -0,0 +1,38 @@
+-- Point-in-time join of transactions with users and the agreement dimension
+-- A transaction gets the agreement version of its client that covers the
+-- transaction date (actual_from_dt <= date < actual_to_dt). When versions
+-- overlap, the one that started last wins, and among versions starting on
+-- the same day the one listed last in the file (the highest version_number).
+-- Versions are resolved once per distinct (user_id, date), not per row.
+WITH covering_agreements AS (
+    SELECT
+        d.user_id,
+        d.transaction_date,
+        a.product_id,
+        a.interest_rate
+    FROM (SELECT DISTINCT user_id, transaction_date FROM transactions) d
+    JOIN dim_dep_agreement a
+        ON d.user_id = a.client_id
+        AND d.transaction_date >= a.actual_from_dt
+        AND d.transaction_date < a.actual_to_dt
+    QUALIFY row_number() OVER (
+        PARTITION BY d.user_id, d.transaction_date
+        ORDER BY a.actual_from_dt DESC, a.version_number DESC
+    ) = 1
+)
+SELECT
+    t.transaction_id,
+    CAST(t.transaction_date AS VARCHAR) AS transaction_date,
+    t.user_id,
+    t.is_blocked,
+    t.transaction_amount,
+    t.transaction_category_id,
+    COALESCE(u.is_active, FALSE) AS is_active,
+    c.product_id,
+    c.interest_rate
+FROM transactions t
+LEFT JOIN users u ON t.user_id = u.user_id
+LEFT JOIN covering_agreements c
+    ON t.user_id = c.user_id
+    AND t.transaction_date = c.transaction_date
+ORDER BY t.transaction_date, t.transaction_id;
@@ -0,0 +1,280 @@
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import duckdb
+
+from join_datasets import POINT_IN_TIME_QUERY, DUCKDB_INPUT_VIEWS
+from query_registry import connect_dataset, registry, sql_literal
+
+DEFAULT_DATA_DIR = 'data'
+DEFAULT_PROFILES_DIR = 'data/query_profiles'
+DEFAULT_BASELINE_PATH = 'benchmarks/query_profiles.json'
+# An operator or query is flagged when it is this much slower than the baseline
+DEFAULT_TOLERANCE = 0.5
+# Timings below this many seconds are noise and never flagged
+DEFAULT_MIN_SECONDS = 0.01
+# Runs per statement; the fastest is kept, since slower runs mostly measure a busy machine
+DEFAULT_REPEAT = 3
+# Rows fetched per batch while draining a profiled result
+FETCH_BATCH_SIZE = 10000
+# Metrics requested from DuckDB's JSON profiler; older versions fall back to their defaults
+PROFILING_METRICS = (
+    'LATENCY', 'CPU_TIME', 'ROWS_RETURNED', 'SYSTEM_PEAK_BUFFER_MEMORY', 'SYSTEM_PEAK_TEMP_DIR_SIZE',
+    'OPERATOR_TYPE', 'OPERATOR_NAME', 'OPERATOR_TIMING', 'OPERATOR_CARDINALITY', 'OPERATOR_ROWS_SCANNED',
+    'EXTRA_INFO'
+)
+
+
+def connect_for_query(name: str, data_dir: str) -> duckdb.DuckDBPyConnection:
+    """
+    Connection over the dataset CSVs as the query expects them: the DuckDB
+    join backend's point-in-time query reads its typed input views, every
+    other query reads the CSVs with DuckDB's type inference.
+    """
+    if name != POINT_IN_TIME_QUERY:
+        return connect_dataset(data_dir)
+    conn = duckdb.connect(':memory:')
+    for view, select in DUCKDB_INPUT_VIEWS.items():
+        path = sql_literal(os.path.join(data_dir, f"{view}.csv"))
+        conn.execute(f"CREATE VIEW {view} AS {select.format(path=path)}")
+    return conn
+
+
+def runnable_statements(name: str) -> List[Tuple[int, str]]:
+    """(index, SQL) of the SELECT statements of a registered query file; DDL is not profiled."""
+    return [
+        (index, statement.query)
+        for index, statement in enumerate(registry.statements(name))
+        if statement.type == duckdb.StatementType.SELECT
+    ]
+
+
+def profile_statement(conn: duckdb.DuckDBPyConnection, sql: str, profile_path: str) -> dict:
+    """
+    Run one statement with DuckDB's JSON profiler on, drain its result and
+    return the profile, which is also left at profile_path.
+    """
+    conn.execute("PRAGMA enable_profiling = 'json'")
+    conn.execute(f"PRAGMA profiling_output = {sql_literal(profile_path)}")
+    try:
+        settings = json.dumps({metric: 'true' for metric in PROFILING_METRICS})
+        conn.execute(f"SET custom_profiling_settings = {sql_literal(settings)}")
+    except duckdb.Error:
+        pass
+    try:
+        cursor = conn.execute(sql)
+        while cursor.fetchmany(FETCH_BATCH_SIZE):
+            pass
+    finally:
+        conn.execute("PRAGMA disable_profiling")
+    with open(profile_path, 'r') as f:
+        return json.load(f)
+
+
+def _metric(node: dict, keys: Tuple[str, ...], default: object = None) -> object:
+    """The first of keys present in a profile node; DuckDB renamed them in 1.1."""
+    for key in keys:
+        if key in node:
+            return node[key]
+    return default
+
+
+def summarize_profile(profile: dict) -> Dict[str, object]:
+    """
+    Totals of a query profile plus its operators in pre-order. Operators are
+    identified by position and depth, so two plans with the same shape line
+    up operator by operator. Both the current profile keys and the
+    name/timing/cardinality keys of DuckDB 0.10 are read; a profile with
+    neither raises ValueError rather than yielding an empty plan.
+    """
+    operators = []
+
+    def visit(node: dict, depth: int) -> None:
+        operator = _metric(node, ('operator_name', 'operator_type', 'name'))
+        if not operator:
+            raise ValueError(f"Unrecognized DuckDB profile operator with keys {sorted(node)}")
+        operators.append({
+            'depth': depth,
+            'operator': operator,
+            'seconds': _metric(node, ('operator_timing', 'timing'), 0.0),
+            'rows': _metric(node, ('operator_cardinality', 'cardinality'), 0)
+        })
+        for child in node.get('children', []):
+            visit(child, depth + 1)
+
+    for child in profile.get('children', []):
+        visit(child, 0)
+    return {
+        'seconds': _metric(profile, ('latency', 'timing', 'result'), sum(operator['seconds'] for operator in operators)),
+        'cpu_seconds': profile.get('cpu_time'),
+        'rows': _metric(profile, ('rows_returned', 'cardinality')),
+        'peak_buffer_mb': round(profile.get('system_peak_buffer_memory', 0) / (1024 * 1024), 3),
+        'plan': [f"{'  ' * operator['depth']}{operator['operator']}" for operator in operators],
+        'operators': operators
+    }
+
+
+def profile_queries(
+    data_dir: str,
+    profiles_dir: str,
+    names: Optional[List[str]] = None,
+    repeat: int = DEFAULT_REPEAT
+) -> Dict[str, object]:
+    """
+    Profile every SELECT statement of the registered queries (or just names)
+    on the dataset in data_dir, keeping the fastest of `repeat` runs. Its raw
+    DuckDB profile is saved as <profiles_dir>/<query>.<index>.json. Files
+    DuckDB cannot parse, or without a SELECT, are reported as skipped.
+    """
+    queries = {}
+    skipped = {}
+
+    def skip(key: str, reason: str) -> None:
+        skipped[key] = reason
+        print(f"  {key:<52} skipped: {reason}")
+
+    for name in names or registry.names():
+        try:
+            statements = runnable_statements(name)
+        except duckdb.Error as e:
+            skip(name, str(e).splitlines()[0])
+            continue
+        if not statements:
+            skip(name, 'no SELECT statement')
+            continue
+        conn = connect_for_query(name, data_dir)
+        try:
+            for index, sql in statements:
+                key = f"{name}#{index}"
+                profile_path = os.path.join(profiles_dir, *f"{name}.{index}.json".split('/'))
+                os.makedirs(os.path.dirname(profile_path), exist_ok=True)
+                attempt_path = os.path.splitext(profile_path)[0] + '.attempt.json'
+                try:
+                    for _ in range(repeat):
+                        summary = summarize_profile(profile_statement(conn, sql, attempt_path))
+                        if key not in queries or summary['seconds'] < queries[key]['seconds']:
+                            queries[key] = summary
+                            os.replace(attempt_path, profile_path)
+                except duckdb.Error as e:
+                    queries.pop(key, None)
+                    skip(key, str(e).splitlines()[0])
+                    continue
+                finally:
+                    if os.path.exists(attempt_path):
+                        os.remove(attempt_path)
+                print(f"  {key:<52} {queries[key]['seconds']:>9.3f}s {queries[key]['peak_buffer_mb']:>9.1f} MB")
+        finally:
+            conn.close()
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'duckdb': duckdb.__version__,
+        'queries': queries,
+        'skipped': skipped
+    }
+
+
+def find_plan_regressions(
+    report: Dict[str, object],
+    baseline: Dict[str, object],
+    tolerance: float = DEFAULT_TOLERANCE,
+    min_seconds: float = DEFAULT_MIN_SECONDS
+) -> List[str]:
+    """
+    Queries whose operator tree differs from the baseline, or whose total or
+    per-operator time grew by more than tolerance. Times under min_seconds
+    are ignored, since operators that fast are dominated by noise.
+    """
+    regressions = []
+    for key, base in baseline['queries'].items():
+        result = report['queries'].get(key)
+        if result is None:
+            reason = report['skipped'].get(key) or report['skipped'].get(key.split('#')[0])
+            if reason is not None:
+                regressions.append(f"{key}: no longer runs ({reason})")
+            continue
+        if result['plan'] != base['plan']:
+            regressions.append(
+                f"{key}: plan changed\n      baseline: {' > '.join(base['plan'])}\n"
+                f"      current:  {' > '.join(result['plan'])}"
+            )
+            # Operators no longer line up, so only the total is compared
+            pairs = []
+        else:
+            pairs = zip(base['operators'], result['operators'])
+
+        def slower(current: float, expected: float) -> bool:
+            return current >= min_seconds and current > expected * (1 + tolerance)
+
+        if slower(result['seconds'], base['seconds']):
+            regressions.append(f"{key}: {result['seconds']:.3f}s vs baseline {base['seconds']:.3f}s")
+        for position, (expected, current) in enumerate(pairs):
+            if slower(current['seconds'], expected['seconds']):
+                regressions.append(
+                    f"{key}: operator {position} {current['operator']} "
+                    f"{current['seconds']:.3f}s vs baseline {expected['seconds']:.3f}s"
+                )
+    return regressions
+
+
+def write_json(path: str, data: Dict[str, object]) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Profile the registered SQL queries with DuckDB and compare their plans with a baseline.'
+    )
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR,
+                        help='Directory with transactions.csv, users.csv and dim_dep_agreement.csv')
+    parser.add_argument('--queries', nargs='+', default=None,
+                        help='Registered queries to profile, e.g. feature_table/main (default: all)')
+    parser.add_argument('--profiles-dir', default=DEFAULT_PROFILES_DIR, help='Where the raw JSON profiles go')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH, help='Stored plan baseline to compare with')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Allowed slowdown before a query or operator is flagged (0.5 = 50%%)')
+    parser.add_argument('--min-seconds', type=float, default=DEFAULT_MIN_SECONDS,
+                        help='Timings below this are never flagged')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help='Runs per statement; the fastest run is kept')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these profiles as the new baseline')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    print(f"Profiling registered queries on {args.data_dir}...")
+    report = profile_queries(args.data_dir, args.profiles_dir, args.queries, args.repeat)
+    report['data_dir'] = args.data_dir
+    summary_path = os.path.join(args.profiles_dir, 'summary.json')
+    write_json(summary_path, report)
+    print(f"\nProfiles written to {args.profiles_dir}")
+
+    if args.save_baseline:
+        write_json(args.baseline, report)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+
+    with open(args.baseline, 'r') as f:
+        regressions = find_plan_regressions(report, json.load(f), args.tolerance, args.min_seconds)
+    if regressions:
+        print("\nPlan regressions against baseline:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print("\nNo plan regressions against baseline")
+
+
+if __name__ == '__main__':
+    main()
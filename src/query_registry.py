@@ -0,0 +1,284 @@
+import argparse
+import os
+import tempfile
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import duckdb
+import pandas as pd
+
+from csv_ingest import complete_lines_end, header_end, region_checksums
+
+QUERIES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'queries')
+DEFAULT_WAREHOUSE_PATH = 'data/warehouse.duckdb'
+
+# Open connections and the config they were opened with, keyed by database path (':memory:' included)
+_connections: Dict[str, Tuple[duckdb.DuckDBPyConnection, Dict[str, str]]] = {}
+
+
+def get_connection(database: str = ':memory:', config: Optional[Dict[str, str]] = None) -> duckdb.DuckDBPyConnection:
+    """
+    Return a shared connection to database, opening it on first use. Asking
+    for an open database with another config is an error rather than
+    silently handing back a connection with the first config.
+    """
+    config = config or {}
+    cached = _connections.get(database)
+    if cached is None:
+        cached = _connections[database] = (duckdb.connect(database, config=config), config)
+    elif cached[1] != config:
+        raise ValueError(
+            f"Connection to {database} is already open with config {cached[1]}, requested {config}; "
+            "close_connections() first"
+        )
+    return cached[0]
+
+
+def sql_literal(value: str) -> str:
+    """Quote a string (such as a file path) as a SQL literal."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def connect_dataset(data_dir: str) -> duckdb.DuckDBPyConnection:
+    """
+    New in-memory connection with the dataset CSVs of data_dir exposed as
+    views, so the registered queries run on them and scans are part of any timing.
+    Files missing from data_dir get no view.
+    """
+    conn = duckdb.connect(':memory:')
+    for table, filename in (
+        ('transactions', 'transactions.csv'),
+        ('users', 'users.csv'),
+        ('dim_dep_agreement', 'dim_dep_agreement.csv')
+    ):
+        path = os.path.join(data_dir, filename)
+        if os.path.exists(path):
+            conn.execute(f"CREATE VIEW {table} AS SELECT * FROM read_csv({sql_literal(path)}, header = true)")
+    return conn
+
+
+def close_connections() -> None:
+    for conn, _ in _connections.values():
+        conn.close()
+    _connections.clear()
+
+
+class QueryRegistry:
+    """
+    SQL files under src/queries, addressed by name ('feature_table/main').
+    Files are read and parsed into DuckDB statements once and re-read only
+    when they change on disk. DuckDB's Python API has no prepared statement
+    handle, so the parsed statements are what is kept and reused.
+    """
+
+    def __init__(self, queries_dir: str = QUERIES_DIR):
+        self.queries_dir = queries_dir
+        self._parser = duckdb.connect(':memory:')
+        self._cache: Dict[str, Tuple[int, str, list]] = {}
+
+    def names(self) -> List[str]:
+        names = []
+        for root, _, files in os.walk(self.queries_dir):
+            for filename in files:
+                if filename.endswith('.sql'):
+                    relative = os.path.relpath(os.path.join(root, filename), self.queries_dir)
+                    names.append(relative[:-len('.sql')].replace(os.sep, '/'))
+        return sorted(names)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.queries_dir, *name.split('/')) + '.sql'
+
+    def _load(self, name: str) -> Tuple[int, str, list]:
+        path = self.path(name)
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._cache.get(name)
+        if cached is None or cached[0] != mtime:
+            with open(path, 'r') as f:
+                sql = f.read()
+            cached = self._cache[name] = (mtime, sql, self._parser.extract_statements(sql))
+        return cached
+
+    def sql(self, name: str) -> str:
+        """Raw text of a query file."""
+        return self._load(name)[1]
+
+    def statements(self, name: str) -> list:
+        """Parsed statements of a query file, in file order."""
+        return self._load(name)[2]
+
+    def execute(
+        self,
+        conn: duckdb.DuckDBPyConnection,
+        name: str,
+        index: int = 0,
+        parameters: Optional[Sequence] = None
+    ) -> duckdb.DuckDBPyConnection:
+        """Execute statement `index` of a query file on conn and return the cursor."""
+        statement = self.statements(name)[index]
+        if parameters is None:
+            return conn.execute(statement)
+        return conn.execute(statement, parameters)
+
+
+registry = QueryRegistry()
+
+
+class Warehouse:
+    """
+    Persistent DuckDB database holding transactions, users and agreements.
+    CSV files are ingested once. Re-ingesting an unchanged file is a no-op, a
+    file that was only appended to loads just its new lines, new files are
+    added and a rewritten file rebuilds its table.
+    """
+
+    TABLES = ('transactions', 'users', 'dim_dep_agreement')
+
+    def __init__(self, path: str = DEFAULT_WAREHOUSE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = get_connection(path)
+        # loaded_bytes is the offset up to which a file was loaded, head and
+        # tail are csv_ingest.region_checksums of the bytes before it
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS ingested_files (
+                table_name VARCHAR,
+                path VARCHAR,
+                size BIGINT,
+                mtime_ns BIGINT,
+                loaded_bytes BIGINT,
+                head VARCHAR,
+                tail VARCHAR,
+                num_rows BIGINT,
+                PRIMARY KEY (table_name, path)
+            )
+        """)
+
+    def _table_exists(self, table: str) -> bool:
+        return bool(self.conn.execute(
+            "SELECT 1 FROM information_schema.tables WHERE table_name = ?", [table]
+        ).fetchone())
+
+    def _load_range(self, table: str, path: str, start: Optional[int] = None) -> Tuple[int, int]:
+        """
+        Load the complete lines of path from byte offset start on (the first
+        row by default) into table. Returns the rows loaded and the offset
+        loaded up to. The lines are copied to a temp CSV under the file's
+        header, since DuckDB reads whole files; rows appended to an existing
+        table are parsed with its column types.
+        """
+        _, first_row = header_end(path)
+        start = first_row if start is None else start
+        end = complete_lines_end(path, start)
+        if end <= start:
+            return 0, start
+
+        with tempfile.TemporaryDirectory() as directory:
+            range_path = os.path.join(directory, 'range.csv')
+            with open(path, 'rb') as src, open(range_path, 'wb') as dst:
+                dst.write(src.read(first_row))
+                src.seek(start)
+                remaining = end - start
+                while remaining:
+                    block = src.read(min(remaining, 1 << 20))
+                    dst.write(block)
+                    remaining -= len(block)
+
+            if self._table_exists(table):
+                types = ', '.join(
+                    f"{sql_literal(name)}: {sql_literal(column_type)}"
+                    for name, column_type, *_ in self.conn.execute(f"DESCRIBE {table}").fetchall()
+                )
+                source = f"read_csv({sql_literal(range_path)}, header = true, types = {{{types}}})"
+                num_rows = self.conn.execute(f"INSERT INTO {table} BY NAME SELECT * FROM {source}").fetchone()[0]
+            else:
+                source = f"read_csv({sql_literal(range_path)}, header = true)"
+                self.conn.execute(f"CREATE TABLE {table} AS SELECT * FROM {source}")
+                num_rows = self.conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+        return num_rows, end
+
+    def _record(self, table: str, path: str, loaded_bytes: int, num_rows: int) -> None:
+        stat = os.stat(path)
+        head, tail = region_checksums(path, loaded_bytes)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO ingested_files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [table, path, stat.st_size, stat.st_mtime_ns, loaded_bytes, head, tail, num_rows]
+        )
+
+    def ingest(self, table: str, csv_path: str) -> int:
+        """Load what is new in csv_path into table; returns rows loaded (all of them after a rebuild)."""
+        if table not in self.TABLES:
+            raise ValueError(f"Unknown warehouse table: {table}")
+        path = os.path.abspath(csv_path)
+        stat = os.stat(path)
+        known = self.conn.execute(
+            "SELECT size, mtime_ns, loaded_bytes, head, tail, num_rows FROM ingested_files "
+            "WHERE table_name = ? AND path = ?", [table, path]
+        ).fetchone()
+        if known is not None and known[:2] == (stat.st_size, stat.st_mtime_ns):
+            return 0
+
+        self.conn.execute("BEGIN TRANSACTION")
+        try:
+            if known is None:
+                loaded, end = self._load_range(table, path)
+                self._record(table, path, end, loaded)
+            elif stat.st_size >= known[2] and region_checksums(path, known[2]) == known[3:5]:
+                # Only appended to: load the lines after what is already in the table
+                loaded, end = self._load_range(table, path, known[2])
+                self._record(table, path, end, known[5] + loaded)
+            else:
+                # The file was rewritten: rebuild the table from all its files still on disk
+                paths = [row[0] for row in self.conn.execute(
+                    "SELECT path FROM ingested_files WHERE table_name = ? ORDER BY path", [table]
+                ).fetchall()]
+                self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+                self.conn.execute("DELETE FROM ingested_files WHERE table_name = ?", [table])
+                loaded = 0
+                for file_path in filter(os.path.exists, paths):
+                    num_rows, end = self._load_range(table, file_path)
+                    self._record(table, file_path, end, num_rows)
+                    loaded += num_rows
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return loaded
+
+    def ingest_directory(self, data_dir: str) -> Dict[str, int]:
+        """Ingest users.csv, transactions.csv and dim_dep_agreement.csv from data_dir if present."""
+        loaded = {}
+        for table in self.TABLES:
+            path = os.path.join(data_dir, f"{table}.csv")
+            if os.path.exists(path):
+                loaded[table] = self.ingest(table, path)
+        return loaded
+
+    def run(self, name: str, index: int = 0, parameters: Optional[Sequence] = None) -> pd.DataFrame:
+        """Run a registered query against the warehouse tables."""
+        return registry.execute(self.conn, name, index, parameters).fetchdf()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingest CSVs into the warehouse and run registered queries.')
+    parser.add_argument('--warehouse', default=DEFAULT_WAREHOUSE_PATH, help='Persistent DuckDB database file')
+    parser.add_argument('--ingest', metavar='DATA_DIR', help='Ingest new or changed CSVs from this directory')
+    parser.add_argument('--run', metavar='QUERY', help='Registered query to run, e.g. feature_table/main')
+    parser.add_argument('--list', action='store_true', help='List registered queries')
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(registry.names()))
+    if not (args.ingest or args.run):
+        return
+
+    warehouse = Warehouse(args.warehouse)
+    if args.ingest:
+        for table, num_rows in warehouse.ingest_directory(args.ingest).items():
+            print(f"{table}: {num_rows} rows ingested")
+    if args.run:
+        print(warehouse.run(args.run).to_string(index=False))
+    close_connections()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,46 @@
 # Copyright 2020 N26 GmbH
 
-from typing import Set
-from utils import read_csv_file
+from typing import Dict, Optional, Set
+from csv_cache import load_columns
+from csv_ingest import iter_rows
+from distinct_counters import UserBitmap
 
 
-def read_active_users(filename: str) -> Set[str]:
+class UserIdDictionary:
+    """Maps user UUID strings to dense integer ids, assigned in first-seen order."""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+
+    def intern(self, user_id: str) -> int:
+        dense_id = self._ids.get(user_id)
+        if dense_id is None:
+            dense_id = len(self._ids)
+            self._ids[user_id] = dense_id
+        return dense_id
+
+    def get(self, user_id: str) -> Optional[int]:
+        return self._ids.get(user_id)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+def read_active_users(filename: str, use_cache: bool = False) -> Set[str]:
     """Read users.csv and return a set of active user IDs."""
-    active_users = set()
-    for row in read_csv_file(filename):
-        if row['is_active'] == '1':
-            active_users.add(row['user_id'])
-    return active_users 
\ No newline at end of file
+    if use_cache:
+        columns = load_columns(filename)
+        active = columns['user_id'][columns['is_active'] == 1]
+        return {user_id.decode() for user_id in active.tolist()}
+
+    return {user_id for user_id, is_active in iter_rows(filename, ('user_id', 'is_active')) if is_active == '1'}
+
+
+def read_active_user_ids(filename: str, user_ids: UserIdDictionary) -> UserBitmap:
+    """Intern every user in users.csv and return a bitmap of the active ones."""
+    active_users = UserBitmap()
+    for user_id, is_active in iter_rows(filename, ('user_id', 'is_active')):
+        dense_id = user_ids.intern(user_id)
+        if is_active == '1':
+            active_users.add(dense_id)
+    return active_users
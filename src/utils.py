@@ -4,9 +4,17 @@ import csv
 import os
 from typing import List, Any
 
+from csv_cache import iter_cached_rows
+
+
+def read_csv_file(filename: str, use_cache: bool = False) -> List[dict]:
+    """
+    Read any CSV file and return list of dictionaries.
+    With use_cache, rows come from the columnar cache instead of re-parsing text.
+    """
+    if use_cache:
+        return list(iter_cached_rows(filename))
 
-def read_csv_file(filename: str) -> List[dict]:
-    """Read any CSV file and return list of dictionaries."""
     with open(filename, 'r') as f:
         reader = csv.DictReader(f)
         return list(reader)